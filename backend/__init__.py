@@ -19,10 +19,11 @@ from backend.config import config_dict, Config
 # Import models to ensure they are registered with SQLAlchemy
 from backend.models.user import User
 from backend.models.secret import Secret
-from backend.models.folder import Folder, FolderPermission
+from backend.models.folder import Folder, FolderPermission, FolderClosure
 from backend.models.permission import SecretPermission
 from backend.models.tag import Tag, secret_tags, folder_tags
 from backend.models.system import SystemSetting
+from backend.models.wipe import WipeJob
 
 
 def create_app(config_name=None):
@@ -58,6 +59,48 @@ def create_app(config_name=None):
     app.config['JWT_QUERY_STRING_NAME'] = 'token'
     app.config['JWT_QUERY_STRING_LOCATIONS'] = ['query_string']
 
+    # Size the unsealed user key cache from configuration
+    from backend.utils.key_cache import user_key_cache
+    user_key_cache.configure(
+        max_entries=app.config['USER_KEY_CACHE_SIZE'],
+        ttl=app.config['USER_KEY_CACHE_TTL']
+    )
+
+    # Bound the per-user typeahead indexes
+    from backend.utils.typeahead import typeahead_cache
+    typeahead_cache.configure(
+        max_users=app.config['TYPEAHEAD_MAX_USERS'],
+        idle_ttl=app.config['TYPEAHEAD_IDLE_TTL']
+    )
+
+    # Build the global encryption key ring once per process
+    from backend.utils.key_ring import key_ring
+    key_ring.load_from_config(app.config)
+
+    # Pick the AEAD algorithm for new secret values, benchmarking if set to 'auto'
+    from backend.utils import value_crypto
+    algorithm = value_crypto.configure(app.config['VALUE_ENCRYPTION_ALGORITHM'])
+    logging.getLogger(__name__).info(f"Encrypting secret values with {algorithm}")
+
+    # Unseal the master key for derived user keys once, instead of one key per user
+    if app.config['USE_TPM_SEALING'] and app.config['USER_KEY_DERIVATION'] == 'hkdf':
+        from backend.utils.key_provider import get_key_provider
+        from backend.utils.user_key_deriver import user_key_deriver
+        try:
+            user_key_deriver.load_from_provider(get_key_provider(), app.config['TPM_SECRETS_DIR'])
+        except Exception as e:
+            # Retried on first use
+            logging.getLogger(__name__).warning(f"Could not load the user master key at startup: {str(e)}")
+
+    # Size the native thread pool used for CPU-bound work
+    from backend.utils.offload import executor
+    executor.configure(
+        pool_size=app.config['OFFLOAD_POOL_SIZE'],
+        limits=app.config['OFFLOAD_LIMITS'],
+        min_size=app.config['OFFLOAD_MIN_SIZE'],
+        enabled=app.config['OFFLOAD_ENABLED']
+    )
+
     # Initialize extensions with database retry logic
     db.init_app(app)
     
@@ -97,6 +140,11 @@ def create_app(config_name=None):
     def load_user(user_id):
         return User.query.get(int(user_id))
 
+    @app.errorhandler(413)
+    def handle_request_too_large(error):
+        max_size_mb = app.config.get('MAX_FILE_SIZE', 10 * 1024 * 1024) / (1024 * 1024)
+        return {"msg": f"File too large. Maximum allowed size is {max_size_mb}MB."}, 413
+
     @jwt.invalid_token_loader
     def handle_invalid_token(error):
         return {
@@ -110,12 +158,14 @@ def create_app(config_name=None):
     from backend.api.users import users_bp
     from backend.api.secrets import secrets_bp
     from backend.api.folders import folders_bp
+    from backend.api.admin import admin_bp
     
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(users_bp, url_prefix='/api/users')
     app.register_blueprint(secrets_bp, url_prefix='/api/secrets')
     app.register_blueprint(folders_bp, url_prefix='/api/folders')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
 
     # Initialize WebSocket service
     from backend.services.ws_service import init_ws_service
@@ -125,6 +175,18 @@ def create_app(config_name=None):
     from backend.ws import ws_bp
     app.register_blueprint(ws_bp)
 
+    # Resume a key rotation interrupted by a restart
+    from backend.services.rotation_service import init_rotation_service
+    init_rotation_service(app)
+
+    # Start wiping the files of deleted secrets in the background
+    from backend.services.wipe_service import init_wipe_service
+    init_wipe_service(app)
+
+    # Fill the folder closure table if it is new or out of step with the folders
+    from backend.services.folder_tree_service import init_folder_tree
+    init_folder_tree(app)
+
     # Register CLI commands
     @app.cli.command("test-database")
     def test_database():
@@ -166,6 +228,7 @@ def create_app(config_name=None):
             # Then delete data from other tables
             db.session.execute(db.delete(SecretPermission))
             db.session.execute(db.delete(FolderPermission))
+            db.session.execute(db.delete(FolderClosure))
             db.session.execute(db.delete(Secret))
             db.session.execute(db.delete(Folder))
             db.session.execute(db.delete(Tag))
@@ -181,6 +244,20 @@ def create_app(config_name=None):
             click.echo(f"Error during database cleanup: {str(e)}")
             raise
 
+    @app.cli.command("rebuild-folder-closure")
+    def rebuild_folder_closure():
+        """Recompute the folder closure table from the folders' parent IDs."""
+        from backend.services.folder_tree_service import FolderTreeService
+        click.echo("Rebuilding folder closure table...")
+        try:
+            links = FolderTreeService.rebuild()
+            db.session.commit()
+            click.echo(f"✅ Folder closure table rebuilt with {links} links")
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"❌ Folder closure rebuild failed: {str(e)}")
+            sys.exit(1)
+
     # NOTE: Database tables are NOT automatically created here
     # You must run migrations manually:
     # docker exec -it auth_berry_flask bash -c "flask db init && flask db migrate && flask db upgrade"
@@ -0,0 +1,69 @@
+#! /usr/bin/env python3
+
+
+from flask import Blueprint, jsonify, request, current_app
+from backend.api.users import admin_required
+from backend.utils.key_cache import user_key_cache
+from backend.utils.typeahead import typeahead_cache
+from backend.utils.key_provider import get_key_provider
+from backend.utils.key_ring import key_ring
+from backend.utils.user_key_deriver import user_key_deriver
+from backend.utils.offload import executor
+from backend.utils.keypair_pool import keypair_pool
+from backend.utils import ws_codec, value_crypto
+from backend.services.rotation_service import RotationService
+from backend.services.wipe_service import WipeService
+
+admin_bp = Blueprint('admin', __name__)
+
+
+@admin_bp.route('/metrics', methods=['GET'])
+@admin_required
+def get_metrics():
+    """Retrieves internal performance counters for tuning caches and queues."""
+    return jsonify({
+        "user_key_cache": user_key_cache.stats(),
+        "key_provider": get_key_provider().stats(),
+        "user_key_deriver": user_key_deriver.stats(),
+        "key_ring": key_ring.stats(),
+        "value_crypto": value_crypto.stats(),
+        "offload": executor.stats(),
+        "ws_keypair_pool": keypair_pool.stats(),
+        "ws_codecs": ws_codec.stats(),
+        "wipe_queue": WipeService.stats(),
+        "typeahead": typeahead_cache.stats(),
+        "startup_secrets_ms": current_app.config.get('STARTUP_SECRET_TIMINGS', {})
+    }), 200
+
+
+@admin_bp.route('/rotation', methods=['GET'])
+@admin_required
+def get_rotation_status():
+    """Retrieves the progress of the current or last key rotation job."""
+    return jsonify(RotationService.get_status()), 200
+
+
+@admin_bp.route('/rotation', methods=['POST'])
+@admin_required
+def start_rotation():
+    """Starts or resumes re-encrypting all secrets under the current keys."""
+    data = request.get_json(silent=True) or {}
+
+    success, result = RotationService.start(
+        current_app._get_current_object(),
+        rotate_user_keys=bool(data.get('rotate_user_keys', False))
+    )
+    if not success:
+        return jsonify({"msg": result}), 409
+
+    return jsonify(result), 202
+
+
+@admin_bp.route('/rotation/stop', methods=['POST'])
+@admin_required
+def stop_rotation():
+    """Pauses the running key rotation job after its current batch."""
+    if not RotationService.stop():
+        return jsonify({"msg": "No key rotation is running."}), 409
+
+    return jsonify({"msg": "Key rotation will pause after the current batch."}), 200
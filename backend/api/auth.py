@@ -14,6 +14,7 @@ from datetime import datetime
 from backend.models.user import User
 from backend.models.system import SystemSetting
 from backend.services.auth_service import AuthService
+from backend.utils.offload import offload
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -433,7 +434,7 @@ def token_login():
     if not user:
         return jsonify({"msg": "Invalid username or password"}), 401
 
-    if not verify_password(password, user.password_hash):
+    if not offload('password', verify_password, password, user.password_hash):
         current_app.logger.warning(f"Failed login attempt for user {username}: password verification failed")
         return jsonify({"msg": "Invalid username or password"}), 401
 
@@ -13,6 +13,9 @@ from backend.models.tag import Tag
 from backend.models.secret import Secret
 from backend.models.permission import SecretPermission, UserSecretView
 from backend.extensions import db, socketio
+from backend.services.folder_tree_service import FolderTreeService
+from backend.services.typeahead_service import TypeaheadService
+from backend.services.wipe_service import WipeService
 
 folders_bp = Blueprint('folders', __name__)
 
@@ -36,6 +39,9 @@ def get_folders():
         ).all()
 
         all_folders = {}
+        paths = FolderTreeService.paths(
+            {folder.folder_id for folder in owned_folders} | {folder.folder_id for folder in permitted_folders}
+        )
 
         for folder in owned_folders:
             all_folders[folder.folder_id] = {
@@ -47,7 +53,7 @@ def get_folders():
                 "is_owner": True,
                 "folder_type": folder.folder_type.value,
                 "is_shared_folder": folder.is_shared_folder,
-                "path": folder.get_full_path(),
+                "path": paths.get(folder.folder_id, f"/{folder.name}"),
                 "created_time": folder.created_time.isoformat(),
                 "last_modified": folder.last_modified.isoformat(),
                 "permissions": {
@@ -71,7 +77,7 @@ def get_folders():
                     "is_owner": False,
                     "folder_type": folder.folder_type.value,
                     "is_shared_folder": folder.is_shared_folder,
-                    "path": folder.get_full_path(),
+                    "path": paths.get(folder.folder_id, f"/{folder.name}"),
                     "created_time": folder.created_time.isoformat(),
                     "last_modified": folder.last_modified.isoformat(),
                     "permissions": {
@@ -246,6 +252,7 @@ def create_folder():
                 folder.tags.append(tag)
 
         db.session.add(folder)
+        FolderTreeService.add(folder)
         db.session.commit()
 
         folder_data = {
@@ -333,15 +340,11 @@ def update_folder(folder_id):
                     if not permission:
                         return jsonify({"error": "You don't have permission to move this folder here"}), 403
 
-                ancestor = parent_folder.parent
-                visited = {parent_folder.folder_id}
-
-                while ancestor and ancestor.folder_id not in visited:
-                    if ancestor.folder_id == folder_id:
-                        return jsonify({"error": "Circular reference detected in folder hierarchy"}), 400
-                    visited.add(ancestor.folder_id)
-                    ancestor = ancestor.parent
+                if FolderTreeService.is_ancestor(folder_id, parent_folder.folder_id):
+                    return jsonify({"error": "Circular reference detected in folder hierarchy"}), 400
 
+            if (new_parent_id or None) != folder.parent_id:
+                FolderTreeService.move(folder_id, new_parent_id or None)
             folder.parent_id = new_parent_id
 
         was_shared_folder = folder.is_shared_folder
@@ -414,7 +417,10 @@ def update_folder(folder_id):
                             current_app.logger.debug(
                                 f"Created view for secret {secret.secret_id} in folder {folder_id} for user {folder_perm.user_id}")
 
+        # Folder paths and inherited access may change for every secret below the folder
+        typeahead_users = TypeaheadService.folder_users(folder_id)
         db.session.commit()
+        TypeaheadService.users_changed(typeahead_users)
 
         return jsonify({
             "id": folder.folder_id,
@@ -472,8 +478,16 @@ def delete_folder(folder_id):
 
         folder_owner_id = folder.owner_id
 
+        # Secrets are deleted with the folder; wipe their blobs once that is committed
+        WipeService.enqueue_secrets(folder.secrets)
+
+        typeahead_users = TypeaheadService.folder_users(folder_id)
+        deleted_secret_ids = [secret.secret_id for secret in folder.secrets]
+        FolderTreeService.remove(folder_id)
         db.session.delete(folder)
         db.session.commit()
+        TypeaheadService.users_changed(typeahead_users)
+        TypeaheadService.secrets_removed(deleted_secret_ids)
 
         socketio.emit('folder_deleted', {
             'folder_id': folder_id,
@@ -601,6 +615,7 @@ def share_folder(folder_id):
                         f"Created view for secret {secret.secret_id} in folder {folder_id} for user {target_user_id}")
 
         db.session.commit()
+        TypeaheadService.users_changed(TypeaheadService.folder_users(folder_id) | {int(target_user_id)})
 
         socketio.emit('folder_shared', {
             'folder_id': folder_id,
@@ -691,6 +706,7 @@ def unshare_folder(folder_id, user_id):
             current_app.logger.debug(f"Updated folder {folder_id} back to REGULAR type - no more shares")
 
         db.session.commit()
+        TypeaheadService.users_changed(TypeaheadService.folder_users(folder_id) | {user_id})
 
         socketio.emit('folder_unshared', {
             'folder_id': folder_id,
@@ -723,6 +739,7 @@ def get_shared_folders():
         ).all()
 
         result = []
+        paths = FolderTreeService.paths(folder.folder_id for folder in shared_folders)
         for folder in shared_folders:
             permission = next((p for p in folder.permissions if p.user_id == current_user_id), None)
 
@@ -733,7 +750,7 @@ def get_shared_folders():
                 "parent_id": folder.parent_id,
                 "owner_id": folder.owner_id,
                 "owner": folder.owner.username if folder.owner else "Unknown",
-                "path": folder.get_full_path(),
+                "path": paths.get(folder.folder_id, f"/{folder.name}"),
                 "created_time": folder.created_time.isoformat(),
                 "last_modified": folder.last_modified.isoformat(),
                 "permissions": {
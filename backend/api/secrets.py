@@ -1,16 +1,19 @@
 #! /usr/bin/env python3
 
 
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import io
 from backend.models.user import User
 from backend.models.secret import Secret
 from backend.models.permission import SecretPermission
 from backend.models.enums import SecretType
 from backend.extensions import db, socketio
-from backend.utils.encryption import encrypt_value, decrypt_value
+from backend.utils.encryption import (
+    encrypt_secret_value, decrypt_secret_value, is_legacy_value, upgrade_secret_value, DECRYPTION_ERROR
+)
 from backend.services.secret_service import SecretService
+from backend.services.listing_service import SecretListingService
+from backend.services.typeahead_service import TypeaheadService
 from backend.models.folder import Folder, FolderPermission
 from backend.models.permission import UserSecretView
 from backend.models.tag import Tag
@@ -40,109 +43,125 @@ def process_tags(tag_names, secret, user_id):
             secret.tags.append(tag)
 
 
+def _upgrade_legacy_value(secret, decrypted_value):
+    # Migrate legacy Fernet values on read; compare-and-set so a concurrent edit wins
+    try:
+        upgraded = upgrade_secret_value(decrypted_value, secret.wrapped_data_key)
+        db.session.execute(
+            db.update(Secret)
+            .where(Secret.secret_id == secret.secret_id,
+                   Secret.encrypted_secret_value == secret.encrypted_secret_value)
+            .values(encrypted_secret_value=upgraded, last_modified=Secret.last_modified)
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Failed to upgrade value of secret {secret.secret_id}: {str(e)}")
+
+
+def _listing_filters(args):
+    # Listing filters shared by the secret list and search endpoints
+    return {
+        'folder_id': args['folder_id'] if args.get('folder_id') == 'root' else args.get('folder_id', type=int),
+        'tag': args.get('tag'),
+        'type': args.get('type'),
+        'owner_id': args.get('owner_id', type=int),
+        'name_prefix': args.get('name_prefix')
+    }
+
+
 @secrets_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_secrets():
-    """Retrieves all secrets accessible to the current user, including those they own and those shared with them."""
+    """
+    Retrieves the secrets accessible to the current user, including those they own and those shared with them.
+
+    Optional query parameters filter the listing (folder_id, or 'root' for unfiled secrets; tag; type;
+    owner_id; name_prefix) and sort it (sort = modified, created or name; order = desc or asc). Passing
+    limit or cursor returns one page at a time, with next_cursor pointing at the following page.
+    """
     current_user_id = get_jwt_identity()
     current_user = User.query.get(current_user_id)
 
     if not current_user:
         return jsonify({"msg": "User not found"}), 404
 
-    owned_secrets = Secret.query.filter_by(owner_id=current_user_id).all()
-
-    shared_permissions = SecretPermission.query.filter_by(
-        user_id=current_user_id,
-        can_read=True
-    ).all()
-
-    shared_secret_ids = [p.secret_id for p in shared_permissions]
-    shared_secrets = Secret.query.filter(Secret.secret_id.in_(shared_secret_ids)).all()
-
-    accessible_folder_ids = set()
-    owned_folders = Folder.query.filter_by(owner_id=current_user_id).all()
-    for folder in owned_folders:
-        accessible_folder_ids.add(folder.folder_id)
-
-    folder_permissions = FolderPermission.query.filter_by(
-        user_id=current_user_id,
-        can_read=True
-    ).all()
-    for perm in folder_permissions:
-        accessible_folder_ids.add(perm.folder_id)
-
-    all_secrets = {}
-
-    for secret in owned_secrets:
-        all_secrets[secret.secret_id] = secret
-
-    for secret in shared_secrets:
-        if secret.secret_id not in all_secrets:
-            all_secrets[secret.secret_id] = secret
-
-    user_views = UserSecretView.query.filter(
-        UserSecretView.user_id == current_user_id,
-        UserSecretView.secret_id.in_([s.secret_id for s in all_secrets.values()])
-    ).all()
-
-    user_view_map = {view.secret_id: view.folder_id for view in user_views}
-
-    direct_permission_lookup = {perm.secret_id: True for perm in shared_permissions}
+    args = request.args
+    try:
+        filters = _listing_filters(args)
+
+        limit = None
+        if 'limit' in args or 'cursor' in args:
+            limit = args.get('limit', current_app.config['SECRET_LIST_PAGE_SIZE'], type=int)
+            limit = max(1, min(limit, current_app.config['SECRET_LIST_MAX_PAGE_SIZE']))
+
+        secrets, next_cursor = SecretListingService.list_secrets(
+            current_user_id,
+            filters=filters,
+            sort=args.get('sort', 'modified'),
+            descending=args.get('order', 'desc') != 'asc',
+            limit=limit,
+            cursor=args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
 
-    folder_map = {}
-    folder_accessibility = {}
+    return jsonify({
+        "secrets": secrets,
+        "next_cursor": next_cursor
+    }), 200
 
-    all_folders = Folder.query.filter(
-        (Folder.owner_id == current_user_id) |
-        (Folder.folder_id.in_([p.folder_id for p in folder_permissions]))
-    ).all()
 
-    for folder in all_folders:
-        folder_map[folder.folder_id] = folder.name
-        folder_accessibility[folder.folder_id] = True
+@secrets_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_secrets():
+    """
+    Searches the names, descriptions and tags of the secrets accessible to the current user, ranked by
+    relevance. Takes the search text as q, the filters of the secret listing, and limit and cursor for paging.
+    """
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
 
-    secrets_with_tags = []
-    for secret in all_secrets.values():
-        has_direct_access = secret.owner_id == int(current_user_id) or secret.secret_id in direct_permission_lookup
+    if not current_user:
+        return jsonify({"msg": "User not found"}), 404
 
-        tags = []
-        if hasattr(secret, 'tags'):
-            tags = [tag.name for tag in secret.tags]
+    args = request.args
+    try:
+        filters = _listing_filters(args)
+        limit = args.get('limit', current_app.config['SECRET_LIST_PAGE_SIZE'], type=int)
+        limit = max(1, min(limit, current_app.config['SECRET_LIST_MAX_PAGE_SIZE']))
+
+        secrets, next_cursor = SecretListingService.search_secrets(
+            current_user_id,
+            args.get('q', ''),
+            filters=filters,
+            limit=limit,
+            cursor=args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
 
-        real_folder_id = secret.folder_id
+    return jsonify({
+        "secrets": secrets,
+        "next_cursor": next_cursor
+    }), 200
 
-        if secret.secret_id in user_view_map:
-            folder_id = user_view_map[secret.secret_id]
-            current_app.logger.debug(
-                f"Using personal view for secret {secret.secret_id}: folder {folder_id} instead of {real_folder_id}")
-        elif secret.owner_id == int(current_user_id):
-            folder_id = real_folder_id
-        else:
-            folder_id = None
 
-        folder_name = folder_map.get(folder_id) if folder_id else None
+@secrets_bp.route('/quick-open', methods=['GET'])
+@jwt_required()
+def quick_open_secrets():
+    """
+    Completes secret names, folder paths and tags as the current user types, from an in-memory index of the
+    secrets they can read. Takes the typed text as q and an optional limit.
+    """
+    # No user lookup: answering from memory is the point, and deleting a user drops every index
+    current_user_id = int(get_jwt_identity())
 
-        secrets_with_tags.append({
-            "id": secret.secret_id,
-            "name": secret.secret_name,
-            "type": secret.secret_type,
-            "folder_id": folder_id,
-            "folder_name": folder_name,
-            "description": secret.description or "",
-            "created_time": secret.created_time.isoformat(),
-            "last_modified": secret.last_modified.isoformat(),
-            "tags": tags,
-            "owner_id": secret.owner_id,
-            "is_favorite": secret.is_favorite,
-            "is_file_secret": secret.is_file_secret,
-            "has_direct_access": has_direct_access,
-            "real_folder_id": real_folder_id
-        })
+    limit = request.args.get('limit', 10, type=int)
+    limit = max(1, min(limit, current_app.config['TYPEAHEAD_MAX_RESULTS']))
 
-    return jsonify({
-        "secrets": secrets_with_tags
-    }), 200
+    results = TypeaheadService.lookup(current_user_id, request.args.get('q', ''), limit)
+    return jsonify({"results": results}), 200
 
 
 @secrets_bp.route('/', methods=['POST'])
@@ -165,7 +184,10 @@ def create_secret():
     if secret_type not in valid_types:
         return jsonify({"msg": f"Invalid secret type. Must be one of: {', '.join(valid_types)}"}), 400
 
-    encrypted_value = encrypt_value(data['value'])
+    if len(data['value'] or '') > current_app.config['MAX_SECRET_VALUE_LENGTH']:
+        return jsonify({"msg": "Secret value is too large"}), 413
+
+    encrypted_value, wrapped_data_key = encrypt_secret_value(data['value'])
 
     folder_id = None
     if 'folder_id' in data and data['folder_id']:
@@ -205,6 +227,7 @@ def create_secret():
         description=description,
         secret_type=secret_type,
         encrypted_secret_value=encrypted_value,
+        wrapped_data_key=wrapped_data_key,
         owner_id=current_user_id,
         folder_id=folder_id
     )
@@ -262,6 +285,8 @@ def create_secret():
 
             db.session.commit()
 
+    TypeaheadService.secrets_changed([new_secret.secret_id])
+
     folder_info = None
     if folder_id:
         folder = Folder.query.get(folder_id)
@@ -323,7 +348,7 @@ def create_secret():
 
     user_sid = None
     for sid, session in client_sessions.items():
-        if session.get('user_id') == int(current_user_id):
+        if session.user_id == int(current_user_id):
             user_sid = sid
             break
 
@@ -417,11 +442,14 @@ def get_secret(secret_id):
         decrypted_value = None
         if not secret.is_file_secret:
             try:
-                decrypted_value = decrypt_value(secret.encrypted_secret_value)
+                decrypted_value = decrypt_secret_value(secret.encrypted_secret_value, secret.wrapped_data_key)
             except Exception as e:
                 current_app.logger.error(f"Decryption error: {str(e)}")
                 return jsonify({"msg": "Failed to decrypt secret value"}), 500
 
+            if decrypted_value != DECRYPTION_ERROR and is_legacy_value(secret.encrypted_secret_value):
+                _upgrade_legacy_value(secret, decrypted_value)
+
         permissions = {
             "can_read": True,
             "can_write": secret.owner_id == int(current_user_id),
@@ -583,9 +611,12 @@ def update_secret(secret_id):
         secret.description = data.get('description', '')
 
     if 'value' in data and not secret.is_file_secret:
+        if len(data['value'] or '') > current_app.config['MAX_SECRET_VALUE_LENGTH']:
+            return jsonify({"msg": "Secret value is too large"}), 413
         try:
-            encrypted_value = encrypt_value(data['value'])
+            encrypted_value, wrapped_data_key = encrypt_secret_value(data['value'])
             secret.encrypted_secret_value = encrypted_value
+            secret.wrapped_data_key = wrapped_data_key
         except Exception as e:
             return jsonify({"msg": f"Failed to encrypt secret: {str(e)}"}), 500
 
@@ -594,6 +625,7 @@ def update_secret(secret_id):
 
     try:
         db.session.commit()
+        TypeaheadService.secrets_changed([secret_id])
 
         folder_info = None
         if secret.folder_id:
@@ -613,7 +645,7 @@ def update_secret(secret_id):
         decrypted_value = None
         if not secret.is_file_secret:
             try:
-                decrypted_value = decrypt_value(secret.encrypted_secret_value)
+                decrypted_value = decrypt_secret_value(secret.encrypted_secret_value, secret.wrapped_data_key)
             except Exception as e:
                 current_app.logger.error(f"Decryption error: {str(e)}")
                 return jsonify({"msg": "Failed to decrypt updated secret value"}), 500
@@ -714,6 +746,7 @@ def delete_secret(secret_id):
         else:
             db.session.delete(secret)
             db.session.commit()
+        TypeaheadService.secrets_removed([secret_id])
 
         socketio.emit('secret_deleted', {
             'secret_id': secret_id,
@@ -805,14 +838,15 @@ def share_secret(secret_id):
             )
 
     db.session.commit()
+    TypeaheadService.secrets_changed([secret_id])
 
     owner_sid = None
     shared_user_sid = None
 
     for sid, session in client_sessions.items():
-        if session.get('user_id') == int(current_user_id):
+        if session.user_id == int(current_user_id):
             owner_sid = sid
-        elif session.get('user_id') == int(share_user_id):
+        elif session.user_id == int(share_user_id):
             shared_user_sid = sid
 
     secret_data = {
@@ -900,6 +934,7 @@ def unshare_secret(secret_id, user_id):
 
     db.session.delete(permission)
     db.session.commit()
+    TypeaheadService.secrets_changed([secret_id])
 
     socketio.emit('secret_unshared', {
         'secret_id': secret_id,
@@ -957,6 +992,7 @@ def upload_file_secret():
         return jsonify({"msg": result}), 400
 
     secret = result
+    TypeaheadService.secrets_changed([secret.secret_id])
 
     return jsonify({
         "msg": "File uploaded and encrypted successfully",
@@ -1033,32 +1069,40 @@ def download_file_secret(secret_id):
         return jsonify({"msg": "Unauthorized access"}), 403
 
     current_app.logger.info(f"Retrieving file content for secret {secret_id}")
-    success, result = SecretService.get_file_content(
-        secret=secret,
-        check_permission_func=None,
-        user_id=None
-    )
+    success, result = SecretService.open_file_content(secret)
 
     if not success:
         current_app.logger.error(f"Error retrieving file content: {result}")
         return jsonify({"msg": result}), 400
 
-    file_data = result['data']
-    mime_type = result['mime_type']
-    filename = result['filename']
+    size = result['size']
+    start, stop, status = 0, size, 200
+    headers = {'Accept-Ranges': 'bytes', 'Cache-Control': 'private, no-store'}
 
-    current_app.logger.info(
-        f"Successfully retrieved file for secret {secret_id}, size: {len(file_data)} bytes, type: {mime_type}")
+    # Serve a single byte range as 206; multi-range requests get the whole file
+    byte_range = request.range
+    if byte_range and byte_range.units == 'bytes' and len(byte_range.ranges) == 1:
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            return Response(status=416, headers={'Content-Range': f"bytes */{size}"})
+        start, stop = bounds
+        status = 206
+        headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
 
-    file_stream = io.BytesIO(file_data)
-    file_stream.seek(0)
+    headers['Content-Length'] = str(stop - start)
 
-    return send_file(
-        file_stream,
-        mimetype=mime_type,
-        as_attachment=True,
-        download_name=filename
+    current_app.logger.info(
+        f"Streaming file for secret {secret_id}, bytes {start}-{stop} of {size}, type: {result['mime_type']}")
+
+    # Decryption runs as the client reads; a dropped connection closes the generator
+    response = Response(
+        stream_with_context(result['read_range'](start, stop)),
+        status=status,
+        mimetype=result['mime_type'],
+        headers=headers
     )
+    response.headers.set('Content-Disposition', 'attachment', filename=result['filename'])
+    return response
 
 
 @secrets_bp.route('/<int:secret_id>/revoke-access/<int:revoke_user_id>', methods=['DELETE'])
@@ -1101,6 +1145,7 @@ def revoke_secret_access(secret_id, revoke_user_id):
 
     db.session.delete(permission_to_revoke)
     db.session.commit()
+    TypeaheadService.secrets_changed([secret_id])
 
     current_app.logger.info(f"User {current_user_id} revoked access for user {revoke_user_id} to secret {secret_id}")
 
@@ -1203,6 +1248,7 @@ def update_file_secret(secret_id):
         return jsonify({"msg": result}), 400
 
     secret = result
+    TypeaheadService.secrets_changed([secret.secret_id])
 
     users_with_access = []
 
@@ -1375,6 +1421,7 @@ def move_secret(secret_id):
                 f"User {current_user_id} updated their view of secret {secret_id} to folder {folder_id}")
 
         db.session.commit()
+        TypeaheadService.secrets_changed([secret_id])
 
         users_to_notify = []
         if folder_id is not None and folder and folder.is_shared_folder:
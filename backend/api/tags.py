@@ -8,6 +8,7 @@ from sqlalchemy.exc import IntegrityError
 from backend.models.tag import Tag
 from backend.extensions import db
 from backend.api.utils import check_user_exists
+from backend.services.typeahead_service import TypeaheadService
 
 tags_bp = Blueprint('tags', __name__, url_prefix='/api/tags')
 
@@ -123,6 +124,7 @@ def delete_tag(tag_id):
     try:
         db.session.delete(tag)
         db.session.commit()
+        TypeaheadService.reset()
         
         return jsonify({
             'success': True,
@@ -6,6 +6,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from backend.models.user import User, Role, user_datastore
 from backend.models.enums import UserRole
 from backend.extensions import db
+from backend.services.typeahead_service import TypeaheadService
+from backend.services.wipe_service import WipeService
 from functools import wraps
 
 users_bp = Blueprint('users', __name__)
@@ -321,8 +323,11 @@ def delete_user(user_id):
     if not user:
         return jsonify({"msg": "User not found"}), 404
 
+    WipeService.enqueue_secrets(user.owned_secrets)
+
     user_datastore.delete_user(user)
     db.session.commit()
+    TypeaheadService.reset()
 
     return jsonify({"msg": "User deleted successfully"}), 200
 
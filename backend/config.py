@@ -9,51 +9,32 @@ PROJECT_ROOT = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 LOGS_DIR = PROJECT_ROOT / 'logs'
 SECRETS_DIR = PROJECT_ROOT / 'secrets'
 
+# 'hkdf' derives user keys from one sealed master key, 'sealed' seals one key per user
+DEFAULT_USER_KEY_DERIVATION = 'hkdf'
+
 # Ensure directories exist
 LOGS_DIR.mkdir(exist_ok=True)
 SECRETS_DIR.mkdir(exist_ok=True, mode=0o700)  # Restrictive permissions for secrets
 
 
-def get_secret_from_file(filename):
+def load_app_secrets():
     """
-    Unseals the secret from 'secrets/{filename}' using TPM.
-    Returns the secret as a UTF-8 decoded string.
+    Unseals every secret the application needs at startup in one pass and
+    prints where the time went. Returns the secrets and the timing breakdown.
     """
-    # Import here to avoid circular imports
-    from backend.utils.tpm_manager import TPMManager
-    
-    # Check in environment variables first
-    env_name = f"{filename.upper()}_FILE"
-    if env_name in os.environ:
-        try:
-            # Use the TPM to unseal from the environment-specified path
-            tpm_mgr = TPMManager(secrets_dir=os.path.dirname(os.environ[env_name]))
-            tpm_mgr.generate_or_load_primary_key()
-            secret_bytes = tpm_mgr.unseal_secret(filename=os.path.basename(os.environ[env_name]))
-            return secret_bytes.decode("utf-8", errors='replace')
-        except Exception as e:
-            print(f"Error unsealing secret from environment file {env_name}: {str(e)}")
-    
-    # Try Docker-mounted secrets
-    docker_secrets = "/secrets"
-    if os.path.exists(f"{docker_secrets}/{filename}"):
-        try:
-            tpm_mgr = TPMManager(secrets_dir=docker_secrets)
-            tpm_mgr.generate_or_load_primary_key()
-            secret_bytes = tpm_mgr.unseal_secret(filename=filename)
-            return secret_bytes.decode("utf-8", errors='replace')
-        except Exception as e:
-            print(f"Error unsealing secret from Docker secrets: {str(e)}")
-    
-    # Fall back to the original location
-    try:
-        tpm_mgr = TPMManager(secrets_dir=SECRETS_DIR)
-        tpm_mgr.generate_or_load_primary_key()
-        secret_bytes = tpm_mgr.unseal_secret(filename=filename)
-        return secret_bytes.decode("utf-8", errors='replace')
-    except Exception as e:
-        print(f"Error unsealing secret from app secrets: {str(e)}")
-        raise RuntimeError(f"Failed to unseal secret: {filename}")
+    from backend.utils.secrets_loader import load_startup_secrets
+
+    secrets, timings = load_startup_secrets(
+        ("jwt_secret", "encryption_key", "app_secret", "mariadb_user", "password_salt"),
+        optional=("encryption_key_previous",),
+        app_secrets_dir=SECRETS_DIR
+    )
+    steps = ", ".join(f"{step}={ms}ms" for step, ms in timings.items() if step != 'total')
+    print(f"Unsealed {len(secrets)} startup secrets in {timings['total']}ms ({steps})")
+    return secrets, timings
+
+
+_app_secrets, _app_secret_timings = load_app_secrets()
 
 
 # Configuration class with production settings
@@ -84,16 +65,19 @@ class Config:
     APP_NAME = 'AuthBerry'
     
     # Get secrets from TPM
-    JWT_SECRET = get_secret_from_file("jwt_secret")
+    JWT_SECRET = _app_secrets["jwt_secret"]
     JWT_SECRET_KEY = JWT_SECRET  # For Flask-JWT-Extended
     
-    ENCRYPTION_KEY = get_secret_from_file("encryption_key")
+    ENCRYPTION_KEY = _app_secrets["encryption_key"]
+    # Retired keys kept for decryption only, one per line (newest first)
+    ENCRYPTION_KEYS_PREVIOUS = _app_secrets.get("encryption_key_previous", "").split()
     
-    APP_SECRET_KEY = get_secret_from_file("app_secret")
+    APP_SECRET_KEY = _app_secrets["app_secret"]
     SECRET_KEY = APP_SECRET_KEY  # For Flask
     
-    DB_PASSWORD = get_secret_from_file("mariadb_user")
-    SECURITY_PASSWORD_SALT = get_secret_from_file("password_salt")
+    DB_PASSWORD = _app_secrets["mariadb_user"]
+    SECURITY_PASSWORD_SALT = _app_secrets["password_salt"]
+    STARTUP_SECRET_TIMINGS = _app_secret_timings  # Milliseconds per startup unsealing step
     
     # Database URI - Always MariaDB
     SQLALCHEMY_DATABASE_URI = (
@@ -113,12 +97,62 @@ class Config:
     
     # File upload settings
     MAX_FILE_SIZE = 15 * 1024 * 1024  # 15MB max file size
+    MAX_CONTENT_LENGTH = MAX_FILE_SIZE + 1024 * 1024  # Reject oversized request bodies before parsing
+    UPLOAD_SNIFF_SIZE = 8192  # Bytes inspected to detect an upload's MIME type
     FILE_UPLOAD_PATH = os.environ.get('FILE_UPLOAD_PATH', os.path.join(PROJECT_ROOT, 'file_uploads'))
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+    FILE_ENCRYPTION_ALGORITHM = os.environ.get('FILE_ENCRYPTION_ALGORITHM', 'aes-256-gcm')  # or chacha20-poly1305
+    FILE_CHUNK_SIZE = int(os.environ.get('FILE_CHUNK_SIZE', 64 * 1024))  # Plaintext bytes per encrypted chunk
+    VALUE_ENCRYPTION_ALGORITHM = os.environ.get('VALUE_ENCRYPTION_ALGORITHM', 'auto')  # 'auto' benchmarks at startup
+    VALUE_COMPRESSION_THRESHOLD = int(os.environ.get('VALUE_COMPRESSION_THRESHOLD', 1024))  # Bytes before compressing
+    MAX_SECRET_VALUE_LENGTH = int(os.environ.get('MAX_SECRET_VALUE_LENGTH', 1024 * 1024))  # Characters per text secret
+    SECRET_LIST_PAGE_SIZE = int(os.environ.get('SECRET_LIST_PAGE_SIZE', 100))  # Default secrets per listing page
+    SECRET_LIST_MAX_PAGE_SIZE = int(os.environ.get('SECRET_LIST_MAX_PAGE_SIZE', 500))
     
     # TPM Configuration
     USE_TPM_SEALING = True
     TPM_SECRETS_DIR = os.environ.get('TPM_SECRETS_DIR', '/app/secrets')
+    KEY_PROVIDER = os.environ.get('KEY_PROVIDER', 'tpm')  # tpm, software or simulator
+    USER_KEY_DERIVATION = os.environ.get('USER_KEY_DERIVATION', DEFAULT_USER_KEY_DERIVATION)
+
+    # Unsealed per-user file key cache
+    USER_KEY_CACHE_SIZE = int(os.environ.get('USER_KEY_CACHE_SIZE', 64))
+    USER_KEY_CACHE_TTL = int(os.environ.get('USER_KEY_CACHE_TTL', 300))  # 5 minutes
+
+    # In-memory quick-open indexes, one per active user
+    TYPEAHEAD_MAX_USERS = int(os.environ.get('TYPEAHEAD_MAX_USERS', 16))
+    TYPEAHEAD_IDLE_TTL = int(os.environ.get('TYPEAHEAD_IDLE_TTL', 900))  # Drop indexes unused for 15 minutes
+    TYPEAHEAD_MAX_RESULTS = int(os.environ.get('TYPEAHEAD_MAX_RESULTS', 20))
+
+    # Background re-encryption after key rotation
+    ROTATION_BATCH_SIZE = int(os.environ.get('ROTATION_BATCH_SIZE', 100))  # Secrets per batch
+    ROTATION_IO_BUDGET = int(os.environ.get('ROTATION_IO_BUDGET', 4 * 1024 * 1024))  # File bytes per second
+    ROTATION_BATCH_PAUSE = float(os.environ.get('ROTATION_BATCH_PAUSE', 0.05))  # Seconds between batches
+
+    # Background secure deletion of file blobs
+    WIPE_CHUNK_SIZE = int(os.environ.get('WIPE_CHUNK_SIZE', 1024 * 1024))  # Bytes overwritten per write, max 1MB
+    WIPE_BATCH_SIZE = int(os.environ.get('WIPE_BATCH_SIZE', 50))  # Queued files per batch
+    WIPE_POLL_INTERVAL = float(os.environ.get('WIPE_POLL_INTERVAL', 2.0))  # Seconds between queue checks when idle
+    WIPE_MAX_ATTEMPTS = int(os.environ.get('WIPE_MAX_ATTEMPTS', 5))  # Failed wipes are kept for inspection after this
+
+    # Pre-generated ECDH keypairs for the WebSocket handshake
+    WS_KEYPAIR_POOL_SIZE = int(os.environ.get('WS_KEYPAIR_POOL_SIZE', 64))
+    WS_KEYPAIR_POOL_LOW_WATER = int(os.environ.get('WS_KEYPAIR_POOL_LOW_WATER', 16))  # Refill below this level
+    WS_BINARY_FRAMES = os.environ.get('WS_BINARY_FRAMES', 'true').lower() == 'true'  # Offer raw binary payloads
+    WS_CODECS = os.environ.get('WS_CODECS', 'msgpack,json').split(',')  # Payload codecs, most preferred first
+
+    # Native thread pool for CPU-bound work (password hashing, bulk crypto, images)
+    OFFLOAD_ENABLED = os.environ.get('OFFLOAD_ENABLED', 'true').lower() == 'true'
+    OFFLOAD_POOL_SIZE = int(os.environ.get('OFFLOAD_POOL_SIZE', 4))
+    OFFLOAD_MIN_SIZE = int(os.environ.get('OFFLOAD_MIN_SIZE', 64 * 1024))  # Smaller crypto payloads run inline
+    OFFLOAD_LIMITS = {  # Maximum concurrent calls per operation
+        'password': 2,
+        'file_crypto': 2,
+        'value_crypto': 2,
+        'image': 1,
+        'magic': 2,
+        'wipe': 1
+    }
     
     # Allowed file types for upload
     ALLOWED_FILE_TYPES = {
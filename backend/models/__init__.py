@@ -4,8 +4,9 @@ from backend.models.user import User, Role, UserRoles, user_datastore
 from backend.models.permission import SecretPermission
 from backend.models.secret import Secret
 from backend.models.enums import UserRole, SecretType, user_role_enum, secret_type_enum
-from backend.models.folder import Folder, FolderPermission
+from backend.models.folder import Folder, FolderPermission, FolderClosure
 from backend.models.tag import Tag, secret_tags
+from backend.models.wipe import WipeJob
 
 __all__ = [
     'User',
@@ -20,6 +21,8 @@ __all__ = [
     'secret_type_enum',
     'Folder',
     'FolderPermission',
+    'FolderClosure',
     'Tag',
-    'secret_tags'
+    'secret_tags',
+    'WipeJob'
 ] 
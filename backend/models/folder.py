@@ -62,19 +62,15 @@ class Folder(db.Model):
     )
     
     def get_full_path(self):
-        """Return the full path of the folder (e.g., /parent/child/grandchild)"""
-        path = [self.name]
-        current = self.parent
-        
-        # Prevent infinite loops in case of circular references
-        visited = {self.folder_id}
-        
-        while current and current.folder_id not in visited:
-            path.append(current.name)
-            visited.add(current.folder_id)
-            current = current.parent
-            
-        return "/" + "/".join(reversed(path))
+        """Return the full path of the folder (e.g., /parent/child/grandchild) with one closure table lookup"""
+        names = db.session.execute(
+            db.select(Folder.name)
+            .join(FolderClosure, FolderClosure.ancestor_id == Folder.folder_id)
+            .where(FolderClosure.descendant_id == self.folder_id)
+            .order_by(FolderClosure.depth.desc())
+        ).scalars().all()
+
+        return "/" + "/".join(names or [self.name])
 
     @property
     def is_shared_folder(self):
@@ -104,3 +100,26 @@ class FolderPermission(db.Model):
     # Relationships
     folder = relationship("Folder", back_populates="permissions")
     user = relationship("User", backref="folder_permissions")
+
+
+class FolderClosure(db.Model):
+    """Ancestor and descendant pairs of the folder hierarchy; every folder is also its own ancestor at depth 0"""
+    __tablename__ = 'folder_closure'
+
+    ancestor_id = db.Column(
+        db.Integer,
+        db.ForeignKey('folders.folder_id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    descendant_id = db.Column(
+        db.Integer,
+        db.ForeignKey('folders.folder_id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    # Number of levels between the two folders
+    depth = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        # Ancestor paths; subtrees are served by the primary key
+        db.Index('idx_folder_closure_descendant', 'descendant_id', 'depth'),
+    )
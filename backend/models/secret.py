@@ -1,11 +1,10 @@
 #! /usr/bin/env python3
 
 
-import datetime
-from datetime import timezone
 from sqlalchemy.orm import relationship
 from backend.extensions import db
 from backend.models.enums import secret_type_enum, SecretType
+from sqlalchemy.dialects.mysql import MEDIUMBLOB
 
 
 class Secret(db.Model):
@@ -14,7 +13,10 @@ class Secret(db.Model):
     secret_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     secret_name = db.Column(db.String(255), nullable=False)
-    encrypted_secret_value = db.Column(db.String(2048), nullable=True)
+    # Packed AEAD value with a compression flag (see value_crypto); legacy rows hold text tokens
+    encrypted_secret_value = db.Column(MEDIUMBLOB, nullable=True)
+    # Per-secret data key, wrapped by the owner's or the global key (NULL for legacy secrets)
+    wrapped_data_key = db.Column(db.String(255), nullable=True)
     secret_type = db.Column(secret_type_enum, nullable=False)
     # New column for folder association
     folder_id = db.Column(db.Integer, db.ForeignKey('folders.folder_id'), nullable=True)
@@ -27,18 +29,22 @@ class Secret(db.Model):
     file_size = db.Column(db.Integer, nullable=True)
     file_mime_type = db.Column(db.String(128), nullable=True)
     
-    created_time = db.Column(db.DateTime, default=datetime.datetime.now(timezone.utc))
+    # Evaluated by the database for every row (UTC), so they can serve as listing sort keys
+    created_time = db.Column(db.DateTime, default=db.func.utc_timestamp())
     last_modified = db.Column(
         db.DateTime,
-        default=datetime.datetime.now(timezone.utc),
-        onupdate=datetime.datetime.now(timezone.utc)
+        default=db.func.utc_timestamp(),
+        onupdate=db.func.utc_timestamp()
     )
 
-    # Indexes for search performance
+    # Indexes for search performance and keyset pagination
     __table_args__ = (
         db.Index('idx_secret_name', 'secret_name'),
         db.Index('idx_secret_folder', 'folder_id'),
         db.Index('idx_secret_owner', 'owner_id'),
+        db.Index('idx_secret_modified', 'last_modified', 'secret_id'),
+        db.Index('idx_secret_created', 'created_time', 'secret_id'),
+        db.Index('ft_secret_search', 'secret_name', 'description', mysql_prefix='FULLTEXT'),
     )
 
     # Relationships
@@ -33,6 +33,7 @@ class Tag(db.Model):
     # Index for faster tag lookups
     __table_args__ = (
         db.Index('idx_tag_name_owner', 'name', 'owner_id', unique=True),
+        db.Index('ft_tag_name', 'name', mysql_prefix='FULLTEXT'),
     )
 
     # Relationships
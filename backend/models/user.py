@@ -48,6 +48,11 @@ class User(db.Model, UserMixin):
     active = db.Column(db.Boolean(), default=True)
     fs_uniquifier = db.Column(db.String(255), unique=True, nullable=True)
     confirmed_at = db.Column(db.DateTime())
+
+    # Version of the user's derived file key, incremented on key rotation
+    key_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Key rotation job that last replaced the user's file key
+    key_rotation_job = db.Column(db.Integer, nullable=True)
     
     # Keep the original fields for timestamps
     created_time = db.Column(db.DateTime, default=datetime.datetime.now(timezone.utc))
@@ -86,35 +91,10 @@ class User(db.Model, UserMixin):
 
     def set_profile_photo(self, image_data, max_size=200):
         try:
-            import io
-            import base64
-            from PIL import Image
-            
-            img = Image.open(io.BytesIO(image_data))
-            
-            if img.mode == 'RGBA':
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                background.paste(img, mask=img.split()[-1])
-                img = background
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            width, height = img.size
-            if width > max_size or height > max_size:
-                if width > height:
-                    new_width = max_size
-                    new_height = int(height * (max_size / width))
-                else:
-                    new_height = max_size
-                    new_width = int(width * (max_size / height))
-                
-                img = img.resize((new_width, new_height), Image.LANCZOS)
-            
-            output = io.BytesIO()
-            img.save(output, format='JPEG', optimize=True, quality=75)
-            compressed_data = output.getvalue()
-            
-            self.profile_photo = base64.b64encode(compressed_data).decode('utf-8')
+            from backend.utils.offload import offload
+
+            # Decoding and resampling are CPU-bound; keep them off the gevent hub
+            self.profile_photo = offload('image', User.process_profile_photo, image_data, max_size)
             
             print(f"Profile photo processed and saved as base64 ({len(self.profile_photo)} chars)")
             return True
@@ -123,6 +103,48 @@ class User(db.Model, UserMixin):
             print(f"Error processing profile photo: {e}")
             return False
 
+    @staticmethod
+    def process_profile_photo(image_data, max_size=200):
+        """
+        Converts an uploaded image into a compressed, base64-encoded JPEG thumbnail.
+
+        Args:
+            image_data (bytes): The uploaded image.
+            max_size (int, optional): The maximum width and height in pixels.
+
+        Returns:
+            str: The base64-encoded JPEG.
+        """
+        import io
+        import base64
+        from PIL import Image
+        
+        img = Image.open(io.BytesIO(image_data))
+        
+        if img.mode == 'RGBA':
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        width, height = img.size
+        if width > max_size or height > max_size:
+            if width > height:
+                new_width = max_size
+                new_height = int(height * (max_size / width))
+            else:
+                new_height = max_size
+                new_width = int(width * (max_size / height))
+            
+            img = img.resize((new_width, new_height), Image.LANCZOS)
+        
+        output = io.BytesIO()
+        img.save(output, format='JPEG', optimize=True, quality=75)
+        compressed_data = output.getvalue()
+        
+        return base64.b64encode(compressed_data).decode('utf-8')
+
 
 # Association table for User and Role
 class UserRoles(db.Model):
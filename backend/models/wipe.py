@@ -0,0 +1,15 @@
+#! /usr/bin/env python3
+
+from backend.extensions import db
+from datetime import datetime
+
+
+class WipeJob(db.Model):
+    """Model for a file waiting to be overwritten and removed by the wipe service"""
+    __tablename__ = 'wipe_queue'
+
+    id = db.Column(db.Integer, primary_key=True)
+    file_path = db.Column(db.String(1024), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
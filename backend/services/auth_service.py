@@ -13,6 +13,7 @@ from backend.models.enums import UserRole
 from backend.extensions import db
 from flask_security import login_user, logout_user
 from flask_security.utils import hash_password, verify_password
+from backend.utils.offload import offload
 
 
 class AuthService:
@@ -84,7 +85,7 @@ class AuthService:
             return None, None, None
 
         try:
-            if not verify_password(password, user.password_hash):
+            if not offload('password', verify_password, password, user.password_hash):
                 return None, None, None
         except Exception:
             return None, None, None
@@ -131,7 +132,7 @@ class AuthService:
 
             db.session.commit()
 
-            password_hash = hash_password(password)
+            password_hash = offload('password', hash_password, password)
             admin_user = User(
                 username=username,
                 password_hash=password_hash,
@@ -172,7 +173,7 @@ class AuthService:
             if not user:
                 return None, "Invalid username or password"
 
-            if not verify_password(password, user.password_hash):
+            if not offload('password', verify_password, password, user.password_hash):
                 current_app.logger.warning(f"Failed login attempt for {username}: password verification failed")
                 return None, "Invalid username or password"
 
@@ -223,7 +224,7 @@ class AuthService:
             if existing_user:
                 return None, "Username already exists"
 
-            password_hash = hash_password(password)
+            password_hash = offload('password', hash_password, password)
             new_user = User(
                 username=username,
                 password_hash=password_hash,
@@ -308,12 +309,12 @@ class AuthService:
             if not user:
                 return False, "User not found"
 
-            if not verify_password(current_password, user.password_hash):
+            if not offload('password', verify_password, current_password, user.password_hash):
                 current_app.logger.warning(
                     f"Password update failed for user {user.username}: incorrect current password")
                 return False, "Current password is incorrect"
 
-            user.password_hash = hash_password(new_password)
+            user.password_hash = offload('password', hash_password, new_password)
             db.session.commit()
 
             current_app.logger.info(f"Password updated successfully for user {user.username}")
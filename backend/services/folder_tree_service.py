@@ -0,0 +1,236 @@
+#! /usr/bin/env python3
+
+
+import os
+import logging
+from backend.extensions import db
+from backend.models.folder import Folder, FolderClosure
+
+logger = logging.getLogger(__name__)
+
+
+class FolderTreeService:
+    """
+    Maintains the folder_closure table, which stores every ancestor of every
+    folder together with the distance between them.
+
+    Paths, ancestor checks and subtrees are then read with one indexed query
+    instead of walking parent_id one row at a time. The table is updated in
+    the same transaction as the folder change it mirrors: callers make the
+    change, call the matching method here and commit both together.
+    """
+
+    @staticmethod
+    def add(folder):
+        """
+        Adds a new folder below its parent. Flushes the session if the folder has no ID yet.
+
+        Args:
+            folder (Folder): The new folder, with parent_id set.
+        """
+        if folder.folder_id is None:
+            db.session.flush()
+
+        links = [{'ancestor_id': folder.folder_id, 'descendant_id': folder.folder_id, 'depth': 0}]
+        if folder.parent_id:
+            ancestors = db.session.execute(
+                db.select(FolderClosure.ancestor_id, FolderClosure.depth)
+                .where(FolderClosure.descendant_id == folder.parent_id)
+            ).all()
+            links.extend(
+                {'ancestor_id': ancestor_id, 'descendant_id': folder.folder_id, 'depth': depth + 1}
+                for ancestor_id, depth in ancestors
+            )
+        db.session.execute(db.insert(FolderClosure), links)
+
+    @staticmethod
+    def move(folder_id, new_parent_id):
+        """
+        Moves a folder and its subtree below another folder, or to the top level.
+
+        Args:
+            folder_id (int): The ID of the moved folder.
+            new_parent_id (int): The ID of the new parent, or None for the top level.
+
+        Raises:
+            ValueError: If the new parent lies inside the moved subtree.
+        """
+        if new_parent_id and FolderTreeService.is_ancestor(folder_id, new_parent_id):
+            raise ValueError("Circular reference detected in folder hierarchy")
+
+        subtree = db.session.execute(
+            db.select(FolderClosure.descendant_id, FolderClosure.depth)
+            .where(FolderClosure.ancestor_id == folder_id)
+        ).all()
+        old_ancestor_ids = db.session.execute(
+            db.select(FolderClosure.ancestor_id).where(
+                FolderClosure.descendant_id == folder_id,
+                FolderClosure.depth > 0
+            )
+        ).scalars().all()
+
+        # Links from above the folder into the subtree; links inside the subtree stay
+        if old_ancestor_ids:
+            db.session.execute(
+                db.delete(FolderClosure).where(
+                    FolderClosure.descendant_id.in_([descendant_id for descendant_id, _ in subtree]),
+                    FolderClosure.ancestor_id.in_(old_ancestor_ids)
+                ).execution_options(synchronize_session=False)
+            )
+
+        if new_parent_id:
+            ancestors = db.session.execute(
+                db.select(FolderClosure.ancestor_id, FolderClosure.depth)
+                .where(FolderClosure.descendant_id == new_parent_id)
+            ).all()
+            db.session.execute(db.insert(FolderClosure), [
+                {'ancestor_id': ancestor_id, 'descendant_id': descendant_id, 'depth': ancestor_depth + depth + 1}
+                for ancestor_id, ancestor_depth in ancestors
+                for descendant_id, depth in subtree
+            ])
+
+    @staticmethod
+    def remove(folder_id):
+        """
+        Removes a folder that is about to be deleted. Its subfolders become
+        top-level folders, as the ORM clears their parent_id.
+
+        Args:
+            folder_id (int): The ID of the folder.
+        """
+        subfolder_ids = db.session.execute(
+            db.select(Folder.folder_id).where(Folder.parent_id == folder_id)
+        ).scalars().all()
+        for subfolder_id in subfolder_ids:
+            FolderTreeService.move(subfolder_id, None)
+
+        db.session.execute(
+            db.delete(FolderClosure).where(
+                db.or_(FolderClosure.ancestor_id == folder_id, FolderClosure.descendant_id == folder_id)
+            ).execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def is_ancestor(ancestor_id, folder_id):
+        """
+        Checks whether a folder lies inside another folder's subtree.
+
+        Args:
+            ancestor_id (int): The ID of the possible ancestor.
+            folder_id (int): The ID of the folder.
+
+        Returns:
+            bool: True if folder_id is ancestor_id or lies below it.
+        """
+        return db.session.execute(
+            db.select(FolderClosure.depth).where(
+                FolderClosure.ancestor_id == ancestor_id,
+                FolderClosure.descendant_id == folder_id
+            )
+        ).first() is not None
+
+    @staticmethod
+    def subtree_ids(folder_id):
+        """
+        Returns the IDs of a folder and all folders below it.
+
+        Args:
+            folder_id (int): The ID of the folder.
+
+        Returns:
+            list: The folder IDs, the folder itself first.
+        """
+        return db.session.execute(
+            db.select(FolderClosure.descendant_id)
+            .where(FolderClosure.ancestor_id == folder_id)
+            .order_by(FolderClosure.depth)
+        ).scalars().all()
+
+    @staticmethod
+    def paths(folder_ids):
+        """
+        Builds the full paths of many folders with a single query.
+
+        Args:
+            folder_ids (iterable): The IDs of the folders.
+
+        Returns:
+            dict: Maps each folder ID to its path, e.g. /parent/child.
+        """
+        folder_ids = list(folder_ids)
+        if not folder_ids:
+            return {}
+
+        rows = db.session.execute(
+            db.select(FolderClosure.descendant_id, Folder.name)
+            .join(Folder, Folder.folder_id == FolderClosure.ancestor_id)
+            .where(FolderClosure.descendant_id.in_(folder_ids))
+            .order_by(FolderClosure.descendant_id, FolderClosure.depth.desc())
+        )
+        names = {}
+        for folder_id, name in rows:
+            names.setdefault(folder_id, []).append(name)
+        return {folder_id: "/" + "/".join(path) for folder_id, path in names.items()}
+
+    @staticmethod
+    def rebuild():
+        """
+        Recomputes the whole table from parent_id, e.g. after the migration that
+        adds it or after folders were edited outside the application. Does not commit.
+
+        Returns:
+            int: The number of links written.
+        """
+        parents = dict(db.session.execute(db.select(Folder.folder_id, Folder.parent_id)).all())
+
+        links = []
+        for folder_id in parents:
+            ancestor_id, depth, visited = folder_id, 0, set()
+            # parent_id cycles from older data end the walk instead of looping
+            while ancestor_id is not None and ancestor_id in parents and ancestor_id not in visited:
+                links.append({'ancestor_id': ancestor_id, 'descendant_id': folder_id, 'depth': depth})
+                visited.add(ancestor_id)
+                ancestor_id, depth = parents[ancestor_id], depth + 1
+
+        db.session.execute(db.delete(FolderClosure))
+        if links:
+            db.session.execute(db.insert(FolderClosure), links)
+        return len(links)
+
+    @staticmethod
+    def is_consistent():
+        """
+        Cheaply checks that every folder has its self link, which catches a
+        table that was never filled or has missed folders.
+
+        Returns:
+            bool: True if the number of self links matches the number of folders.
+        """
+        folders = db.session.execute(db.select(db.func.count(Folder.folder_id))).scalar()
+        self_links = db.session.execute(
+            db.select(db.func.count()).select_from(FolderClosure).where(FolderClosure.depth == 0)
+        ).scalar()
+        return folders == self_links
+
+
+def init_folder_tree(app):
+    """
+    Fills the folder closure table when the application server starts if it
+    is empty or out of step with the folders, e.g. right after the migration.
+
+    Args:
+        app (Flask): The application instance.
+    """
+    # CLI commands such as migrations may run before the table exists
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        return
+
+    with app.app_context():
+        try:
+            if not FolderTreeService.is_consistent():
+                links = FolderTreeService.rebuild()
+                db.session.commit()
+                logger.info(f"Rebuilt the folder closure table with {links} links")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to check the folder closure table: {str(e)}")
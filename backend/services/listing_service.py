@@ -0,0 +1,382 @@
+#! /usr/bin/env python3
+
+
+import base64
+import datetime
+import json
+import re
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import aliased
+from backend.extensions import db
+from backend.models.secret import Secret
+from backend.models.permission import SecretPermission, UserSecretView
+from backend.models.folder import Folder, FolderPermission
+from backend.models.tag import Tag, secret_tags
+from backend.models.enums import SecretType
+
+# Sortable columns; secret_id breaks ties so every key is unique
+SORT_COLUMNS = {
+    'modified': Secret.last_modified,
+    'created': Secret.created_time,
+    'name': Secret.secret_name
+}
+DATETIME_SORTS = ('modified', 'created')
+
+# Only word characters reach FULLTEXT boolean mode, so input can never form operators
+SEARCH_TERM = re.compile(r'\w+')
+MAX_SEARCH_TERMS = 10
+
+
+class SecretListingService:
+    """
+    Query engine for secret listings.
+
+    A listing is built from two queries regardless of vault size: one that
+    selects only the list columns as plain rows, resolving the user's access,
+    personal folder view and the visible folder name with outer joins, and one
+    that loads the tag names of all returned secrets through secret_tags.
+    No ORM objects (and no encrypted values) are loaded.
+
+    Listings can be filtered server-side and paginated with keyset cursors:
+    each page continues strictly after the (sort value, secret_id) of the last
+    row of the previous page, so pages stay stable while secrets are added and
+    the database never skips over earlier rows with OFFSET.
+    """
+
+    @staticmethod
+    def encode_cursor(sort, value, secret_id):
+        """
+        Builds the opaque cursor pointing after a row.
+
+        Args:
+            sort (str): The sort key of the listing.
+            value: The sort value of the last row of the page.
+            secret_id (int): The ID of the last row of the page.
+
+        Returns:
+            str: The cursor token.
+        """
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat()
+        payload = json.dumps([sort, value, secret_id], separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(payload).rstrip(b"=").decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor, sort):
+        """
+        Reads a cursor produced by encode_cursor().
+
+        Args:
+            cursor (str): The cursor token.
+            sort (str): The sort key of the current request.
+
+        Returns:
+            tuple: (sort value, secret_id).
+
+        Raises:
+            ValueError: If the cursor is malformed or belongs to another sort key.
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode('utf-8'))
+            if not isinstance(payload, list) or len(payload) != 3:
+                raise TypeError("Cursor is not a 3-element list")
+            cursor_sort, value, secret_id = payload
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        if cursor_sort != sort:
+            raise ValueError("Cursor does not match the sort order")
+
+        try:
+            if sort in DATETIME_SORTS:
+                value = datetime.datetime.fromisoformat(value)
+            elif sort in SORT_COLUMNS:
+                if not isinstance(value, str):
+                    raise TypeError("Name cursor value must be a string")
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise TypeError("Relevance cursor value must be a number")
+            if isinstance(secret_id, bool) or not isinstance(secret_id, int):
+                raise TypeError("Cursor secret_id must be an integer")
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        return value, secret_id
+
+    @staticmethod
+    def _listing_query(user_id):
+        permission = aliased(SecretPermission)
+        view = aliased(UserSecretView)
+        folder = aliased(Folder)
+        folder_permission = aliased(FolderPermission)
+
+        # A personal view wins (even one placing the secret at the root); owners
+        # otherwise see the real folder and other users see the secret unfiled
+        has_view = view.user_id.isnot(None)
+        folder_id = db.case(
+            (has_view, view.folder_id),
+            (Secret.owner_id == user_id, Secret.folder_id),
+            else_=None
+        )
+
+        return db.select(
+            Secret.secret_id,
+            Secret.secret_name,
+            Secret.secret_type,
+            Secret.folder_id.label('real_folder_id'),
+            folder_id.label('folder_id'),
+            db.case(
+                (db.or_(folder.owner_id == user_id, folder_permission.user_id.isnot(None)), folder.name),
+                else_=None
+            ).label('folder_name'),
+            Secret.description,
+            Secret.created_time,
+            Secret.last_modified,
+            Secret.owner_id,
+            permission.user_id.isnot(None).label('has_permission')
+        ).select_from(Secret).outerjoin(
+            permission,
+            db.and_(permission.secret_id == Secret.secret_id, permission.user_id == user_id, permission.can_read)
+        ).outerjoin(
+            view,
+            db.and_(view.secret_id == Secret.secret_id, view.user_id == user_id)
+        ).outerjoin(
+            folder,
+            folder.folder_id == folder_id
+        ).outerjoin(
+            folder_permission,
+            db.and_(
+                folder_permission.folder_id == folder.folder_id,
+                folder_permission.user_id == user_id,
+                folder_permission.can_read
+            )
+        ).where(
+            db.or_(Secret.owner_id == user_id, permission.user_id.isnot(None))
+        ), folder_id
+
+    @staticmethod
+    def _apply_filters(query, folder_id, filters):
+        if filters.get('folder_id') == 'root':
+            query = query.where(folder_id.is_(None))
+        elif filters.get('folder_id') is not None:
+            query = query.where(folder_id == filters['folder_id'])
+        if filters.get('type'):
+            query = query.where(Secret.secret_type == filters['type'])
+        if filters.get('owner_id') is not None:
+            query = query.where(Secret.owner_id == filters['owner_id'])
+        if filters.get('name_prefix'):
+            prefix = filters['name_prefix'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            query = query.where(Secret.secret_name.like(f"{prefix}%", escape='\\'))
+        if filters.get('tag'):
+            query = query.where(
+                db.exists().where(
+                    secret_tags.c.secret_id == Secret.secret_id,
+                    secret_tags.c.tag_id == Tag.tag_id,
+                    Tag.name == filters['tag']
+                )
+            )
+        return query
+
+    @staticmethod
+    def listing_rows(user_id, secret_ids=None):
+        """
+        Loads the unsorted listing rows of the secrets a user can read.
+
+        Args:
+            user_id (int): The ID of the user.
+            secret_ids (iterable, optional): Restrict the rows to these secrets.
+
+        Returns:
+            list: Rows with the columns of the secret list view.
+        """
+        query, _ = SecretListingService._listing_query(int(user_id))
+        if secret_ids is not None:
+            query = query.where(Secret.secret_id.in_(list(secret_ids)))
+        return db.session.execute(query).all()
+
+    @staticmethod
+    def load_tags(secret_ids):
+        """
+        Loads the tag names of many secrets with a single query.
+
+        Args:
+            secret_ids (list): The IDs of the secrets.
+
+        Returns:
+            dict: Maps each secret ID to its list of tag names.
+        """
+        tags = {}
+        if not secret_ids:
+            return tags
+
+        rows = db.session.execute(
+            db.select(secret_tags.c.secret_id, Tag.name)
+            .join(Tag, Tag.tag_id == secret_tags.c.tag_id)
+            .where(secret_tags.c.secret_id.in_(secret_ids))
+        )
+        for secret_id, name in rows:
+            tags.setdefault(secret_id, []).append(name)
+        return tags
+
+    @staticmethod
+    def list_secrets(user_id, filters=None, sort='modified', descending=True, limit=None, cursor=None):
+        """
+        Lists the secrets the user owns or has read permission for.
+
+        Args:
+            user_id (int): The ID of the current user.
+            filters (dict, optional): Any of folder_id (the folder the user sees the
+                secret in, or 'root' for unfiled), tag (a tag name), type, owner_id and
+                name_prefix.
+            sort (str, optional): 'modified', 'created' or 'name'.
+            descending (bool, optional): Sort from the largest value down.
+            limit (int, optional): The page size; all matching secrets if omitted.
+            cursor (str, optional): The next_cursor of the previous page.
+
+        Returns:
+            tuple: (secrets, next_cursor) where secrets holds one dict per secret
+                with the fields of the secret list view and next_cursor is None on
+                the last page.
+
+        Raises:
+            ValueError: If the sort key or cursor is invalid.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Invalid sort key. Must be one of: {', '.join(SORT_COLUMNS)}")
+
+        user_id = int(user_id)
+        query, folder_id = SecretListingService._listing_query(user_id)
+        query = SecretListingService._apply_filters(query, folder_id, filters or {})
+
+        column = SORT_COLUMNS[sort]
+        rows, next_cursor = SecretListingService._fetch_page(
+            query, sort, column, column.key, descending, limit, cursor
+        )
+
+        tags = SecretListingService.load_tags([row.secret_id for row in rows])
+        secrets = [SecretListingService._serialize(row, user_id, tags.get(row.secret_id, [])) for row in rows]
+        return secrets, next_cursor
+
+    @staticmethod
+    def build_search_query(text):
+        """
+        Turns user input into a FULLTEXT boolean mode query that matches any of
+        its words by prefix.
+
+        Args:
+            text (str): The search input.
+
+        Returns:
+            str: The query, empty if the input has no searchable words.
+        """
+        terms = SEARCH_TERM.findall(text or '')
+        return ' '.join(f"{term}*" for term in terms[:MAX_SEARCH_TERMS])
+
+    @staticmethod
+    def search_secrets(user_id, text, filters=None, limit=50, cursor=None):
+        """
+        Searches the names, descriptions and tag names of the secrets the user can
+        read, most relevant first.
+
+        Candidates come from the FULLTEXT indexes on secure_secrets and tags, so
+        the database never scans the whole vault; access control and the listing
+        filters are applied inside the same query.
+
+        Args:
+            user_id (int): The ID of the current user.
+            text (str): The search input.
+            filters (dict, optional): The filters of list_secrets().
+            limit (int, optional): The page size.
+            cursor (str, optional): The next_cursor of the previous page.
+
+        Returns:
+            tuple: (secrets, next_cursor) as for list_secrets(), with a relevance
+                score on every secret.
+
+        Raises:
+            ValueError: If the input has no searchable words or the cursor is invalid.
+        """
+        against = SecretListingService.build_search_query(text)
+        if not against:
+            raise ValueError("Search query is empty")
+
+        user_id = int(user_id)
+        text_match = match(Secret.secret_name, Secret.description, against=against).in_boolean_mode()
+        tag_match = match(Tag.name, against=against).in_boolean_mode()
+
+        # MATCH is typed as a boolean; read the scores as numbers
+        tag_score = db.select(db.func.max(db.type_coerce(tag_match, db.Float))).select_from(
+            secret_tags.join(Tag, Tag.tag_id == secret_tags.c.tag_id)
+        ).where(secret_tags.c.secret_id == Secret.secret_id).correlate(Secret).scalar_subquery()
+        relevance = db.type_coerce(text_match, db.Float) + db.func.coalesce(tag_score, 0)
+
+        candidates = db.union(
+            db.select(Secret.secret_id).where(text_match),
+            db.select(secret_tags.c.secret_id).join(Tag, Tag.tag_id == secret_tags.c.tag_id).where(tag_match)
+        )
+
+        query, folder_id = SecretListingService._listing_query(user_id)
+        query = query.add_columns(relevance.label('relevance')).where(Secret.secret_id.in_(candidates))
+        query = SecretListingService._apply_filters(query, folder_id, filters or {})
+
+        # Cursors are only valid for the query they were issued for
+        rows, next_cursor = SecretListingService._fetch_page(
+            query, f"search:{against}", relevance, 'relevance', True, limit, cursor
+        )
+
+        tags = SecretListingService.load_tags([row.secret_id for row in rows])
+        secrets = []
+        for row in rows:
+            secret = SecretListingService._serialize(row, user_id, tags.get(row.secret_id, []))
+            secret["relevance"] = round(float(row.relevance), 4)
+            secrets.append(secret)
+        return secrets, next_cursor
+
+    @staticmethod
+    def _fetch_page(query, sort, sort_expression, sort_field, descending, limit, cursor):
+        if cursor:
+            value, secret_id = SecretListingService.decode_cursor(cursor, sort)
+            # Spelled out instead of a row comparison so MariaDB can range-scan the index
+            if descending:
+                after = db.or_(
+                    sort_expression < value, db.and_(sort_expression == value, Secret.secret_id < secret_id)
+                )
+            else:
+                after = db.or_(
+                    sort_expression > value, db.and_(sort_expression == value, Secret.secret_id > secret_id)
+                )
+            query = query.where(after)
+
+        if descending:
+            query = query.order_by(sort_expression.desc(), Secret.secret_id.desc())
+        else:
+            query = query.order_by(sort_expression.asc(), Secret.secret_id.asc())
+
+        if limit is not None:
+            # Fetch one extra row to learn whether another page follows
+            query = query.limit(limit + 1)
+
+        rows = db.session.execute(query).all()
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = SecretListingService.encode_cursor(
+                sort, getattr(rows[-1], sort_field), rows[-1].secret_id
+            )
+        return rows, next_cursor
+
+    @staticmethod
+    def _serialize(row, user_id, tags):
+        return {
+            "id": row.secret_id,
+            "name": row.secret_name,
+            "type": row.secret_type,
+            "folder_id": row.folder_id,
+            "folder_name": row.folder_name if row.folder_id else None,
+            "description": row.description or "",
+            "created_time": row.created_time.isoformat(),
+            "last_modified": row.last_modified.isoformat(),
+            "tags": tags,
+            "owner_id": row.owner_id,
+            "is_favorite": False,
+            "is_file_secret": row.secret_type == SecretType.IMAGE.value,
+            "has_direct_access": row.owner_id == user_id or bool(row.has_permission),
+            "real_folder_id": row.real_folder_id
+        }
@@ -0,0 +1,423 @@
+#! /usr/bin/env python3
+
+
+import os
+import time
+import logging
+from pathlib import Path
+from flask import current_app
+from backend.extensions import db, socketio
+from backend.models.secret import Secret
+from backend.models.user import User
+from backend.models.system import SystemSetting
+from backend.utils.encryption import (
+    get_key_ring, decrypt_file, load_user_key, rotate_user_key, retire_previous_user_key,
+    get_user_key_filename, get_previous_user_key_filename, parse_wrapped_key, unwrap_data_keys,
+    rewrap_data_key, reencrypt_value, user_keys_derived, current_user_key, parse_user_file,
+    user_file_header, retire_sealed_user_key
+)
+from backend.utils import value_crypto
+from backend.utils.offload import offload_if_large
+from backend.utils.key_provider import get_key_provider
+
+logger = logging.getLogger(__name__)
+
+# Checkpoint settings persisted in system_settings
+STATUS_KEY = 'rotation_status'
+USER_KEYS_KEY = 'rotation_user_keys'
+LAST_ID_KEY = 'rotation_last_secret_id'
+PROCESSED_KEY = 'rotation_processed'
+FAILED_KEY = 'rotation_failed'
+TOTAL_KEY = 'rotation_total'
+JOB_ID_KEY = 'rotation_job_id'
+
+STATUS_IDLE = 'idle'
+STATUS_RUNNING = 'running'
+STATUS_PAUSED = 'paused'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+_worker = None
+_stop_requested = False
+_job_id = 0
+_rotated_users = set()
+
+
+class RotationService:
+    """
+    Background re-encryption of stored secrets after a key rotation.
+
+    The engine walks secure_secrets in secret_id order, one keyset-paginated
+    batch at a time. Each batch re-encrypts secret values under the current
+    primary key of the global key ring and rewrites file blobs, optionally under
+    freshly rotated per-user keys. Secrets using envelope encryption only have
+    their wrapped data key rewrapped. The last processed secret_id is checkpointed
+    after every batch, so a stopped or interrupted job resumes where it left off.
+    """
+
+    @staticmethod
+    def get_status():
+        """
+        Returns the progress of the current or last rotation job.
+
+        Returns:
+            dict: The job status, checkpoint and counters.
+        """
+        return {
+            'status': SystemSetting.get_setting(STATUS_KEY, STATUS_IDLE),
+            'rotate_user_keys': SystemSetting.get_setting(USER_KEYS_KEY, False),
+            'last_secret_id': SystemSetting.get_setting(LAST_ID_KEY, 0),
+            'processed': SystemSetting.get_setting(PROCESSED_KEY, 0),
+            'failed': SystemSetting.get_setting(FAILED_KEY, 0),
+            'total': SystemSetting.get_setting(TOTAL_KEY, 0),
+            'active': _worker is not None,
+            'key_ids': list(get_key_ring().key_ids)
+        }
+
+    @staticmethod
+    def start(app, rotate_user_keys=False):
+        """
+        Starts a new rotation job, or resumes a paused or interrupted one.
+
+        Args:
+            app (Flask): The application, used to create contexts for the worker.
+            rotate_user_keys (bool, optional): Also replace every user's file key (a new
+                derived version, or a freshly sealed key if user keys are not derived).
+                Ignored when resuming, where the original job's choice is kept.
+
+        Returns:
+            tuple: (success, result) where result is the job status or an error message.
+        """
+        global _worker, _stop_requested
+
+        if _worker is not None:
+            return False, "A key rotation is already running."
+
+        status = SystemSetting.get_setting(STATUS_KEY, STATUS_IDLE)
+        if status not in (STATUS_RUNNING, STATUS_PAUSED):
+            SystemSetting.set_setting(USER_KEYS_KEY, rotate_user_keys, 'boolean')
+            SystemSetting.set_setting(LAST_ID_KEY, 0, 'int')
+            SystemSetting.set_setting(PROCESSED_KEY, 0, 'int')
+            SystemSetting.set_setting(FAILED_KEY, 0, 'int')
+            SystemSetting.set_setting(TOTAL_KEY, Secret.query.count(), 'int')
+            SystemSetting.set_setting(JOB_ID_KEY, SystemSetting.get_setting(JOB_ID_KEY, 0) + 1, 'int')
+        SystemSetting.set_setting(STATUS_KEY, STATUS_RUNNING)
+
+        _stop_requested = False
+        _worker = socketio.start_background_task(RotationService._run, app)
+        return True, RotationService.get_status()
+
+    @staticmethod
+    def stop():
+        """
+        Asks the running job to pause after its current batch.
+
+        Returns:
+            bool: True if a running job was signalled.
+        """
+        global _stop_requested
+
+        if _worker is None:
+            return False
+        _stop_requested = True
+        return True
+
+    @staticmethod
+    def resume_interrupted(app):
+        """
+        Restarts a job that was still running when the process exited.
+
+        Args:
+            app (Flask): The application instance.
+        """
+        with app.app_context():
+            try:
+                if SystemSetting.get_setting(STATUS_KEY) == STATUS_RUNNING:
+                    logger.info("Resuming interrupted key rotation")
+                    RotationService.start(app)
+            except Exception as e:
+                # The settings table may not exist before the first migration
+                logger.warning(f"Could not check for an interrupted key rotation: {str(e)}")
+                db.session.rollback()
+
+    @staticmethod
+    def _run(app):
+        global _worker, _job_id
+
+        _rotated_users.clear()
+        with app.app_context():
+            try:
+                # Users rotated by this job before a pause or restart keep their new key
+                _job_id = SystemSetting.get_setting(JOB_ID_KEY, 0)
+                rotated = db.session.query(User.id).filter(User.key_rotation_job == _job_id)
+                _rotated_users.update(user_id for (user_id,) in rotated)
+                RotationService._process_batches(app)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Key rotation failed: {str(e)}")
+                SystemSetting.set_setting(STATUS_KEY, STATUS_FAILED)
+            finally:
+                db.session.remove()
+                _worker = None
+
+    @staticmethod
+    def _process_batches(app):
+        batch_size = app.config.get('ROTATION_BATCH_SIZE', 100)
+        io_budget = app.config.get('ROTATION_IO_BUDGET', 4 * 1024 * 1024)
+        batch_pause = app.config.get('ROTATION_BATCH_PAUSE', 0.05)
+        storage_dir = app.config.get('FILE_UPLOAD_PATH', 'file_uploads')
+
+        rotate_user_keys = SystemSetting.get_setting(USER_KEYS_KEY, False)
+        last_id = SystemSetting.get_setting(LAST_ID_KEY, 0)
+        processed = SystemSetting.get_setting(PROCESSED_KEY, 0)
+        failed = SystemSetting.get_setting(FAILED_KEY, 0)
+        ring = get_key_ring()
+
+        while not _stop_requested:
+            rows = db.session.query(
+                Secret.secret_id, Secret.encrypted_secret_value, Secret.file_path, Secret.wrapped_data_key
+            ).filter(
+                Secret.secret_id > last_id
+            ).order_by(Secret.secret_id).limit(batch_size).all()
+
+            if not rows:
+                RotationService._finish(rotate_user_keys, failed)
+                return
+
+            throttle_started = time.monotonic()
+            bytes_written = 0
+            data_keys = RotationService._unwrap_batch(rows, rotate_user_keys)
+
+            for secret_id, encrypted_value, file_path, wrapped_data_key in rows:
+                try:
+                    if wrapped_data_key:
+                        # Envelope-encrypted secrets only need their data key rewrapped
+                        RotationService._rewrap_key(
+                            secret_id, wrapped_data_key, data_keys.get(wrapped_data_key), rotate_user_keys
+                        )
+                    else:
+                        if encrypted_value:
+                            RotationService._rotate_value(ring, secret_id, encrypted_value)
+                        if file_path:
+                            bytes_written += RotationService._rotate_file(
+                                ring, secret_id, file_path, storage_dir, rotate_user_keys
+                            )
+                            # A batch of large files must not hold the hub until it ends
+                            RotationService._throttle(bytes_written, throttle_started, io_budget)
+                    processed += 1
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Failed to re-encrypt secret {secret_id}: {str(e)}")
+                last_id = secret_id
+
+            # Re-running a batch is harmless, so checkpoint after committing it
+            db.session.commit()
+            SystemSetting.set_setting(LAST_ID_KEY, last_id, 'int')
+            SystemSetting.set_setting(PROCESSED_KEY, processed, 'int')
+            SystemSetting.set_setting(FAILED_KEY, failed, 'int')
+
+            # Stay within the I/O budget and yield to request handlers
+            RotationService._throttle(bytes_written, throttle_started, io_budget, batch_pause)
+
+        SystemSetting.set_setting(STATUS_KEY, STATUS_PAUSED)
+        logger.info(f"Key rotation paused after secret {last_id}")
+
+    @staticmethod
+    def _throttle(bytes_written, started, io_budget, pause=0):
+        # Sleeps until the bytes written since started fit the budget, and always yields
+        ahead = bytes_written / io_budget - (time.monotonic() - started) if io_budget else 0
+        socketio.sleep(max(pause, ahead))
+
+    @staticmethod
+    def _unwrap_batch(rows, rotate_user_keys):
+        wrapped_keys = [row.wrapped_data_key for row in rows if row.wrapped_data_key]
+
+        if rotate_user_keys:
+            # Rotate each owner's key before unwrapping; unwrapping falls back to the previous key
+            user_ids = set()
+            for wrapped_key in wrapped_keys:
+                try:
+                    user_ids.add(parse_wrapped_key(wrapped_key)[0])
+                except ValueError:
+                    continue
+            for user_id in user_ids - {None}:
+                try:
+                    RotationService._current_user_key(user_id)
+                except Exception as e:
+                    logger.error(f"Failed to rotate key for user {user_id}: {str(e)}")
+
+        return unwrap_data_keys(wrapped_keys, bulk=True)
+
+    @staticmethod
+    def _rewrap_key(secret_id, wrapped_data_key, data_key, rotate_user_keys):
+        if data_key is None:
+            raise ValueError("Data key could not be unwrapped")
+        if wrapped_data_key.startswith(('u:', 'd:')) and not rotate_user_keys:
+            return
+
+        rewrapped = rewrap_data_key(wrapped_data_key, data_key)
+
+        # Compare-and-set so a concurrent re-upload is never overwritten
+        db.session.execute(
+            db.update(Secret)
+            .where(Secret.secret_id == secret_id, Secret.wrapped_data_key == wrapped_data_key)
+            .values(wrapped_data_key=rewrapped, last_modified=Secret.last_modified)
+        )
+
+    @staticmethod
+    def _rotate_value(ring, secret_id, encrypted_value):
+        # Legacy tokens move to the versioned value format as they are rotated
+        rotated = reencrypt_value(encrypted_value)
+
+        # Compare-and-set so a concurrent edit by the user is never overwritten
+        db.session.execute(
+            db.update(Secret)
+            .where(Secret.secret_id == secret_id, Secret.encrypted_secret_value == encrypted_value)
+            .values(encrypted_secret_value=rotated, last_modified=Secret.last_modified)
+        )
+
+    @staticmethod
+    def _rotate_file(ring, secret_id, file_path, storage_dir, rotate_user_keys):
+        absolute_path = os.path.join(storage_dir, file_path)
+        if not os.path.exists(absolute_path):
+            return 0
+
+        with open(absolute_path, 'rb') as f:
+            encrypted_data = f.read()
+
+        if encrypted_data.startswith(b"TPM_USER_"):
+            if not rotate_user_keys:
+                return 0
+            user_id, _, _ = parse_user_file(encrypted_data)
+            version, key = RotationService._current_user_key(user_id)
+            plaintext = decrypt_file(encrypted_data, bulk=True)
+            rotated = user_file_header(user_id, version) + offload_if_large(
+                'file_crypto', len(plaintext), value_crypto.encrypt, plaintext, key
+            )
+        elif encrypted_data.startswith(b"TPM_SEALED:"):
+            # Legacy per-file sealed keys are left untouched
+            return 0
+        else:
+            plaintext = decrypt_file(encrypted_data, bulk=True)
+            rotated = offload_if_large('file_crypto', len(plaintext), ring.encrypt_value, plaintext)
+
+        return len(rotated) if RotationService._replace_file(secret_id, file_path, absolute_path, rotated) else 0
+
+    @staticmethod
+    def _replace_file(secret_id, file_path, absolute_path, data):
+        tmp_path = f"{absolute_path}.rotating"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # The secret may have been deleted or re-uploaded since the file was read, and its
+        # old path queued for wiping. The row lock holds off such a change until the file is
+        # replaced; one committed afterwards queues the rewritten file for wiping instead
+        current_path = db.session.execute(
+            db.select(Secret.file_path).where(Secret.secret_id == secret_id).with_for_update()
+        ).scalar()
+        if current_path != file_path:
+            os.remove(tmp_path)
+            return False
+
+        os.replace(tmp_path, absolute_path)
+        return True
+
+    @staticmethod
+    def _current_user_key(user_id):
+        if user_id in _rotated_users:
+            if user_keys_derived():
+                return current_user_key(user_id, bulk=True)
+            return None, load_user_key(user_id, bulk=True)
+
+        if user_keys_derived():
+            # Every derived version stays readable, so no earlier key has to be kept around
+            rotate_user_key(user_id)
+            RotationService._mark_rotated(user_id)
+            return current_user_key(user_id, bulk=True)
+
+        secrets_dir = Path(current_app.config.get('TPM_SECRETS_DIR', 'secrets'))
+        key_provider = get_key_provider()
+
+        if not key_provider.exists(secrets_dir / get_user_key_filename(user_id)):
+            raise FileNotFoundError(f"No sealed key for user {user_id}")
+        if key_provider.exists(secrets_dir / get_previous_user_key_filename(user_id)):
+            # Left by an earlier job that could not re-encrypt everything; rotating would
+            # overwrite the only key those secrets can still be read with
+            RotationService._settle_user(user_id, current_app.config.get('FILE_UPLOAD_PATH', 'file_uploads'))
+
+        key = rotate_user_key(user_id)
+        RotationService._mark_rotated(user_id)
+        return None, key
+
+    @staticmethod
+    def _mark_rotated(user_id):
+        # Recorded per user, so a resumed job does not rotate the key again
+        db.session.execute(
+            db.update(User).where(User.id == user_id)
+            .values(key_rotation_job=_job_id, last_modified=User.last_modified)
+        )
+        db.session.commit()
+        _rotated_users.add(user_id)
+
+    @staticmethod
+    def _settle_user(user_id, storage_dir):
+        # Moves everything still readable only with the previous sealed key to the current one
+        key = load_user_key(user_id, bulk=True)
+        rows = db.session.query(
+            Secret.secret_id, Secret.file_path, Secret.wrapped_data_key
+        ).filter(Secret.owner_id == user_id).all()
+
+        wrapped_keys = [
+            row.wrapped_data_key for row in rows if (row.wrapped_data_key or '').startswith(f"u:{user_id}:")
+        ]
+        data_keys = unwrap_data_keys(wrapped_keys, bulk=True)
+        for secret_id, file_path, wrapped_data_key in rows:
+            if wrapped_data_key in data_keys:
+                RotationService._rewrap_key(secret_id, wrapped_data_key, data_keys[wrapped_data_key], True)
+            elif file_path and not wrapped_data_key:
+                absolute_path = os.path.join(storage_dir, file_path)
+                if not os.path.exists(absolute_path):
+                    continue
+                with open(absolute_path, 'rb') as f:
+                    encrypted_data = f.read()
+                if encrypted_data.startswith(b"TPM_USER_"):
+                    plaintext = decrypt_file(encrypted_data, bulk=True)
+                    rotated = user_file_header(user_id) + offload_if_large(
+                        'file_crypto', len(plaintext), value_crypto.encrypt, plaintext, key
+                    )
+                    RotationService._replace_file(secret_id, file_path, absolute_path, rotated)
+
+        db.session.commit()
+        retire_previous_user_key(user_id)
+        logger.info(f"Re-encrypted the remaining secrets of user {user_id} before rotating their key")
+
+    @staticmethod
+    def _finish(rotate_user_keys, failed):
+        if rotate_user_keys and failed:
+            # Files that could not be rewritten still need the previous user keys
+            logger.warning(f"Keeping previous user keys: {failed} secrets were not re-encrypted")
+        elif rotate_user_keys:
+            owner_ids = db.session.query(Secret.owner_id).filter(Secret.file_path.isnot(None)).distinct()
+            for (owner_id,) in owner_ids:
+                retire_previous_user_key(owner_id)
+                if user_keys_derived():
+                    # Everything now uses the derived key, so the legacy sealed key can go too
+                    retire_sealed_user_key(owner_id)
+
+        SystemSetting.set_setting(STATUS_KEY, STATUS_COMPLETED)
+        logger.info("Key rotation completed")
+
+
+def init_rotation_service(app):
+    """
+    Resumes an interrupted key rotation when the application server starts.
+
+    Args:
+        app (Flask): The application instance.
+    """
+    # CLI commands such as migrations must not start background work
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        return
+    RotationService.resume_interrupted(app)
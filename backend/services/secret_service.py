@@ -2,6 +2,7 @@
 
 
 import os
+import uuid
 from flask import current_app
 from werkzeug.utils import secure_filename
 import magic
@@ -10,10 +11,13 @@ from backend.models.permission import SecretPermission, UserSecretView
 from backend.models.folder import Folder, FolderPermission
 from backend.extensions import db
 from backend.utils.encryption import (
-    encrypt_file, decrypt_file, get_secure_file_path,
-    validate_file_size, validate_file_type, get_file_extension_from_mime,
-    get_actual_extension_from_mime, secure_delete_file
+    decrypt_file, iter_decrypt_file, get_file_plaintext_size, get_secure_file_path,
+    generate_data_key, wrap_data_key, unwrap_data_key,
+    validate_file_type, get_file_extension_from_mime, get_actual_extension_from_mime, secure_delete_file
 )
+from backend.utils.stream_crypto import StreamEncryptor, DEFAULT_CHUNK_SIZE
+from backend.utils.offload import offload
+from backend.services.wipe_service import WipeService
 
 
 class SecretService:
@@ -35,44 +39,28 @@ class SecretService:
         Returns:
             tuple: (success, result) where success is a boolean and result is the created secret or error message.
         """
+        upload = None
         try:
-            file_data = file.read()
-            file_size = len(file_data)
-            original_filename = secure_filename(file.filename)
-
-            if not validate_file_size(file_size):
-                max_size_mb = current_app.config.get('MAX_FILE_SIZE', 10 * 1024 * 1024) / (1024 * 1024)
-                return False, f"File too large. Maximum allowed size is {max_size_mb}MB."
-
-            mime_type = magic.from_buffer(file_data, mime=True)
-            if not validate_file_type(mime_type):
-                return False, "Unsupported file type. Only image files (PNG, JPG) are allowed."
-
-            secret_type = get_file_extension_from_mime(mime_type)
-
-            actual_extension = get_actual_extension_from_mime(mime_type)
-
-            encrypted_data = encrypt_file(file_data, user_id)
-
-            relative_path, absolute_path = get_secure_file_path(user_id, actual_extension)
-
-            with open(absolute_path, 'wb') as f:
-                f.write(encrypted_data)
+            success, upload = SecretService.store_upload(file, user_id)
+            if not success:
+                return False, upload
 
             secret = Secret(
                 owner_id=user_id,
                 secret_name=secret_name,
-                secret_type=secret_type,
+                secret_type=get_file_extension_from_mime(upload['mime_type']),
                 folder_id=folder_id,
                 description=description,
-                file_path=relative_path,
-                original_filename=original_filename,
-                file_size=file_size,
-                file_mime_type=mime_type
+                file_path=upload['relative_path'],
+                wrapped_data_key=upload['wrapped_data_key'],
+                original_filename=secure_filename(file.filename),
+                file_size=upload['file_size'],
+                file_mime_type=upload['mime_type']
             )
 
             db.session.add(secret)
             db.session.commit()
+            upload = None
 
             if tags:
                 from backend.api.secrets import process_tags
@@ -118,65 +106,63 @@ class SecretService:
 
         except Exception as e:
             db.session.rollback()
+            if isinstance(upload, dict):
+                # Don't leave an orphaned blob behind if the record was never created
+                SecretService._discard_upload(upload)
             current_app.logger.error(f"Error creating file secret: {str(e)}")
             return False, f"Error creating file secret: {str(e)}"
 
     @staticmethod
-    def get_file_content(secret, check_permission_func=None, user_id=None):
+    def open_file_content(secret):
         """
-        Retrieves the decrypted file content for a given secret.
+        Prepares a streamed read of a file secret's decrypted content.
+
+        Chunked AEAD containers are decrypted lazily, only for the requested
+        range and only as the returned iterator is consumed. Older blob formats
+        have to be decrypted up front.
 
         Args:
             secret (Secret): The secret object.
-            check_permission_func (callable, optional): A function to check user permissions.
-            user_id (int, optional): The ID of the user requesting the file.
 
         Returns:
-            tuple: (success, result) where success is a boolean and result is either the file data or an error message.
+            tuple: (success, result) where result is a dict with the plaintext size, mime_type,
+                filename and read_range(start, stop), which returns an iterator over the
+                plaintext bytes in [start, stop), or an error message.
         """
         try:
             if not secret.is_file_secret or not secret.file_path:
                 return False, "This secret does not contain a file."
 
-            if check_permission_func and user_id and not check_permission_func(secret, user_id):
-                return False, "You don't have permission to access this file."
-
             storage_dir = current_app.config.get('FILE_UPLOAD_PATH', 'file_uploads')
             file_path = os.path.join(storage_dir, secret.file_path)
 
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
             if not os.path.exists(file_path):
                 current_app.logger.error(f"File not found at path: {file_path}")
                 return False, "File not found. It may have been deleted or moved."
 
-            try:
+            data_key = unwrap_data_key(secret.wrapped_data_key) if secret.wrapped_data_key else None
+            size = get_file_plaintext_size(file_path, data_key)
+
+            if size is None:
                 with open(file_path, 'rb') as f:
-                    encrypted_data = f.read()
-
-                current_app.logger.info(f"Successfully read encrypted file of size {len(encrypted_data)} bytes")
-            except PermissionError:
-                current_app.logger.error(f"Permission error reading file: {file_path}")
-                return False, "Permission error reading file. Please check file permissions."
-            except Exception as e:
-                current_app.logger.error(f"Error reading file {file_path}: {str(e)}")
-                return False, f"Error reading file: {str(e)}"
-
-            try:
-                decrypted_data = decrypt_file(encrypted_data)
-                current_app.logger.info(f"Successfully decrypted file of size {len(decrypted_data)} bytes")
-            except Exception as e:
-                current_app.logger.error(f"Error decrypting file: {str(e)}")
-                return False, f"Error decrypting file: {str(e)}"
+                    decrypted_data = decrypt_file(f.read(), data_key=data_key)
+                size = len(decrypted_data)
+
+                def read_range(start, stop):
+                    yield decrypted_data[start:stop]
+            else:
+                def read_range(start, stop):
+                    return iter_decrypt_file(file_path, data_key, start=start, stop=stop)
 
             return True, {
-                'data': decrypted_data,
+                'size': size,
                 'mime_type': secret.file_mime_type,
-                'filename': secret.original_filename
+                'filename': secret.original_filename,
+                'read_range': read_range
             }
 
         except Exception as e:
-            current_app.logger.error(f"Error retrieving file content: {str(e)}")
+            current_app.logger.error(f"Error opening file content: {str(e)}")
             return False, f"Error retrieving file content: {str(e)}"
 
     @staticmethod
@@ -191,11 +177,8 @@ class SecretService:
             bool: True if successful, False otherwise.
         """
         try:
-            if secret.file_path:
-                storage_dir = current_app.config.get('FILE_UPLOAD_PATH', 'file_uploads')
-                file_path = os.path.join(storage_dir, secret.file_path)
-
-                secure_delete_file(file_path)
+            # The blob is wiped in the background once the deletion is committed
+            WipeService.enqueue_secrets([secret])
 
             UserSecretView.query.filter_by(secret_id=secret.secret_id).delete()
 
@@ -224,41 +207,24 @@ class SecretService:
         Returns:
             tuple: (success, result) where success is a boolean and result is the updated secret or an error message.
         """
+        upload = None
+        old_file_path = None
         try:
             if file:
-                file_data = file.read()
-                file_size = len(file_data)
-                original_filename = secure_filename(file.filename)
-
-                if not validate_file_size(file_size):
-                    max_size_mb = current_app.config.get('MAX_FILE_SIZE', 10 * 1024 * 1024) / (1024 * 1024)
-                    return False, f"File too large. Maximum allowed size is {max_size_mb}MB."
-
-                mime_type = magic.from_buffer(file_data, mime=True)
-                if not validate_file_type(mime_type):
-                    return False, "Unsupported file type. Only image files (PNG, JPG) are allowed."
-
-                secret_type = get_file_extension_from_mime(mime_type)
-
-                actual_extension = get_actual_extension_from_mime(mime_type)
+                success, upload = SecretService.store_upload(file, secret.owner_id)
+                if not success:
+                    return False, upload
 
                 if secret.file_path:
                     storage_dir = current_app.config.get('FILE_UPLOAD_PATH', 'file_uploads')
                     old_file_path = os.path.join(storage_dir, secret.file_path)
-                    secure_delete_file(old_file_path)
-
-                encrypted_data = encrypt_file(file_data, secret.owner_id)
-
-                relative_path, absolute_path = get_secure_file_path(secret.owner_id, actual_extension)
 
-                with open(absolute_path, 'wb') as f:
-                    f.write(encrypted_data)
-
-                secret.file_path = relative_path
-                secret.original_filename = original_filename
-                secret.file_size = file_size
-                secret.file_mime_type = mime_type
-                secret.secret_type = secret_type
+                secret.file_path = upload['relative_path']
+                secret.wrapped_data_key = upload['wrapped_data_key']
+                secret.original_filename = secure_filename(file.filename)
+                secret.file_size = upload['file_size']
+                secret.file_mime_type = upload['mime_type']
+                secret.secret_type = get_file_extension_from_mime(upload['mime_type'])
 
             if secret_name is not None:
                 secret.secret_name = secret_name
@@ -269,7 +235,12 @@ class SecretService:
             if description is not None:
                 secret.description = description
 
+            # The replaced blob is wiped once the new one is committed
+            if old_file_path:
+                WipeService.enqueue([old_file_path])
+
             db.session.commit()
+            upload = None
 
             if tags is not None:
                 secret.tags = []
@@ -283,9 +254,107 @@ class SecretService:
 
         except Exception as e:
             db.session.rollback()
+            if isinstance(upload, dict):
+                SecretService._discard_upload(upload)
             current_app.logger.error(f"Error updating file secret: {str(e)}")
             return False, f"Error updating file secret: {str(e)}"
 
+    @staticmethod
+    def store_upload(file, user_id):
+        """
+        Encrypts an uploaded file into storage in a single streaming pass.
+
+        The upload is read in fixed-size chunks. MAX_FILE_SIZE is enforced as soon
+        as it is exceeded and the MIME type is sniffed from the first
+        UPLOAD_SNIFF_SIZE bytes only. Chunks are encrypted under a new data key
+        straight into a temporary file, which is fsynced and then atomically
+        renamed into place, so memory use is bounded by the chunk size.
+
+        Args:
+            file (FileStorage): The file object from Flask's request.files.
+            user_id (int): The ID of the user who owns the file.
+
+        Returns:
+            tuple: (success, result) where result is a dict with relative_path, absolute_path,
+                file_size, mime_type and wrapped_data_key, or an error message.
+        """
+        max_size = current_app.config.get('MAX_FILE_SIZE', 10 * 1024 * 1024)
+        chunk_size = current_app.config.get('FILE_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        sniff_size = current_app.config.get('UPLOAD_SNIFF_SIZE', 8192)
+
+        storage_dir = current_app.config.get('FILE_UPLOAD_PATH', 'file_uploads')
+        user_dir = os.path.join(storage_dir, f"user_{user_id}")
+        os.makedirs(user_dir, exist_ok=True)
+        tmp_path = os.path.join(user_dir, f".upload-{uuid.uuid4()}.part")
+
+        data_key = generate_data_key()
+        encryptor = StreamEncryptor(
+            data_key,
+            algorithm=current_app.config.get('FILE_ENCRYPTION_ALGORITHM', 'aes-256-gcm'),
+            chunk_size=chunk_size
+        )
+
+        head = bytearray()
+        mime_type = None
+        file_size = 0
+
+        try:
+            with open(tmp_path, 'wb') as out:
+                while True:
+                    chunk = file.read(chunk_size)
+                    if not chunk:
+                        break
+
+                    file_size += len(chunk)
+                    if file_size > max_size:
+                        return False, f"File too large. Maximum allowed size is {max_size / (1024 * 1024)}MB."
+
+                    if mime_type is None:
+                        head += chunk[:sniff_size - len(head)]
+                        if len(head) >= sniff_size:
+                            mime_type = offload('magic', magic.from_buffer, bytes(head), mime=True)
+                            if not validate_file_type(mime_type):
+                                return False, "Unsupported file type. Only image files (PNG, JPG) are allowed."
+
+                    out.write(encryptor.update(chunk))
+
+                if mime_type is None:
+                    mime_type = offload('magic', magic.from_buffer, bytes(head), mime=True)
+                    if not validate_file_type(mime_type):
+                        return False, "Unsupported file type. Only image files (PNG, JPG) are allowed."
+
+                out.write(encryptor.finalize())
+                out.flush()
+                os.fsync(out.fileno())
+
+            wrapped_data_key = wrap_data_key(data_key, user_id)
+
+            relative_path, absolute_path = get_secure_file_path(user_id, get_actual_extension_from_mime(mime_type))
+            os.replace(tmp_path, absolute_path)
+            tmp_path = None
+
+            return True, {
+                'relative_path': relative_path,
+                'absolute_path': absolute_path,
+                'file_size': file_size,
+                'mime_type': mime_type,
+                'wrapped_data_key': wrapped_data_key
+            }
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _discard_upload(upload):
+        try:
+            WipeService.enqueue([upload['absolute_path']])
+            db.session.commit()
+        except Exception as e:
+            # The failure may have been the database itself; wipe inline instead
+            db.session.rollback()
+            current_app.logger.warning(f"Could not queue discarded upload for wiping: {str(e)}")
+            secure_delete_file(upload['absolute_path'])
+
     @staticmethod
     def check_permission(secret, user_id):
         """
@@ -4,6 +4,8 @@
 from backend.models.secret import Secret
 from backend.models.user import User
 from backend.extensions import db
+from backend.services.typeahead_service import TypeaheadService
+from backend.services.wipe_service import WipeService
 from sqlalchemy.exc import SQLAlchemyError
 import uuid
 import logging
@@ -137,6 +139,7 @@ class SecretsService:
                     setattr(secret, key, value)
 
             db.session.commit()
+            TypeaheadService.secrets_changed([secret_id])
             return secret
 
         except SQLAlchemyError as e:
@@ -168,8 +171,11 @@ class SecretsService:
                 if not has_delete_permission:
                     return False
 
+            WipeService.enqueue_secrets([secret])
+
             db.session.delete(secret)
             db.session.commit()
+            TypeaheadService.secrets_removed([secret_id])
             return True
 
         except SQLAlchemyError as e:
@@ -205,6 +211,7 @@ class SecretsService:
             secret.shared_with.append(shared_with_user)
 
             db.session.commit()
+            TypeaheadService.secrets_changed([secret_id])
             return True
 
         except SQLAlchemyError as e:
@@ -0,0 +1,222 @@
+#! /usr/bin/env python3
+
+
+import logging
+from backend.extensions import db
+from backend.models.secret import Secret
+from backend.models.permission import SecretPermission, UserSecretView
+from backend.models.folder import Folder, FolderPermission, FolderClosure
+from backend.services.listing_service import SecretListingService
+from backend.utils.typeahead import TypeaheadIndex, typeahead_cache
+
+logger = logging.getLogger(__name__)
+
+
+class TypeaheadService:
+    """
+    Per-user typeahead indexes for the quick-open box.
+
+    A user's index is built from the listing query on their first lookup and
+    then answers every keystroke from memory. The write paths report changed
+    and deleted secrets after committing, and only the cached indexes of users
+    who can read those secrets are updated. Folder changes drop the cached
+    indexes of the users who can see the folder's subtree, and tag and user
+    changes that can alter many entries at once drop every cached index; they
+    are rebuilt on the next lookup.
+    """
+
+    @staticmethod
+    def lookup(user_id, text, limit=10):
+        """
+        Completes a secret name, folder path or tag for a user.
+
+        Args:
+            user_id (int): The ID of the user.
+            text (str): What the user has typed so far.
+            limit (int, optional): The maximum number of results.
+
+        Returns:
+            list: Matching secrets as dicts with id, name, folder_id, folder_path,
+                tags, type and score, best match first.
+        """
+        index = typeahead_cache.get(user_id)
+        if index is None:
+            index = TypeaheadService.build_index(user_id)
+        return index.lookup(text, limit)
+
+    @staticmethod
+    def build_index(user_id):
+        """
+        Builds a user's index with three queries and caches it.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            TypeaheadIndex: The new index.
+        """
+        generation = typeahead_cache.generation
+        index = TypeaheadIndex()
+        TypeaheadService._index_rows(index, user_id, SecretListingService.listing_rows(user_id))
+        typeahead_cache.put(user_id, index, generation)
+        return index
+
+    @staticmethod
+    def secrets_changed(secret_ids):
+        """
+        Refreshes secrets in the cached indexes after they were created, renamed,
+        moved, tagged, shared or unshared. Call after committing.
+
+        Args:
+            secret_ids (iterable): The IDs of the changed secrets.
+        """
+        secret_ids = {int(secret_id) for secret_id in secret_ids}
+        typeahead_cache.mark_changed()
+        cached_users = typeahead_cache.cached_users()
+        if not secret_ids or not cached_users:
+            return
+
+        try:
+            # Cached users who cannot read the secrets any more only lose their entries
+            affected = set(cached_users) & TypeaheadService._readers(secret_ids)
+            for user_id in cached_users:
+                index = typeahead_cache.peek(user_id)
+                if index is None:
+                    continue
+                if user_id not in affected:
+                    for secret_id in secret_ids:
+                        index.remove(secret_id)
+                    continue
+
+                rows = SecretListingService.listing_rows(user_id, secret_ids)
+                for secret_id in secret_ids - {row.secret_id for row in rows}:
+                    index.remove(secret_id)
+                TypeaheadService._index_rows(index, user_id, rows)
+        except Exception as e:
+            # A stale index is worse than a rebuild
+            logger.error(f"Failed to update typeahead indexes: {str(e)}")
+            typeahead_cache.clear()
+
+    @staticmethod
+    def secrets_removed(secret_ids):
+        """
+        Drops deleted secrets from every cached index. Call after committing.
+
+        Args:
+            secret_ids (iterable): The IDs of the deleted secrets.
+        """
+        typeahead_cache.mark_changed()
+        for user_id in typeahead_cache.cached_users():
+            index = typeahead_cache.peek(user_id)
+            if index is not None:
+                for secret_id in secret_ids:
+                    index.remove(int(secret_id))
+
+    @staticmethod
+    def folder_users(folder_id):
+        """
+        Finds the users whose indexes show a folder or anything below it: the
+        owners of and users shared on its subfolders, and the owners and viewers
+        of the secrets in them. Call before committing a change that removes
+        the folder or its shares.
+
+        Args:
+            folder_id (int): The ID of the folder.
+
+        Returns:
+            set: The IDs of the affected users with a cached index.
+        """
+        cached_users = set(typeahead_cache.cached_users())
+        if not cached_users:
+            return set()
+
+        subtree = db.select(FolderClosure.descendant_id).where(FolderClosure.ancestor_id == folder_id)
+        users = set()
+        for query in (
+            db.select(Folder.owner_id).where(Folder.folder_id.in_(subtree)),
+            db.select(FolderPermission.user_id).where(FolderPermission.folder_id.in_(subtree)),
+            db.select(Secret.owner_id).where(Secret.folder_id.in_(subtree)),
+            db.select(UserSecretView.user_id).where(UserSecretView.folder_id.in_(subtree))
+        ):
+            users.update(db.session.execute(query.distinct()).scalars())
+        return users & cached_users
+
+    @staticmethod
+    def users_changed(user_ids):
+        """
+        Drops the cached indexes of some users after a change to folders they
+        can see, which may alter the paths and access of many secrets at once.
+        Call after committing.
+
+        Args:
+            user_ids (iterable): The IDs of the affected users.
+        """
+        typeahead_cache.mark_changed()
+        for user_id in user_ids:
+            typeahead_cache.invalidate(user_id)
+
+    @staticmethod
+    def reset():
+        """
+        Drops every cached index after a change that affects many secrets, such
+        as deleting a tag or a user.
+        """
+        typeahead_cache.mark_changed()
+        typeahead_cache.clear()
+
+    @staticmethod
+    def _readers(secret_ids):
+        owners = db.session.execute(
+            db.select(Secret.owner_id).where(Secret.secret_id.in_(secret_ids))
+        ).scalars()
+        shared = db.session.execute(
+            db.select(SecretPermission.user_id).where(
+                SecretPermission.secret_id.in_(secret_ids), SecretPermission.can_read
+            )
+        ).scalars()
+        return set(owners) | set(shared)
+
+    @staticmethod
+    def _index_rows(index, user_id, rows):
+        if not rows:
+            return
+
+        paths = TypeaheadService._folder_paths(user_id)
+        tags = SecretListingService.load_tags([row.secret_id for row in rows])
+        for row in rows:
+            index.add(
+                row.secret_id,
+                row.secret_name,
+                paths.get(row.folder_id, ""),
+                tags.get(row.secret_id, []),
+                folder_id=row.folder_id,
+                type=row.secret_type
+            )
+
+    @staticmethod
+    def _folder_paths(user_id):
+        user_id = int(user_id)
+        rows = db.session.execute(
+            db.select(Folder.folder_id, Folder.name, Folder.parent_id).where(
+                db.or_(
+                    Folder.owner_id == user_id,
+                    db.exists().where(
+                        FolderPermission.folder_id == Folder.folder_id,
+                        FolderPermission.user_id == user_id,
+                        FolderPermission.can_read
+                    )
+                )
+            )
+        ).all()
+        folders = {row.folder_id: row for row in rows}
+
+        paths = {}
+        for folder_id in folders:
+            names, current, visited = [], folders.get(folder_id), set()
+            # Only folders the user can read appear in the path
+            while current is not None and current.folder_id not in visited:
+                names.append(current.name)
+                visited.add(current.folder_id)
+                current = folders.get(current.parent_id)
+            paths[folder_id] = "/" + "/".join(reversed(names))
+        return paths
@@ -0,0 +1,155 @@
+#! /usr/bin/env python3
+
+
+import os
+import logging
+from flask import current_app
+from backend.extensions import db, socketio
+from backend.models.wipe import WipeJob
+from backend.utils.encryption import secure_delete_file
+from backend.utils.offload import offload
+
+logger = logging.getLogger(__name__)
+
+_worker = None
+_stats = {'wiped': 0, 'bytes': 0, 'failed': 0}
+
+
+class WipeService:
+    """
+    Background secure deletion of encrypted file blobs.
+
+    Callers add the files of deleted or replaced secrets to the persistent
+    wipe_queue in the same transaction that removes the secret, so a request
+    only inserts rows and returns. A background worker overwrites each queued
+    file in fixed-size chunks on the offload thread pool, fsyncs it, unlinks
+    it and then drops the row. Jobs survive restarts and failed wipes are
+    retried up to WIPE_MAX_ATTEMPTS times.
+    """
+
+    @staticmethod
+    def enqueue(file_paths):
+        """
+        Queues files for wiping. Does not commit; the caller's commit makes
+        the jobs visible together with the deletion that orphaned the files.
+
+        Args:
+            file_paths (iterable): Absolute paths of the files to wipe.
+
+        Returns:
+            int: The number of queued files.
+        """
+        jobs = [WipeJob(file_path=file_path) for file_path in file_paths if file_path]
+        db.session.add_all(jobs)
+        return len(jobs)
+
+    @staticmethod
+    def enqueue_secrets(secrets):
+        """
+        Queues the stored files of many secrets, e.g. for a folder or user cascade.
+
+        Args:
+            secrets (iterable): Secret objects; secrets without a file are skipped.
+
+        Returns:
+            int: The number of queued files.
+        """
+        storage_dir = current_app.config.get('FILE_UPLOAD_PATH', 'file_uploads')
+        return WipeService.enqueue(
+            os.path.join(storage_dir, secret.file_path) for secret in secrets if secret.file_path
+        )
+
+    @staticmethod
+    def stats():
+        """
+        Returns queue depth and worker counters for monitoring.
+
+        Returns:
+            dict: Pending and failed jobs, files and bytes wiped and whether the worker runs.
+        """
+        max_attempts = current_app.config.get('WIPE_MAX_ATTEMPTS', 5)
+        return {
+            'pending': WipeJob.query.filter(WipeJob.attempts < max_attempts).count(),
+            'failed_jobs': WipeJob.query.filter(WipeJob.attempts >= max_attempts).count(),
+            'wiped': _stats['wiped'],
+            'bytes_wiped': _stats['bytes'],
+            'failed_attempts': _stats['failed'],
+            'active': _worker is not None
+        }
+
+    @staticmethod
+    def start(app):
+        """
+        Starts the background worker if it is not running yet.
+
+        Args:
+            app (Flask): The application, used to create contexts for the worker.
+        """
+        global _worker
+
+        if _worker is None:
+            _worker = socketio.start_background_task(WipeService._run, app)
+
+    @staticmethod
+    def _run(app):
+        global _worker
+
+        poll_interval = app.config.get('WIPE_POLL_INTERVAL', 2.0)
+        try:
+            while True:
+                with app.app_context():
+                    try:
+                        processed = WipeService._process_batch(app)
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error(f"Wipe batch failed: {str(e)}")
+                        processed = 0
+                    finally:
+                        db.session.remove()
+                # Drain a backlog without waiting, otherwise poll
+                socketio.sleep(0 if processed else poll_interval)
+        finally:
+            _worker = None
+
+    @staticmethod
+    def _process_batch(app):
+        batch_size = app.config.get('WIPE_BATCH_SIZE', 50)
+        chunk_size = app.config.get('WIPE_CHUNK_SIZE', 1024 * 1024)
+        max_attempts = app.config.get('WIPE_MAX_ATTEMPTS', 5)
+
+        jobs = WipeJob.query.filter(
+            WipeJob.attempts < max_attempts
+        ).order_by(WipeJob.id).limit(batch_size).all()
+
+        for job in jobs:
+            try:
+                size = os.path.getsize(job.file_path) if os.path.exists(job.file_path) else 0
+            except OSError:
+                size = 0
+
+            # Disk I/O runs on the thread pool so request handlers keep running
+            if offload('wipe', secure_delete_file, job.file_path, chunk_size):
+                db.session.delete(job)
+                _stats['wiped'] += 1
+                _stats['bytes'] += size
+            else:
+                job.attempts += 1
+                job.last_error = "Overwrite or removal failed"
+                _stats['failed'] += 1
+                logger.warning(f"Failed to wipe {job.file_path} (attempt {job.attempts} of {max_attempts})")
+            db.session.commit()
+
+        return len(jobs)
+
+
+def init_wipe_service(app):
+    """
+    Starts the background wipe worker when the application server starts.
+
+    Args:
+        app (Flask): The application instance.
+    """
+    # CLI commands such as migrations must not start background work
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        return
+    WipeService.start(app)
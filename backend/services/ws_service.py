@@ -1,24 +1,63 @@
 #! /usr/bin/env python3
 
 
+import os
 from flask import current_app
 from flask_socketio import emit, join_room, disconnect
 from flask import request
 from flask_jwt_extended import decode_token
 from functools import wraps
 from backend.extensions import socketio
-from backend.utils.crypto import CryptoService
+from backend.utils.crypto import CryptoService, SessionCipher
+from backend.utils.keypair_pool import keypair_pool
+from backend.utils import ws_codec
 from backend.models.user import User
 
+
+class ClientSession:
+    """Per-connection state of a WebSocket client."""
+
+    __slots__ = (
+        'private_key', 'public_key', 'client_public_key', 'cipher', 'binary', 'user_id', 'username', 'role'
+    )
+
+    def __init__(self):
+        self.private_key = None
+        self.public_key = None
+        self.client_public_key = None
+        self.cipher = None
+        self.binary = False
+        self.user_id = None
+        self.username = None
+        self.role = None
+
+
 client_sessions = {}
 
 
+def get_client_session(sid):
+    """
+    Returns the session of a connected client, creating it if needed.
+
+    Args:
+        sid (str): The session ID of the client.
+
+    Returns:
+        ClientSession: The client's session state.
+    """
+    session = client_sessions.get(sid)
+    if session is None:
+        session = client_sessions[sid] = ClientSession()
+    return session
+
+
 def authenticated_only(f):
     """Decorator that checks if a WebSocket connection is authenticated."""
 
     @wraps(f)
     def wrapped(*args, **kwargs):
-        if not hasattr(f, 'sid') or f.sid not in client_sessions or 'user_id' not in client_sessions[f.sid]:
+        session = client_sessions.get(getattr(f, 'sid', None))
+        if session is None or session.user_id is None:
             return disconnect()
         return f(*args, **kwargs)
 
@@ -38,12 +77,9 @@ def handle_disconnect():
     sid = request.sid
     current_app.logger.info(f"Client disconnected: {sid}")
 
-    if sid in client_sessions:
-        user_id = client_sessions[sid].get('user_id')
-        username = client_sessions[sid].get('username')
-        current_app.logger.info(f"Cleaning up session for user {username} (ID: {user_id})")
-
-        del client_sessions[sid]
+    session = client_sessions.pop(sid, None)
+    if session is not None:
+        current_app.logger.info(f"Cleaning up session for user {session.username} (ID: {session.user_id})")
 
 
 @socketio.on('initiate_key_exchange')
@@ -51,15 +87,14 @@ def handle_key_exchange():
     """Initiates a Diffie-Hellman key exchange with the client."""
     sid = request.sid
 
-    keypair = CryptoService.generate_keypair()
-
-    if sid not in client_sessions:
-        client_sessions[sid] = {}
+    # Served from precomputed keys so reconnect storms do not stall the hub
+    private_key, public_key = keypair_pool.acquire()
 
-    client_sessions[sid]['private_key'] = keypair['private_key']
-    client_sessions[sid]['public_key'] = keypair['public_key']
+    session = get_client_session(sid)
+    session.private_key = private_key
+    session.public_key = public_key
 
-    emit('server_public_key', {'public_key': keypair['public_key']})
+    emit('server_public_key', {'public_key': public_key})
 
 
 @socketio.on('client_public_key')
@@ -67,7 +102,8 @@ def handle_client_public_key(data):
     """Receives the client's public key and completes the key exchange."""
     sid = request.sid
 
-    if sid not in client_sessions:
+    session = client_sessions.get(sid)
+    if session is None or session.private_key is None:
         emit('error', {'message': 'Session not initialized'})
         return
 
@@ -76,17 +112,27 @@ def handle_client_public_key(data):
         return
 
     client_public_key = data['public_key']
-    client_sessions[sid]['client_public_key'] = client_public_key
+    session.client_public_key = client_public_key
 
-    server_private_key = client_sessions[sid]['private_key']
-    shared_secret = CryptoService.compute_shared_secret(
-        server_private_key,
+    shared_key = CryptoService.derive_shared_key(
+        session.private_key,
         client_public_key
     )
 
-    client_sessions[sid]['shared_secret'] = shared_secret
+    # Build the channel cipher once; per-message work never touches key material again
+    codec = ws_codec.negotiate(data.get('codecs'), current_app.config.get('WS_CODECS', ('json',)))
+    session.cipher = SessionCipher(shared_key, codec)
+    session.private_key = None
 
-    emit('key_exchange_complete')
+    # Clients that can handle binary attachments get raw nonce + ciphertext instead of base64
+    session.binary = (
+        current_app.config.get('WS_BINARY_FRAMES', True) and 'binary' in (data.get('transports') or ())
+    )
+
+    emit('key_exchange_complete', {
+        'transport': 'binary' if session.binary else 'base64',
+        'codec': codec.name if codec else None
+    })
 
 
 @socketio.on('authenticate')
@@ -110,14 +156,12 @@ def handle_authenticate(data):
             emit('auth_error', {'message': 'User not found'})
             return
 
-        if sid not in client_sessions:
-            client_sessions[sid] = {}
-
-        client_sessions[sid]['user_id'] = user.id
-        client_sessions[sid]['username'] = user.username
-        client_sessions[sid]['role'] = user.role
+        session = get_client_session(sid)
+        session.user_id = user.id
+        session.username = user.username
+        session.role = user.role
 
-        if 'shared_secret' not in client_sessions[sid]:
+        if session.cipher is None:
             emit('auth_error', {'message': 'Key exchange not completed'})
             return
 
@@ -139,13 +183,16 @@ def encrypt_for_client(sid, data):
         data (dict): The data to encrypt.
 
     Returns:
-        str: The encrypted data, or None if the shared secret is not established.
+        bytes | str: The encrypted data, as raw bytes for sessions using binary
+            frames or base64 otherwise, or None if the shared secret is not established.
     """
-    if sid not in client_sessions or 'shared_secret' not in client_sessions[sid]:
+    session = client_sessions.get(sid)
+    if session is None or session.cipher is None:
         return None
 
-    shared_secret = client_sessions[sid]['shared_secret']
-    return CryptoService.encrypt(data, shared_secret)
+    if session.binary:
+        return session.cipher.seal(data)
+    return session.cipher.encrypt(data)
 
 
 def decrypt_from_client(sid, encrypted_data):
@@ -154,16 +201,18 @@ def decrypt_from_client(sid, encrypted_data):
 
     Args:
         sid (str): The session ID of the client.
-        encrypted_data (str): The encrypted data to decrypt.
+        encrypted_data (bytes | str): The encrypted data to decrypt, raw or base64-encoded.
 
     Returns:
         dict: The decrypted data, or None if the shared secret is not established or decryption fails.
     """
-    if sid not in client_sessions or 'shared_secret' not in client_sessions[sid]:
+    session = client_sessions.get(sid)
+    if session is None or session.cipher is None:
         return None
 
-    shared_secret = client_sessions[sid]['shared_secret']
-    return CryptoService.decrypt(encrypted_data, shared_secret)
+    if isinstance(encrypted_data, (bytes, bytearray)):
+        return session.cipher.open(bytes(encrypted_data))
+    return session.cipher.decrypt(encrypted_data)
 
 
 def has_shared_secret(sid):
@@ -176,7 +225,8 @@ def has_shared_secret(sid):
     Returns:
         bool: True if a shared secret is established, False otherwise.
     """
-    return sid in client_sessions and 'shared_secret' in client_sessions[sid]
+    session = client_sessions.get(sid)
+    return session is not None and session.cipher is not None
 
 
 def init_ws_service(app):
@@ -186,6 +236,14 @@ def init_ws_service(app):
     Args:
         app (Flask): The Flask application instance.
     """
+    keypair_pool.configure(
+        size=app.config.get('WS_KEYPAIR_POOL_SIZE', 64),
+        low_water=app.config.get('WS_KEYPAIR_POOL_LOW_WATER', 16)
+    )
+    # CLI commands such as migrations must not start background work
+    if os.environ.get('FLASK_RUN_FROM_CLI') != 'true':
+        keypair_pool.start(socketio.start_background_task, socketio.sleep)
+
     try:
         from backend.ws import auth, secrets, folders
 
@@ -3,12 +3,15 @@
 
 import os
 import base64
+import itertools
 import json
+import struct
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from backend.utils import ws_codec
 
 
 class CryptoService:
@@ -41,6 +44,23 @@ class CryptoService:
             'public_key': base64.b64encode(public_bytes).decode('utf-8')
         }
 
+    @staticmethod
+    def generate_ephemeral_keypair():
+        """
+        Generates a P-256 ECDH key pair for one handshake without serializing the private key.
+
+        Returns:
+            tuple: (private_key, public_key_b64) where private_key is an
+                EllipticCurvePrivateKey and public_key_b64 is the base64-encoded
+                SubjectPublicKeyInfo sent to the client.
+        """
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        public_bytes = private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        return private_key, base64.b64encode(public_bytes).decode('utf-8')
+
     @staticmethod
     def compute_shared_secret(private_key_b64, peer_public_key_b64):
         """
@@ -54,13 +74,31 @@ class CryptoService:
         Returns:
             str: The base64-encoded derived shared encryption key.
         """
-        private_key_bytes = base64.b64decode(private_key_b64)
+        derived_key = CryptoService.derive_shared_key(private_key_b64, peer_public_key_b64)
+        return base64.b64encode(derived_key).decode('utf-8')
+
+    @staticmethod
+    def derive_shared_key(private_key_b64, peer_public_key_b64):
+        """
+        Computes the ECDH shared secret and derives the raw AES-256 key with HKDF.
+
+        Args:
+            private_key_b64 (str | EllipticCurvePrivateKey): The local private key,
+                base64-encoded or as a key object.
+            peer_public_key_b64 (str): The base64-encoded public key of the peer.
+
+        Returns:
+            bytes: The 32-byte derived shared encryption key.
+        """
         peer_public_key_bytes = base64.b64decode(peer_public_key_b64)
 
-        private_key = serialization.load_der_private_key(
-            private_key_bytes,
-            password=None
-        )
+        if isinstance(private_key_b64, str):
+            private_key = serialization.load_der_private_key(
+                base64.b64decode(private_key_b64),
+                password=None
+            )
+        else:
+            private_key = private_key_b64
 
         peer_public_key = serialization.load_der_public_key(
             peer_public_key_bytes
@@ -75,7 +113,7 @@ class CryptoService:
             info=b'AuthBerry E2EE Key'
         ).derive(shared_key)
 
-        return base64.b64encode(derived_key).decode('utf-8')
+        return derived_key
 
     @staticmethod
     def encrypt(data, key_b64):
@@ -131,3 +169,107 @@ class CryptoService:
             return json.loads(plaintext.decode('utf-8'))
         except:
             return plaintext.decode('utf-8')
+
+
+class SessionCipher:
+    """
+    AES-256-GCM channel cipher for one established WebSocket session.
+
+    The AESGCM object is built once when the key exchange completes, so
+    encrypting or decrypting a message involves no key decoding. Outgoing
+    nonces are a 4-byte direction tag followed by a 64-bit message counter,
+    which cannot repeat under the session key; messages carrying the server
+    direction tag are rejected on receipt so they cannot be reflected back.
+    A message is nonce + ciphertext, sent either as raw bytes (binary frames)
+    or base64-encoded (text frames). Sessions that negotiated a codec carry
+    its id as the first plaintext byte; others use untagged JSON.
+    """
+
+    __slots__ = ('_aesgcm', '_counter', 'codec')
+
+    SERVER_DIRECTION = b'\x00\x00\x00\x01'
+    CLIENT_DIRECTION = b'\x00\x00\x00\x02'
+    NONCE_SIZE = 12
+
+    def __init__(self, key, codec=None):
+        """
+        Initializes the SessionCipher.
+
+        Args:
+            key (bytes): The raw 32-byte shared encryption key.
+            codec (ws_codec.Codec, optional): The negotiated payload codec.
+        """
+        self._aesgcm = AESGCM(key)
+        self._counter = itertools.count()
+        self.codec = codec
+
+    def encrypt(self, data):
+        """
+        Encrypts a server-to-client message for a text frame.
+
+        Args:
+            data (dict or bytes): The data to encrypt. If a dictionary, it will be JSON-serialized.
+
+        Returns:
+            str: The base64-encoded encrypted data, including the nonce.
+        """
+        return base64.b64encode(self.seal(data)).decode('utf-8')
+
+    def decrypt(self, encrypted_data_b64):
+        """
+        Decrypts a base64-encoded client-to-server message.
+
+        Args:
+            encrypted_data_b64 (str): The base64-encoded encrypted data (including nonce).
+
+        Returns:
+            dict or str: The decrypted data, parsed as JSON if possible, otherwise as a string.
+        """
+        return self.open(base64.b64decode(encrypted_data_b64))
+
+    def seal(self, data):
+        """
+        Encrypts a server-to-client message for a binary frame.
+
+        Args:
+            data (dict or bytes): The data to encrypt. Dictionaries are serialized
+                with the session codec, or as JSON if none was negotiated.
+
+        Returns:
+            bytes: The nonce followed by the ciphertext.
+        """
+        if self.codec is not None:
+            data = self.codec.encode(data)
+        elif not isinstance(data, bytes):
+            data = json.dumps(data).encode('utf-8')
+
+        nonce = self.SERVER_DIRECTION + struct.pack('>Q', next(self._counter))
+        return nonce + self._aesgcm.encrypt(nonce, data, None)
+
+    def open(self, encrypted_data):
+        """
+        Decrypts a raw client-to-server message.
+
+        Args:
+            encrypted_data (bytes): The nonce followed by the ciphertext.
+
+        Returns:
+            dict or str: The decrypted data, parsed as JSON if possible, otherwise as a string.
+
+        Raises:
+            ValueError: If the message carries a server-direction nonce.
+            cryptography.exceptions.InvalidTag: If the message fails authentication.
+        """
+        nonce = encrypted_data[:self.NONCE_SIZE]
+        if nonce[:len(self.SERVER_DIRECTION)] == self.SERVER_DIRECTION:
+            raise ValueError("Refusing to decrypt a server-direction message")
+
+        plaintext = self._aesgcm.decrypt(nonce, encrypted_data[self.NONCE_SIZE:], None)
+
+        if self.codec is not None:
+            return ws_codec.decode(plaintext)
+
+        try:
+            return json.loads(plaintext.decode('utf-8'))
+        except ValueError:
+            return plaintext.decode('utf-8')
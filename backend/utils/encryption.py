@@ -2,14 +2,23 @@
 
 
 import os
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken
 from flask import current_app
 import logging
 import uuid
 from pathlib import Path
+from backend.config import DEFAULT_USER_KEY_DERIVATION
+from backend.utils.key_cache import user_key_cache
+from backend.utils.key_provider import get_key_provider
+from backend.utils.key_ring import key_ring
+from backend.utils.user_key_deriver import user_key_deriver
+from backend.utils import stream_crypto, value_crypto
+from backend.utils.offload import offload_if_large
 
 logger = logging.getLogger(__name__)
 
+DECRYPTION_ERROR = "[Error: Unable to decrypt value]"
+
 
 def get_encryption_key():
     """
@@ -29,61 +38,134 @@ def get_encryption_key():
     return key.encode('utf-8')
 
 
-def encrypt_value(value):
+def get_key_ring():
+    """
+    Returns the global encryption key ring, loading it from the application
+    configuration if create_app() has not done so already.
+
+    Returns:
+        KeyRing: The loaded key ring.
+
+    Raises:
+        ValueError: If no encryption key is found in the app config.
+    """
+    if not key_ring.loaded:
+        key_ring.load_from_config(current_app.config)
+    return key_ring
+
+
+def encrypt_value(value, data_key=None):
     """
-    Encrypts a string value using Fernet symmetric encryption with the global key.
+    Encrypts a string value as a packed versioned AEAD value (see value_crypto) with the
+    primary global key, or with a per-secret data key if one is given. Values of at least
+    VALUE_COMPRESSION_THRESHOLD bytes are compressed before encryption.
 
     Args:
         value (str): The string value to encrypt.
+        data_key (bytes, optional): The secret's data key.
 
     Returns:
-        str: The encrypted value as a base64 string.
+        bytes: The encrypted value, stored as is in the binary value column.
 
     Raises:
         Exception: If an error occurs during encryption.
     """
     if not value:
-        return ""
+        return b""
 
     try:
-        key = get_encryption_key()
-
-        fernet = Fernet(key)
-
         value_bytes = value.encode('utf-8')
-        encrypted_bytes = fernet.encrypt(value_bytes)
-
-        return encrypted_bytes.decode('utf-8')
+        threshold = current_app.config.get('VALUE_COMPRESSION_THRESHOLD', 1024)
+        if data_key:
+            return offload_if_large(
+                'value_crypto', len(value_bytes), value_crypto.encrypt, value_bytes, data_key, threshold
+            )
+        return offload_if_large('value_crypto', len(value_bytes), get_key_ring().encrypt_value, value_bytes, threshold)
     except Exception as e:
         logger.error(f"Error encrypting value: {str(e)}")
         raise
 
 
-def decrypt_value(encrypted_value):
+def _parse_stored_value(encrypted_value):
+    # Values are stored as raw versioned blobs; older rows hold text, either a
+    # base64url versioned blob or a legacy Fernet token
+    if isinstance(encrypted_value, str):
+        encrypted_value = encrypted_value.encode('utf-8')
+    if value_crypto.is_encrypted_value(encrypted_value):
+        return encrypted_value, None
+    blob = value_crypto.from_text(encrypted_value)
+    return (blob, None) if blob is not None else (None, encrypted_value)
+
+
+def decrypt_value(encrypted_value, data_key=None):
     """
-    Decrypts a base64-encoded string value using Fernet symmetric encryption with the global key.
+    Decrypts a stored string value. Versioned values are decrypted with the key named in
+    their header; legacy Fernet tokens are tried with the primary global key first and
+    then any previous keys. If a per-secret data key is given, only that key is used.
 
     Args:
-        encrypted_value (str): The encrypted value as a base64 string.
+        encrypted_value (bytes | str): The stored value.
+        data_key (bytes, optional): The secret's data key.
 
     Returns:
-        str: The decrypted value, or an error placeholder if decryption fails.
+        str: The decrypted value, or DECRYPTION_ERROR if decryption fails.
     """
     if not encrypted_value:
         return ""
 
     try:
-        key = get_encryption_key()
-
-        fernet = Fernet(key)
-
-        encrypted_bytes = encrypted_value.encode('utf-8')
-        decrypted_bytes = fernet.decrypt(encrypted_bytes)
+        blob, token = _parse_stored_value(encrypted_value)
+        if blob is not None:
+            if data_key:
+                decrypted_bytes = offload_if_large('value_crypto', len(blob), value_crypto.decrypt, blob, data_key)
+            else:
+                decrypted_bytes = offload_if_large('value_crypto', len(blob), get_key_ring().decrypt_value, blob)
+        else:
+            cipher = Fernet(data_key) if data_key else get_key_ring()
+            decrypted_bytes = offload_if_large('value_crypto', len(token), cipher.decrypt, token)
 
         return decrypted_bytes.decode('utf-8')
     except Exception as e:
         logger.error(f"Error decrypting value: {str(e)}")
-        return "[Error: Unable to decrypt value]"
+        return DECRYPTION_ERROR
+
+
+def is_legacy_value(encrypted_value):
+    """
+    Checks whether a stored value predates the packed binary format, i.e. it is a
+    legacy Fernet token or a base64url text value.
+
+    Args:
+        encrypted_value (bytes | str): The stored value.
+
+    Returns:
+        bool: True if the value should be re-encrypted in the current format.
+    """
+    if not encrypted_value:
+        return False
+    if isinstance(encrypted_value, str):
+        return True
+    return not (value_crypto.is_encrypted_value(encrypted_value) and encrypted_value[0] == value_crypto.VERSION_PACKED)
+
+
+def reencrypt_value(encrypted_value):
+    """
+    Re-encrypts a value stored under the global key ring with the current primary key
+    in the current format, migrating legacy Fernet tokens and text values.
+
+    Args:
+        encrypted_value (bytes | str): The stored value.
+
+    Returns:
+        bytes: The re-encrypted value.
+
+    Raises:
+        Exception: If the value cannot be decrypted.
+    """
+    ring = get_key_ring()
+    blob, token = _parse_stored_value(encrypted_value)
+    plaintext = ring.decrypt_value(blob) if blob is not None else ring.decrypt(token)
+    return ring.encrypt_value(plaintext, current_app.config.get('VALUE_COMPRESSION_THRESHOLD', 1024))
 
 
 def get_user_key_filename(user_id):
@@ -99,49 +181,534 @@ def get_user_key_filename(user_id):
     return f"user_{user_id}_key.sealed"
 
 
-def ensure_user_key(user_id):
+def get_previous_user_key_filename(user_id):
+    """
+    Generates the filename for a user's retired TPM-sealed encryption key, which is
+    kept while the user's files are re-encrypted after a key rotation.
+
+    Args:
+        user_id (int): The ID of the user.
+
+    Returns:
+        str: The filename for the user's previous key.
+    """
+    return f"user_{user_id}_key.previous.sealed"
+
+
+def load_user_key(user_id, bulk=False):
+    """
+    Returns a user's existing TPM-sealed encryption key, serving it from the
+    in-process key cache when possible.
+
+    Args:
+        user_id (int): The ID of the user.
+        bulk (bool, optional): Queue TPM work behind interactive requests.
+
+    Returns:
+        bytes: The unsealed encryption key for the user.
+
+    Raises:
+        FileNotFoundError: If the user has no sealed key.
+    """
+    key = user_key_cache.get(user_id)
+    if key is not None:
+        return key
+
+    secrets_dir = current_app.config.get('TPM_SECRETS_DIR', 'secrets')
+
+    key = get_key_provider().unseal(Path(secrets_dir) / get_user_key_filename(user_id), bulk=bulk)
+    user_key_cache.put(user_id, key)
+    return key
+
+
+def invalidate_user_key(user_id):
+    """
+    Evicts a user's key from the in-process key cache. Must be called whenever
+    the user's sealed key is replaced so that stale key material is not reused.
+
+    Args:
+        user_id (int): The ID of the user.
+
+    Returns:
+        bool: True if a cached key was evicted, False otherwise.
+    """
+    return user_key_cache.invalidate(user_id)
+
+
+def load_previous_user_key(user_id, bulk=False):
+    """
+    Returns a user's retired encryption key while a rotation is in progress.
+
+    Args:
+        user_id (int): The ID of the user.
+        bulk (bool, optional): Queue TPM work behind interactive requests.
+
+    Returns:
+        bytes: The previous key, or None if the user has no retired key.
+    """
+    secrets_dir = current_app.config.get('TPM_SECRETS_DIR', 'secrets')
+    key_path = Path(secrets_dir) / get_previous_user_key_filename(user_id)
+
+    key_provider = get_key_provider()
+    if not key_provider.exists(key_path):
+        return None
+    return key_provider.unseal(key_path, bulk=bulk)
+
+
+def rotate_user_key(user_id, bulk=True):
+    """
+    Replaces a user's sealed key with a freshly generated one. The current key is
+    first sealed as the user's previous key so existing files stay readable until
+    they have been re-encrypted. With derived user keys, the user's key version is
+    incremented instead; earlier versions remain derivable.
+
+    Args:
+        user_id (int): The ID of the user.
+        bulk (bool, optional): Queue TPM work behind interactive requests.
+
+    Returns:
+        bytes: The new encryption key.
+    """
+    if user_keys_derived():
+        from backend.extensions import db
+        from backend.models.user import User
+
+        db.session.execute(
+            db.update(User).where(User.id == user_id).values(key_version=User.key_version + 1)
+        )
+        db.session.commit()
+        version = get_user_key_version(user_id)
+        logger.info(f"Rotated encryption key for user {user_id} to version {version}")
+        return derive_user_key(user_id, version)
+
+    secrets_dir = current_app.config.get('TPM_SECRETS_DIR', 'secrets')
+    key_provider = get_key_provider()
+
+    key_path = Path(secrets_dir) / get_user_key_filename(user_id)
+    if key_provider.exists(key_path):
+        current_key = load_user_key(user_id, bulk=bulk)
+        key_provider.seal(current_key, Path(secrets_dir) / get_previous_user_key_filename(user_id), bulk=bulk)
+
+    key = Fernet.generate_key()
+    key_provider.seal(key, key_path, bulk=bulk)
+    invalidate_user_key(user_id)
+    user_key_cache.put(user_id, key)
+
+    logger.info(f"Rotated encryption key for user {user_id}")
+    return key
+
+
+def retire_previous_user_key(user_id):
     """
-    Ensures a user has a TPM-sealed encryption key, generating one if it doesn't exist.
-    If TPM sealing is not enabled or fails, it falls back to the global encryption key.
+    Deletes a user's previous key once all of their files use the current key.
 
     Args:
         user_id (int): The ID of the user.
 
+    Returns:
+        bool: True if a previous key was removed.
+    """
+    secrets_dir = current_app.config.get('TPM_SECRETS_DIR', 'secrets')
+    return get_key_provider().remove(Path(secrets_dir) / get_previous_user_key_filename(user_id))
+
+
+def retire_sealed_user_key(user_id):
+    """
+    Deletes a user's individually sealed key once all of their data uses the
+    derived user key.
+
+    Args:
+        user_id (int): The ID of the user.
+
+    Returns:
+        bool: True if a sealed key was removed.
+    """
+    secrets_dir = current_app.config.get('TPM_SECRETS_DIR', 'secrets')
+    invalidate_user_key(user_id)
+    return get_key_provider().remove(Path(secrets_dir) / get_user_key_filename(user_id))
+
+
+def create_user_key(user_id, bulk=False):
+    """
+    Returns a user's TPM-sealed encryption key, generating and sealing a new one
+    if the user does not have one yet.
+
+    Args:
+        user_id (int): The ID of the user.
+        bulk (bool, optional): Queue TPM work behind interactive requests.
+
     Returns:
         bytes: The encryption key for the user.
+
+    Raises:
+        Exception: If the key cannot be unsealed or sealed.
     """
-    try:
-        from backend.utils.tpm_manager import TPMManager
+    secrets_dir = current_app.config.get('TPM_SECRETS_DIR', 'secrets')
+
+    filename = get_user_key_filename(user_id)
+
+    key_path = Path(secrets_dir) / filename
+    if get_key_provider().exists(key_path):
+        logger.info(f"Using existing key for user {user_id}")
+        return load_user_key(user_id, bulk=bulk)
+
+    logger.info(f"Generating new key for user {user_id}")
+    os.makedirs(secrets_dir, exist_ok=True)
+
+    key = Fernet.generate_key()
+    get_key_provider().seal(key, key_path, bulk=bulk)
+    user_key_cache.put(user_id, key)
+    return key
+
+
+def user_keys_derived():
+    """
+    Checks whether per-user keys are derived from the sealed master key rather
+    than sealed individually (USER_KEY_DERIVATION = 'hkdf').
+
+    Returns:
+        bool: True if new user keys are derived.
+    """
+    return (current_app.config.get('USE_TPM_SEALING', False)
+            and current_app.config.get('USER_KEY_DERIVATION', DEFAULT_USER_KEY_DERIVATION) == 'hkdf')
+
+
+def load_user_master_key():
+    """
+    Unseals the master key for derived user keys if it is not loaded yet,
+    creating it on first use. This is the only TPM operation for derived keys.
+    """
+    if not user_key_deriver.loaded:
         secrets_dir = current_app.config.get('TPM_SECRETS_DIR', 'secrets')
+        user_key_deriver.load_from_provider(get_key_provider(), secrets_dir)
 
-        filename = get_user_key_filename(user_id)
 
-        tpm = TPMManager(secrets_dir)
-        tpm.generate_or_load_primary_key()
+def get_user_key_version(user_id):
+    """
+    Returns the current version of a user's derived key.
 
-        key_path = Path(secrets_dir) / filename
-        if key_path.exists():
-            logger.info(f"Using existing key for user {user_id}")
-            return tpm.unseal_secret(filename)
-        else:
-            logger.info(f"Generating new key for user {user_id}")
-            key = Fernet.generate_key()
-            tpm.seal_secret(key, filename)
-            return key
+    Args:
+        user_id (int): The ID of the user.
+
+    Returns:
+        int: The key version.
+
+    Raises:
+        ValueError: If the user does not exist.
+    """
+    from backend.extensions import db
+    from backend.models.user import User
+
+    version = db.session.query(User.key_version).filter(User.id == user_id).scalar()
+    if version is None:
+        raise ValueError(f"User {user_id} does not exist")
+    return version
+
+
+def derive_user_key(user_id, version):
+    """
+    Derives a version of a user's key from the sealed master key.
+
+    Args:
+        user_id (int): The ID of the user.
+        version (int): The key version.
+
+    Returns:
+        bytes: The user's key for that version.
+    """
+    load_user_master_key()
+    return user_key_deriver.derive(user_id, version)
+
+
+def current_user_key(user_id, bulk=False):
+    """
+    Returns the key new data of a user is encrypted with: the derived key of the
+    user's current version, or the user's sealed key if keys are not derived.
+
+    Args:
+        user_id (int): The ID of the user.
+        bulk (bool, optional): Queue TPM work behind interactive requests.
+
+    Returns:
+        tuple: (version, key) where version is None for a sealed key.
+
+    Raises:
+        Exception: If the key cannot be derived, unsealed or sealed.
+    """
+    if user_keys_derived():
+        version = get_user_key_version(user_id)
+        return version, derive_user_key(user_id, version)
+    return None, create_user_key(user_id, bulk=bulk)
+
+
+def user_file_header(user_id, version=None):
+    """
+    Builds the prefix of a file encrypted under a user key.
+
+    Args:
+        user_id (int): The ID of the user.
+        version (int, optional): The derived key version; None for the sealed key.
+
+    Returns:
+        bytes: 'TPM_USER_<user_id>:' or 'TPM_USER_<user_id>.<version>:'.
+    """
+    if version is None:
+        return f"TPM_USER_{int(user_id)}:".encode('utf-8')
+    return f"TPM_USER_{int(user_id)}.{int(version)}:".encode('utf-8')
+
+
+def parse_user_file(encrypted_data):
+    """
+    Splits a file encrypted under a user key into its owner, key version and payload.
+
+    Args:
+        encrypted_data (bytes): The stored file data, starting with TPM_USER_.
+
+    Returns:
+        tuple: (user_id, version or None, payload).
+
+    Raises:
+        ValueError: If the header is malformed.
+    """
+    header_end = encrypted_data.find(b":")
+    if header_end == -1:
+        logger.error("Invalid TPM-sealed user data format, missing colon")
+        raise ValueError("Invalid TPM-sealed user data format")
+
+    user_part, _, version_part = encrypted_data[9:header_end].decode('utf-8').partition('.')
+    return int(user_part), int(version_part) if version_part else None, encrypted_data[header_end + 1:]
+
+
+def generate_data_key():
+    """
+    Generates a random per-secret data key for envelope encryption.
+
+    Returns:
+        bytes: A new Fernet key.
+    """
+    return Fernet.generate_key()
+
+
+def wrap_data_key(data_key, user_id=None, bulk=False):
+    """
+    Wraps a data key with a key-encryption key: the user's current key when
+    TPM sealing is enabled and a user ID is given, otherwise the global key.
+
+    Args:
+        data_key (bytes): The data key to wrap.
+        user_id (int, optional): The ID of the user who owns the secret.
+        bulk (bool, optional): Queue TPM work behind interactive requests.
+
+    Returns:
+        str: The wrapped key, 'd:<user_id>:<version>:<token>' for a derived user key,
+            'u:<user_id>:<token>' for a sealed user key or 'g:<token>'.
+    """
+    if user_id is not None and current_app.config.get('USE_TPM_SEALING', False):
+        try:
+            return _wrap_with_user_key(data_key, user_id, bulk=bulk)
+        except Exception as e:
+            logger.warning(f"Failed to wrap data key with user key, using global key: {str(e)}")
+
+    return f"g:{get_key_ring().encrypt(data_key).decode('utf-8')}"
+
+
+def _wrap_with_user_key(data_key, user_id, bulk=False):
+    version, user_key = current_user_key(user_id, bulk=bulk)
+    token = Fernet(user_key).encrypt(data_key).decode('utf-8')
+    if version is None:
+        return f"u:{int(user_id)}:{token}"
+    return f"d:{int(user_id)}:{int(version)}:{token}"
+
+
+def parse_wrapped_key(wrapped_key):
+    """Splits a wrapped data key into (user_id or None, derived key version or None, token bytes)."""
+    if wrapped_key.startswith('g:'):
+        return None, None, wrapped_key[2:].encode('utf-8')
+    if wrapped_key.startswith('u:'):
+        user_id, token = wrapped_key[2:].split(':', 1)
+        return int(user_id), None, token.encode('utf-8')
+    if wrapped_key.startswith('d:'):
+        user_id, version, token = wrapped_key[2:].split(':', 2)
+        return int(user_id), int(version), token.encode('utf-8')
+    raise ValueError("Invalid wrapped data key format")
+
+
+def _user_key_unwrapper(user_id, bulk=False):
+    """
+    Builds a function unwrapping tokens under a user's key, falling back to the
+    user's previous key for keys not yet rewrapped after a rotation.
+    """
+    current = Fernet(load_user_key(user_id, bulk=bulk))
+    previous = []
+
+    def unwrap(token):
+        try:
+            return current.decrypt(token)
+        except InvalidToken:
+            if not previous:
+                previous_key = load_previous_user_key(user_id, bulk=bulk)
+                if previous_key is None:
+                    raise
+                previous.append(Fernet(previous_key))
+            return previous[0].decrypt(token)
+
+    return unwrap
+
+
+def unwrap_data_key(wrapped_key, bulk=False):
+    """
+    Unwraps a single data key produced by wrap_data_key().
+
+    Args:
+        wrapped_key (str): The wrapped data key.
+        bulk (bool, optional): Queue TPM work behind interactive requests.
+
+    Returns:
+        bytes: The data key.
+
+    Raises:
+        ValueError: If the wrapped key is malformed.
+        cryptography.fernet.InvalidToken: If the key-encryption key does not match.
+    """
+    user_id, version, token = parse_wrapped_key(wrapped_key)
+    if user_id is None:
+        return get_key_ring().decrypt(token)
+    if version is not None:
+        return Fernet(derive_user_key(user_id, version)).decrypt(token)
+    return _user_key_unwrapper(user_id, bulk=bulk)(token)
+
+
+def unwrap_data_keys(wrapped_keys, bulk=True):
+    """
+    Unwraps many data keys at once, loading each user key only once.
+
+    Args:
+        wrapped_keys (iterable): Wrapped data keys, e.g. for a page of secrets.
+        bulk (bool, optional): Queue TPM work behind interactive requests.
+
+    Returns:
+        dict: Maps each wrapped key to its data key, or to None if it could not be unwrapped.
+    """
+    by_user = {}
+    for wrapped_key in set(wrapped_keys):
+        if not wrapped_key:
+            continue
+        try:
+            user_id, version, token = parse_wrapped_key(wrapped_key)
+        except ValueError:
+            user_id, version, token = None, None, None
+        by_user.setdefault((user_id, version), []).append((wrapped_key, token))
+
+    ring = get_key_ring()
+    data_keys = {}
+    for (user_id, version), entries in by_user.items():
+        try:
+            if user_id is None:
+                unwrap = ring.decrypt
+            elif version is not None:
+                unwrap = Fernet(derive_user_key(user_id, version)).decrypt
+            else:
+                unwrap = _user_key_unwrapper(user_id, bulk=bulk)
+        except Exception as e:
+            logger.error(f"Failed to load key-encryption key for user {user_id}: {str(e)}")
+            unwrap = None
+
+        for wrapped_key, token in entries:
+            try:
+                data_keys[wrapped_key] = unwrap(token) if unwrap and token else None
+            except Exception as e:
+                logger.error(f"Failed to unwrap data key: {str(e)}")
+                data_keys[wrapped_key] = None
+
+    return data_keys
+
+
+def rewrap_data_key(wrapped_key, data_key, bulk=True):
+    """
+    Wraps a data key again under the current key-encryption key of the same kind,
+    e.g. after the global or the user's key has been rotated. Keys wrapped under a
+    sealed user key move to the derived user key when derivation is enabled.
+
+    Args:
+        wrapped_key (str): The existing wrapped key.
+        data_key (bytes): The unwrapped data key.
+        bulk (bool, optional): Queue TPM work behind interactive requests.
+
+    Returns:
+        str: The rewrapped data key.
+    """
+    user_id, _, _ = parse_wrapped_key(wrapped_key)
+    if user_id is None:
+        return f"g:{get_key_ring().encrypt(data_key).decode('utf-8')}"
+    return _wrap_with_user_key(data_key, user_id, bulk=bulk)
+
+
+def encrypt_secret_value(value, data_key=None):
+    """
+    Encrypts a secret value under its own data key (envelope encryption).
+
+    Args:
+        value (str): The string value to encrypt.
+        data_key (bytes, optional): The secret's existing data key; a new key is generated if omitted.
+
+    Returns:
+        tuple: (encrypted_value, wrapped_data_key) to store on the secret.
+    """
+    data_key = data_key or generate_data_key()
+    return encrypt_value(value, data_key=data_key), wrap_data_key(data_key)
+
+
+def decrypt_secret_value(encrypted_value, wrapped_data_key=None):
+    """
+    Decrypts a secret value, using its data key if it has one and the global key otherwise.
+
+    Args:
+        encrypted_value (str): The encrypted value.
+        wrapped_data_key (str, optional): The secret's wrapped data key.
+
+    Returns:
+        str: The decrypted value, or an error placeholder if decryption fails.
+    """
+    if not wrapped_data_key:
+        return decrypt_value(encrypted_value)
+
+    try:
+        data_key = unwrap_data_key(wrapped_data_key)
     except Exception as e:
-        logger.error(f"Failed to ensure user key: {str(e)}")
-        return get_encryption_key()
+        logger.error(f"Error unwrapping data key: {str(e)}")
+        return DECRYPTION_ERROR
+    return decrypt_value(encrypted_value, data_key=data_key)
 
 
-def encrypt_file(file_data, user_id=None):
+def upgrade_secret_value(value, wrapped_data_key=None):
     """
-    Encrypts file data using Fernet symmetric encryption.
-    If TPM sealing is enabled and a user ID is provided, it attempts to use a user-specific,
-    TPM-sealed key. Otherwise, it uses the global encryption key.
+    Re-encrypts a decrypted legacy secret value in the current format, keeping its data key.
+
+    Args:
+        value (str): The decrypted value.
+        wrapped_data_key (str, optional): The secret's wrapped data key.
+
+    Returns:
+        bytes: The value encrypted in the current format.
+    """
+    data_key = unwrap_data_key(wrapped_data_key) if wrapped_data_key else None
+    return encrypt_value(value, data_key=data_key)
+
+
+def encrypt_file(file_data, user_id=None, bulk=False, data_key=None):
+    """
+    Encrypts file data.
+    If a per-secret data key is given, the file is written as a chunked AEAD container
+    under that key (see stream_crypto).
+    Otherwise, if TPM sealing is enabled and a user ID is provided, it attempts to use the
+    user's current key (derived or TPM-sealed), falling back to the global encryption key. These blobs
+    use the versioned AEAD value format (see value_crypto), whose header names the key.
 
     Args:
         file_data (bytes): The binary file data to encrypt.
         user_id (int, optional): The ID of the user who owns the file.
+        bulk (bool, optional): Queue TPM work behind interactive requests.
+        data_key (bytes, optional): The secret's data key.
 
     Returns:
         bytes: The encrypted file data.
@@ -153,41 +720,60 @@ def encrypt_file(file_data, user_id=None):
         return None
 
     try:
+        if data_key:
+            return offload_if_large(
+                'file_crypto',
+                len(file_data),
+                stream_crypto.encrypt_bytes,
+                file_data,
+                data_key,
+                algorithm=current_app.config.get('FILE_ENCRYPTION_ALGORITHM', 'aes-256-gcm'),
+                chunk_size=current_app.config.get('FILE_CHUNK_SIZE', stream_crypto.DEFAULT_CHUNK_SIZE)
+            )
+
         should_use_tpm = current_app.config.get('USE_TPM_SEALING', False)
 
         if should_use_tpm and user_id is not None:
             try:
-                key = ensure_user_key(user_id)
-
-                fernet = Fernet(key)
+                version, key = current_user_key(user_id, bulk=bulk)
 
-                encrypted_data = fernet.encrypt(file_data)
-
-                header = f"TPM_USER_{user_id}:".encode('utf-8')
-                return header + encrypted_data
+                encrypted_data = offload_if_large('file_crypto', len(file_data), value_crypto.encrypt, file_data, key)
+                return user_file_header(user_id, version) + encrypted_data
             except Exception as e:
                 logger.warning(f"Failed to use TPM for user key, falling back to regular encryption: {str(e)}")
-                key = get_encryption_key()
-                fernet = Fernet(key)
-                return fernet.encrypt(file_data)
-        else:
-            key = get_encryption_key()
-            fernet = Fernet(key)
-            return fernet.encrypt(file_data)
+
+        return offload_if_large('file_crypto', len(file_data), get_key_ring().encrypt_value, file_data)
     except Exception as e:
         logger.error(f"Error encrypting file: {str(e)}")
         raise
 
 
-def decrypt_file(encrypted_data):
+def _select_user_key(user_id, header_key_id, bulk=False):
+    # The value header names the key, so pick it directly instead of trial decryption
+    key = load_user_key(user_id, bulk=bulk)
+    if value_crypto.key_id(key) == header_key_id:
+        return key
+
+    previous_key = load_previous_user_key(user_id, bulk=bulk)
+    if previous_key is not None and value_crypto.key_id(previous_key) == header_key_id:
+        return previous_key
+    raise ValueError(f"File was encrypted with an unknown key for user {user_id}")
+
+
+def decrypt_file(encrypted_data, bulk=False, data_key=None):
     """
-    Decrypts file data using Fernet symmetric encryption.
-    It attempts to decrypt data that might be TPM-sealed with a user-specific key
-    or a legacy TPM-sealed key. If decryption with TPM fails or it's not TPM-sealed,
-    it falls back to the global encryption key.
+    Decrypts file data, selecting the key from the blob header in a single step.
+    Files encrypted under a per-secret data key are decrypted with that key only, either
+    as a chunked AEAD container or as a Fernet token. User-key blobs carry the owner in a
+    TPM_USER_ prefix (with the key version for derived user keys), legacy per-file sealed
+    keys a TPM_SEALED: prefix, and everything else uses the global key ring. Versioned
+    values name their exact key; legacy Fernet tokens under a sealed user key try the
+    current key, then the previous one after a rotation.
 
     Args:
         encrypted_data (bytes): The encrypted file data.
+        bulk (bool, optional): Queue TPM work behind interactive requests.
+        data_key (bytes, optional): The secret's data key.
 
     Returns:
         bytes: The decrypted file data.
@@ -199,89 +785,118 @@ def decrypt_file(encrypted_data):
         return None
 
     try:
-        if encrypted_data.startswith(b"TPM_USER_"):
+        if data_key:
+            if stream_crypto.is_container(encrypted_data):
+                return offload_if_large(
+                    'file_crypto', len(encrypted_data), stream_crypto.decrypt_bytes, encrypted_data, data_key
+                )
+            return offload_if_large('file_crypto', len(encrypted_data), Fernet(data_key).decrypt, encrypted_data)
+        elif encrypted_data.startswith(b"TPM_USER_"):
+            user_id, version, actual_encrypted_data = parse_user_file(encrypted_data)
+
+            if version is not None:
+                key = derive_user_key(user_id, version)
+                return offload_if_large(
+                    'file_crypto', len(actual_encrypted_data), value_crypto.decrypt, actual_encrypted_data, key
+                )
+
+            if value_crypto.is_encrypted_value(actual_encrypted_data):
+                _, header_key_id = value_crypto.parse_header(actual_encrypted_data)
+                key = _select_user_key(user_id, header_key_id, bulk=bulk)
+                return offload_if_large(
+                    'file_crypto', len(actual_encrypted_data), value_crypto.decrypt, actual_encrypted_data, key
+                )
+
+            key = load_user_key(user_id, bulk=bulk)
             try:
-                header_end = encrypted_data.find(b":")
-                if header_end == -1:
-                    logger.error("Invalid TPM-sealed user data format, missing colon")
-                    raise ValueError("Invalid TPM-sealed user data format")
-
-                user_id_str = encrypted_data[9:header_end].decode('utf-8')
-                user_id = int(user_id_str)
-
-                actual_encrypted_data = encrypted_data[header_end + 1:]
-
-                logger.info(f"Attempting to decrypt data with user {user_id}'s key")
-
-                from backend.utils.tpm_manager import TPMManager
-                secrets_dir = current_app.config.get('TPM_SECRETS_DIR', 'secrets')
-
-                os.makedirs(secrets_dir, exist_ok=True)
-
-                tpm = TPMManager(secrets_dir)
-                tpm.generate_or_load_primary_key()
-
-                filename = get_user_key_filename(user_id)
-
-                key = tpm.unseal_secret(filename)
-                logger.info(f"Successfully unsealed key for user {user_id}")
-
-                fernet = Fernet(key)
-                decrypted_data = fernet.decrypt(actual_encrypted_data)
-
-                return decrypted_data
-            except FileNotFoundError as e:
-                logger.error(f"User key file not found: {str(e)}, falling back to config key")
-                key = get_encryption_key()
-                fernet = Fernet(key)
-                return fernet.decrypt(encrypted_data)
-            except Exception as e:
-                logger.error(f"Failed to decrypt with user key: {str(e)}, falling back to config key")
-                key = get_encryption_key()
-                fernet = Fernet(key)
-                return fernet.decrypt(encrypted_data)
+                return offload_if_large(
+                    'file_crypto', len(actual_encrypted_data), Fernet(key).decrypt, actual_encrypted_data
+                )
+            except InvalidToken:
+                # Files not yet re-encrypted after a key rotation use the previous key
+                previous_key = load_previous_user_key(user_id, bulk=bulk)
+                if previous_key is None:
+                    raise
+                return offload_if_large(
+                    'file_crypto', len(actual_encrypted_data), Fernet(previous_key).decrypt, actual_encrypted_data
+                )
         elif encrypted_data.startswith(b"TPM_SEALED:"):
-            try:
-                header_end = encrypted_data.find(b":", 11)
-                if header_end == -1:
-                    logger.error("Invalid TPM-sealed data format, missing second colon")
-                    raise ValueError("Invalid TPM-sealed data format")
-
-                filename = encrypted_data[11:header_end].decode('utf-8')
-                actual_encrypted_data = encrypted_data[header_end + 1:]
+            header_end = encrypted_data.find(b":", 11)
+            if header_end == -1:
+                logger.error("Invalid TPM-sealed data format, missing second colon")
+                raise ValueError("Invalid TPM-sealed data format")
+
+            filename = encrypted_data[11:header_end].decode('utf-8')
+            actual_encrypted_data = encrypted_data[header_end + 1:]
+
+            secrets_dir = current_app.config.get('TPM_SECRETS_DIR', 'secrets')
+            key = get_key_provider().unseal(Path(secrets_dir) / filename, bulk=bulk)
+
+            return offload_if_large(
+                'file_crypto', len(actual_encrypted_data), Fernet(key).decrypt, actual_encrypted_data
+            )
+        elif value_crypto.is_encrypted_value(encrypted_data):
+            return offload_if_large('file_crypto', len(encrypted_data), get_key_ring().decrypt_value, encrypted_data)
+        else:
+            return offload_if_large('file_crypto', len(encrypted_data), get_key_ring().decrypt, encrypted_data)
+    except Exception as e:
+        logger.error(f"Error decrypting file: {str(e)}")
+        raise
 
-                logger.info(f"Attempting to unseal legacy data with TPM using file: {filename}")
 
-                from backend.utils.tpm_manager import TPMManager
-                secrets_dir = current_app.config.get('TPM_SECRETS_DIR', 'secrets')
+def get_file_plaintext_size(file_path, data_key=None):
+    """
+    Returns the decrypted size of a stored chunked AEAD container without decrypting it.
 
-                os.makedirs(secrets_dir, exist_ok=True)
+    Args:
+        file_path (str): The absolute path to the encrypted file.
+        data_key (bytes, optional): The secret's data key.
 
-                tpm = TPMManager(secrets_dir)
-                tpm.generate_or_load_primary_key()
+    Returns:
+        int: The plaintext size, or None if the file uses an older blob format.
+    """
+    if not data_key:
+        return None
 
-                key = tpm.unseal_secret(filename)
-                logger.info(f"Successfully unsealed legacy key with TPM (length: {len(key)})")
+    with open(file_path, 'rb') as f:
+        prefix = f.read(stream_crypto.HEADER_SIZE)
+    if not stream_crypto.is_container(prefix):
+        return None
 
-                fernet = Fernet(key)
-                decrypted_data = fernet.decrypt(actual_encrypted_data)
+    header = stream_crypto.parse_header(prefix)
+    return stream_crypto.plaintext_size(os.path.getsize(file_path), header.chunk_size)
 
-                return decrypted_data
-            except Exception as e:
-                logger.error(f"Failed to unseal with TPM, falling back to config key: {str(e)}")
-                key = get_encryption_key()
-                fernet = Fernet(key)
-                return fernet.decrypt(encrypted_data)
-        else:
-            key = get_encryption_key()
-            fernet = Fernet(key)
 
-            decrypted_data = fernet.decrypt(encrypted_data)
+def iter_decrypt_file(file_path, data_key=None, bulk=False, start=0, stop=None):
+    """
+    Decrypts a stored file, yielding the plaintext in chunks. Chunked AEAD
+    containers are decrypted incrementally with constant memory, and only the
+    chunks covering the requested range are decrypted; older blob formats are
+    decrypted in one piece through decrypt_file() and then sliced.
 
-            return decrypted_data
-    except Exception as e:
-        logger.error(f"Error decrypting file: {str(e)}")
-        raise
+    Args:
+        file_path (str): The absolute path to the encrypted file.
+        data_key (bytes, optional): The secret's data key.
+        bulk (bool, optional): Queue TPM work behind interactive requests.
+        start (int, optional): The first plaintext byte to return.
+        stop (int, optional): One past the last plaintext byte to return; defaults to the end.
+
+    Yields:
+        bytes: Plaintext chunks, in order.
+    """
+    with open(file_path, 'rb') as f:
+        prefix = f.read(len(stream_crypto.MAGIC))
+        f.seek(0)
+
+        if data_key and stream_crypto.is_container(prefix):
+            if start == 0 and stop is None:
+                yield from stream_crypto.iter_decrypt(f, data_key)
+            else:
+                if stop is None:
+                    stop = get_file_plaintext_size(file_path, data_key)
+                yield from stream_crypto.iter_decrypt_range(f, data_key, start, stop)
+        else:
+            yield decrypt_file(f.read(), bulk=bulk, data_key=data_key)[start:stop]
 
 
 def get_secure_file_path(user_id, extension=None):
@@ -380,12 +995,20 @@ def get_actual_extension_from_mime(mime_type):
     return extension_map.get(mime_type, 'bin')
 
 
-def secure_delete_file(file_path):
+WIPE_CHUNK_SIZE = 1024 * 1024
+_ZERO_CHUNK = bytes(WIPE_CHUNK_SIZE)
+
+
+def secure_delete_file(file_path, chunk_size=WIPE_CHUNK_SIZE):
     """
-    Securely deletes a file by overwriting its content with zeros before removal.
+    Securely deletes a file by overwriting its content with zeros in place before removal.
+    The file is overwritten in fixed-size chunks from a shared zero buffer and flushed to
+    disk before it is unlinked, so memory use does not grow with the file size. Blocking;
+    request handlers should queue files with WipeService instead.
 
     Args:
         file_path (str): The absolute path to the file to delete.
+        chunk_size (int, optional): Bytes written per chunk, at most WIPE_CHUNK_SIZE.
 
     Returns:
         bool: True if the file was deleted successfully or didn't exist, False otherwise.
@@ -393,14 +1016,24 @@ def secure_delete_file(file_path):
     if not os.path.exists(file_path):
         return True
 
+    zeros = memoryview(_ZERO_CHUNK)[:min(chunk_size, WIPE_CHUNK_SIZE)]
     try:
-        size = os.path.getsize(file_path)
-
-        with open(file_path, 'wb') as f:
-            f.write(b'\0' * size)
+        # Open without truncating so the existing blocks are overwritten
+        with open(file_path, 'r+b', buffering=0) as f:
+            remaining = os.fstat(f.fileno()).st_size
+            while remaining > 0:
+                remaining -= f.write(zeros[:min(remaining, len(zeros))])
+            os.fsync(f.fileno())
 
         os.remove(file_path)
 
+        # Persist the removal of the directory entry as well
+        dir_fd = os.open(os.path.dirname(file_path) or '.', os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
         return True
     except Exception as e:
         logger.error(f"Error securely deleting file {file_path}: {str(e)}")
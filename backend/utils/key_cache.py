@@ -0,0 +1,149 @@
+#! /usr/bin/env python3
+
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class UserKeyCache:
+    """
+    Bounded in-process cache for unsealed per-user file keys.
+
+    Entries are keyed by user ID, expire after a fixed TTL and are evicted in
+    least-recently-used order once the cache is full. Key material is held in
+    mutable buffers so it can be overwritten with zeros when an entry leaves
+    the cache.
+    """
+
+    def __init__(self, max_entries=64, ttl=300):
+        """
+        Initializes the UserKeyCache.
+
+        Args:
+            max_entries (int): The maximum number of keys kept in memory.
+            ttl (int): The number of seconds a cached key stays valid.
+        """
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, max_entries=None, ttl=None):
+        """
+        Updates the cache limits, evicting entries that no longer fit.
+
+        Args:
+            max_entries (int, optional): The new maximum number of cached keys.
+            ttl (int, optional): The new TTL in seconds.
+        """
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if ttl is not None:
+                self.ttl = ttl
+            self._shrink()
+
+    def get(self, user_id):
+        """
+        Returns the cached key for a user if present and not expired.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            bytes: A copy of the cached key, or None on a cache miss.
+        """
+        user_id = int(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            key_buffer, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._evict(user_id)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return bytes(key_buffer)
+
+    def put(self, user_id, key):
+        """
+        Stores a key for a user, replacing and zeroizing any previous entry.
+
+        Args:
+            user_id (int): The ID of the user.
+            key (bytes): The unsealed key material.
+        """
+        if self.max_entries <= 0:
+            return
+
+        user_id = int(user_id)
+        with self._lock:
+            if user_id in self._entries:
+                self._evict(user_id)
+            self._entries[user_id] = (bytearray(key), time.monotonic() + self.ttl)
+            self._shrink()
+
+    def invalidate(self, user_id):
+        """
+        Drops a user's cached key, e.g. after the key has been rotated.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            bool: True if a cached key was removed, False otherwise.
+        """
+        user_id = int(user_id)
+        with self._lock:
+            if user_id not in self._entries:
+                return False
+            self._evict(user_id)
+            return True
+
+    def clear(self):
+        """Drops and zeroizes every cached key."""
+        with self._lock:
+            for user_id in list(self._entries):
+                self._evict(user_id)
+
+    def stats(self):
+        """
+        Returns the cache counters for monitoring and tuning.
+
+        Returns:
+            dict: The current size, limits, and hit/miss/eviction counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _shrink(self):
+        while len(self._entries) > max(self.max_entries, 0):
+            oldest_user_id = next(iter(self._entries))
+            self._evict(oldest_user_id)
+
+    def _evict(self, user_id):
+        key_buffer, _ = self._entries.pop(user_id)
+        for i in range(len(key_buffer)):
+            key_buffer[i] = 0
+        self.evictions += 1
+
+
+user_key_cache = UserKeyCache()
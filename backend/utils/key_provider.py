@@ -0,0 +1,316 @@
+#! /usr/bin/env python3
+
+
+import base64
+import os
+import threading
+import time
+from pathlib import Path
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# Default location of the wrapping key used by the software sealing backend
+DEFAULT_WRAPPING_KEY_FILE = Path(__file__).resolve().parents[2] / 'secrets' / 'software_wrapping.key'
+
+
+class KeyProvider:
+    """
+    Interface for the backends that seal and unseal secrets at rest.
+
+    Sealed secrets are addressed by the path of their blob file so that the
+    backends are interchangeable with the existing TPM blob layout.
+    """
+
+    name = None
+
+    def seal(self, secret, blob_file, bulk=False):
+        """
+        Seals a secret and stores it under the given blob path.
+
+        Args:
+            secret (bytes): The secret to seal.
+            blob_file (str | Path): Where the sealed blob is stored.
+            bulk (bool, optional): Whether the call comes from a batch job.
+
+        Returns:
+            Path: The blob path the secret was sealed to.
+        """
+        raise NotImplementedError
+
+    def unseal(self, blob_file, bulk=False):
+        """
+        Unseals a previously sealed secret.
+
+        Args:
+            blob_file (str | Path): The sealed blob to unseal.
+            bulk (bool, optional): Whether the call comes from a batch job.
+
+        Returns:
+            bytes: The unsealed secret.
+
+        Raises:
+            FileNotFoundError: If no sealed blob exists at the given path.
+        """
+        raise NotImplementedError
+
+    def exists(self, blob_file):
+        """
+        Checks whether a sealed blob exists.
+
+        Args:
+            blob_file (str | Path): The sealed blob path.
+
+        Returns:
+            bool: True if the blob exists.
+        """
+        return Path(blob_file).exists()
+
+    def remove(self, blob_file):
+        """
+        Deletes a sealed blob if it exists.
+
+        Args:
+            blob_file (str | Path): The sealed blob path.
+
+        Returns:
+            bool: True if a blob was removed.
+        """
+        try:
+            Path(blob_file).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def stats(self):
+        """
+        Returns backend counters for monitoring.
+
+        Returns:
+            dict: The provider name and backend-specific counters.
+        """
+        return {'provider': self.name}
+
+
+class TPMKeyProvider(KeyProvider):
+    """Seals secrets with the TPM through the shared process-wide TPM session."""
+
+    name = 'tpm'
+
+    def __init__(self):
+        # tpm2_pytss is only importable where a TPM stack is installed
+        from backend.utils.tpm_manager import get_tpm_session, PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+        self._session = get_tpm_session()
+        self._priorities = (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+
+    def seal(self, secret, blob_file, bulk=False):
+        return self._session.seal(secret, blob_file, priority=self._priorities[bool(bulk)])
+
+    def unseal(self, blob_file, bulk=False):
+        return self._session.unseal(blob_file, priority=self._priorities[bool(bulk)])
+
+    def stats(self):
+        return {
+            'provider': self.name,
+            'scheduler': self._session.scheduler.stats()
+        }
+
+
+class SoftwareKeyProvider(KeyProvider):
+    """
+    Seals secrets in files with AES-256-GCM under a wrapping key kept on disk.
+
+    This offers no hardware protection and is intended for development and CI
+    machines without a TPM. The blob file name is bound as associated data so
+    sealed blobs cannot be swapped between names.
+    """
+
+    name = 'software'
+    MAGIC = b'ABSW1'
+    NONCE_SIZE = 12
+
+    def __init__(self, wrapping_key_file=DEFAULT_WRAPPING_KEY_FILE):
+        """
+        Initializes the SoftwareKeyProvider, creating the wrapping key if needed.
+
+        Args:
+            wrapping_key_file (str | Path): The file holding the 256-bit wrapping key.
+        """
+        self.wrapping_key_file = Path(wrapping_key_file)
+        self._cipher = AESGCM(self._load_wrapping_key())
+        self.seals = 0
+        self.unseals = 0
+
+    def seal(self, secret, blob_file, bulk=False):
+        blob_file = Path(blob_file)
+        nonce = os.urandom(self.NONCE_SIZE)
+        ciphertext = self._cipher.encrypt(nonce, bytes(secret), blob_file.name.encode('utf-8'))
+
+        blob_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = blob_file.with_name(f".{blob_file.name}.tmp")
+        with open(tmp_file, 'wb') as f:
+            f.write(self.MAGIC + nonce + ciphertext)
+        os.chmod(tmp_file, 0o600)
+        os.replace(tmp_file, blob_file)
+
+        self.seals += 1
+        return blob_file
+
+    def unseal(self, blob_file, bulk=False):
+        blob_file = Path(blob_file)
+        if not blob_file.exists():
+            raise FileNotFoundError(f"Secret file {blob_file} not found")
+
+        blob = blob_file.read_bytes()
+        if not blob.startswith(self.MAGIC):
+            raise ValueError(f"{blob_file} is not a software-sealed blob")
+
+        header_size = len(self.MAGIC) + self.NONCE_SIZE
+        nonce = blob[len(self.MAGIC):header_size]
+        secret = self._cipher.decrypt(nonce, blob[header_size:], blob_file.name.encode('utf-8'))
+
+        self.unseals += 1
+        return secret
+
+    def stats(self):
+        return {
+            'provider': self.name,
+            'seals': self.seals,
+            'unseals': self.unseals
+        }
+
+    def _load_wrapping_key(self):
+        if self.wrapping_key_file.exists():
+            key = self.wrapping_key_file.read_bytes()
+            if len(key) != 32:
+                raise ValueError(f"Wrapping key {self.wrapping_key_file} must be 32 bytes")
+            return key
+
+        self.wrapping_key_file.parent.mkdir(parents=True, exist_ok=True)
+        key = AESGCM.generate_key(bit_length=256)
+        fd = os.open(self.wrapping_key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+        return key
+
+
+class SimulatedKeyProvider(KeyProvider):
+    """
+    Keeps sealed secrets in memory and imitates TPM timing for benchmarks.
+
+    Every command sleeps for a configurable latency and, like a real TPM, the
+    simulated device only handles one command at a time. Unsealing a name that
+    was never sealed provisions a fresh Fernet-compatible secret, so the full
+    application can start without any secrets on disk.
+    """
+
+    name = 'simulator'
+
+    def __init__(self, seal_latency=0.0, unseal_latency=0.0, auto_provision=True):
+        """
+        Initializes the SimulatedKeyProvider.
+
+        Args:
+            seal_latency (float): Seconds each seal command takes.
+            unseal_latency (float): Seconds each unseal command takes.
+            auto_provision (bool): Whether to create missing secrets on unseal.
+        """
+        self.seal_latency = seal_latency
+        self.unseal_latency = unseal_latency
+        self.auto_provision = auto_provision
+        self._blobs = {}
+        self._device_lock = threading.Lock()
+        self.seals = 0
+        self.unseals = 0
+        self.busy_time = 0.0
+
+    def seal(self, secret, blob_file, bulk=False):
+        with self._device_lock:
+            self._simulate(self.seal_latency)
+            self._blobs[self._blob_key(blob_file)] = bytes(secret)
+            self.seals += 1
+        return Path(blob_file)
+
+    def unseal(self, blob_file, bulk=False):
+        with self._device_lock:
+            self._simulate(self.unseal_latency)
+            blob_key = self._blob_key(blob_file)
+            if blob_key not in self._blobs:
+                if not self.auto_provision:
+                    raise FileNotFoundError(f"Secret file {blob_file} not found")
+                self._blobs[blob_key] = base64.urlsafe_b64encode(os.urandom(32))
+            self.unseals += 1
+            return self._blobs[blob_key]
+
+    def exists(self, blob_file):
+        return self._blob_key(blob_file) in self._blobs
+
+    def remove(self, blob_file):
+        with self._device_lock:
+            return self._blobs.pop(self._blob_key(blob_file), None) is not None
+
+    def stats(self):
+        return {
+            'provider': self.name,
+            'seals': self.seals,
+            'unseals': self.unseals,
+            'stored': len(self._blobs),
+            'busy_ms': round(self.busy_time * 1000, 3)
+        }
+
+    def _simulate(self, latency):
+        if latency > 0:
+            time.sleep(latency)
+            self.busy_time += latency
+
+    @staticmethod
+    def _blob_key(blob_file):
+        return str(Path(blob_file).absolute())
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def create_key_provider(name=None):
+    """
+    Builds a key provider from its name and environment settings.
+
+    Args:
+        name (str, optional): 'tpm', 'software' or 'simulator'. Defaults to the
+            KEY_PROVIDER environment variable, or 'tpm' if it is not set.
+
+    Returns:
+        KeyProvider: The configured key provider.
+
+    Raises:
+        ValueError: If the provider name is unknown.
+    """
+    name = (name or os.environ.get('KEY_PROVIDER', 'tpm')).lower()
+
+    if name == 'tpm':
+        return TPMKeyProvider()
+    if name == 'software':
+        return SoftwareKeyProvider(os.environ.get('KEY_PROVIDER_WRAPPING_KEY', DEFAULT_WRAPPING_KEY_FILE))
+    if name == 'simulator':
+        return SimulatedKeyProvider(
+            seal_latency=float(os.environ.get('KEY_PROVIDER_SIM_SEAL_MS', 0)) / 1000,
+            unseal_latency=float(os.environ.get('KEY_PROVIDER_SIM_UNSEAL_MS', 0)) / 1000
+        )
+
+    raise ValueError(f"Unknown key provider: {name}")
+
+
+def get_key_provider():
+    """
+    Returns the process-wide key provider, creating it on first use.
+
+    Returns:
+        KeyProvider: The shared key provider instance.
+    """
+    global _provider
+
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_key_provider()
+    return _provider
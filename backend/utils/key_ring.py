@@ -0,0 +1,223 @@
+#! /usr/bin/env python3
+
+
+import hashlib
+import threading
+from cryptography.fernet import Fernet, MultiFernet
+from backend.utils import value_crypto
+
+
+class _KeyRingState:
+    """Snapshot of the cipher objects built from one set of keys; only the value cipher cache fills in later."""
+
+    __slots__ = ('primary', 'cipher', 'key_ids', 'value_keys', 'primary_value_key_id', 'value_ciphers')
+
+    def __init__(self, primary, cipher, key_ids, value_keys, primary_value_key_id):
+        self.primary = primary
+        self.cipher = cipher
+        self.key_ids = key_ids
+        # Keys by value-header key id, so versioned values find their key in O(1)
+        self.value_keys = value_keys
+        self.primary_value_key_id = primary_value_key_id
+        self.value_ciphers = {}
+
+    def value_cipher(self, header_key_id, algorithm):
+        cipher = self.value_ciphers.get((header_key_id, algorithm))
+        if cipher is None:
+            key = self.value_keys.get(header_key_id)
+            if key is None:
+                raise ValueError("Value was encrypted with a key that is not in the key ring")
+            cipher = self.value_ciphers[(header_key_id, algorithm)] = value_crypto.derive_cipher(key, algorithm)
+        return cipher
+
+
+class KeyRing:
+    """
+    Process-level ring of Fernet ciphers for the global encryption keys.
+
+    The primary key encrypts; the primary and any previous keys decrypt, in
+    that order (MultiFernet semantics). Cipher objects are built once per key
+    set and published as a single snapshot, so a reload is atomic and the hot
+    path never parses key material.
+    """
+
+    def __init__(self):
+        """Initializes an empty KeyRing; keys are supplied with load()."""
+        self._state = None
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def load(self, primary_key, previous_keys=()):
+        """
+        Builds the ciphers for a key set and swaps them in atomically.
+
+        Args:
+            primary_key (str | bytes): The key used for new encryptions.
+            previous_keys (iterable, optional): Older keys kept for decryption only.
+
+        Raises:
+            ValueError: If any key is not a valid Fernet key.
+        """
+        keys = [self._as_bytes(primary_key)]
+        for key in previous_keys or ():
+            key = self._as_bytes(key)
+            if key and key not in keys:
+                keys.append(key)
+
+        fernets = [Fernet(key) for key in keys]
+        state = _KeyRingState(
+            primary=fernets[0],
+            cipher=MultiFernet(fernets),
+            key_ids=tuple(self.key_id(key) for key in keys),
+            value_keys={value_crypto.key_id(key): key for key in reversed(keys)},
+            primary_value_key_id=value_crypto.key_id(keys[0])
+        )
+
+        with self._lock:
+            self._state = state
+            self.reloads += 1
+
+    def load_from_config(self, config):
+        """
+        Loads the ring from ENCRYPTION_KEY and ENCRYPTION_KEYS_PREVIOUS.
+
+        Args:
+            config: A Flask config mapping.
+
+        Raises:
+            ValueError: If no encryption key is configured.
+        """
+        primary_key = config.get('ENCRYPTION_KEY')
+        if not primary_key:
+            raise ValueError("No encryption key found in app config")
+        self.load(primary_key, config.get('ENCRYPTION_KEYS_PREVIOUS', ()))
+
+    @property
+    def loaded(self):
+        """bool: Whether a key set has been loaded."""
+        return self._state is not None
+
+    @property
+    def primary(self):
+        """Fernet: The cipher for the primary key."""
+        return self._current().primary
+
+    @property
+    def key_ids(self):
+        """tuple: Short identifiers of the loaded keys, primary first."""
+        return self._current().key_ids
+
+    def encrypt(self, data):
+        """
+        Encrypts data with the primary key.
+
+        Args:
+            data (bytes): The plaintext.
+
+        Returns:
+            bytes: The Fernet token.
+        """
+        return self._current().primary.encrypt(data)
+
+    def decrypt(self, token):
+        """
+        Decrypts a token with the first key in the ring that accepts it.
+
+        Args:
+            token (bytes): The Fernet token.
+
+        Returns:
+            bytes: The plaintext.
+
+        Raises:
+            cryptography.fernet.InvalidToken: If no key in the ring can decrypt the token.
+        """
+        return self._current().cipher.decrypt(token)
+
+    def rotate(self, token):
+        """
+        Re-encrypts a token under the primary key, preserving its timestamp.
+
+        Args:
+            token (bytes): A token produced by any key in the ring.
+
+        Returns:
+            bytes: The token encrypted with the primary key.
+        """
+        return self._current().cipher.rotate(token)
+
+    def encrypt_value(self, data, compress_threshold=None):
+        """
+        Encrypts data with the primary key in the versioned AEAD value format.
+
+        Args:
+            data (bytes): The plaintext.
+            compress_threshold (int, optional): Write a packed value, compressing data of
+                at least this many bytes (see value_crypto.seal).
+
+        Returns:
+            bytes: The encrypted value (see value_crypto).
+        """
+        state = self._current()
+        algorithm = value_crypto.get_algorithm()
+        cipher = state.value_cipher(state.primary_value_key_id, algorithm)
+        return value_crypto.seal(data, cipher, state.primary_value_key_id, algorithm, compress_threshold)
+
+    def decrypt_value(self, blob):
+        """
+        Decrypts a versioned value with the ring key named in its header.
+
+        Args:
+            blob (bytes): The encrypted value.
+
+        Returns:
+            bytes: The plaintext.
+
+        Raises:
+            ValueError: If the value's key is not in the ring.
+            cryptography.exceptions.InvalidTag: If the value fails authentication.
+        """
+        algorithm, header_key_id = value_crypto.parse_header(blob)
+        return value_crypto.open_sealed(blob, self._current().value_cipher(header_key_id, algorithm))
+
+    def stats(self):
+        """
+        Returns the ring state for monitoring.
+
+        Returns:
+            dict: Key identifiers and reload count.
+        """
+        state = self._state
+        return {
+            'loaded': state is not None,
+            'key_ids': list(state.key_ids) if state else [],
+            'reloads': self.reloads
+        }
+
+    @staticmethod
+    def key_id(key):
+        """
+        Derives a short, non-secret identifier for a key.
+
+        Args:
+            key (str | bytes): The key.
+
+        Returns:
+            str: The first 8 hex digits of the key's SHA-256 digest.
+        """
+        return hashlib.sha256(KeyRing._as_bytes(key)).hexdigest()[:8]
+
+    def _current(self):
+        state = self._state
+        if state is None:
+            raise ValueError("Encryption key ring has not been loaded")
+        return state
+
+    @staticmethod
+    def _as_bytes(key):
+        if isinstance(key, str):
+            key = key.strip().encode('utf-8')
+        return key
+
+
+key_ring = KeyRing()
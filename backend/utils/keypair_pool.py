@@ -0,0 +1,130 @@
+#! /usr/bin/env python3
+
+
+import threading
+from collections import deque
+from backend.utils.crypto import CryptoService
+
+
+class KeypairPool:
+    """
+    Pool of pre-generated ephemeral ECDH keypairs for the WebSocket handshake.
+
+    Keypairs are kept as key objects with their public key already encoded for
+    the wire, so a handshake neither generates nor parses key material. When
+    the pool drops below its low-water mark a background task refills it,
+    yielding between keys so the refill never monopolizes the event loop. If
+    the pool is empty a keypair is generated inline and counted as a miss.
+    Every keypair is handed out at most once.
+    """
+
+    def __init__(self, size=64, low_water=16):
+        """
+        Initializes the KeypairPool.
+
+        Args:
+            size (int): The number of keypairs the pool is refilled to.
+            low_water (int): The pool level that triggers a background refill.
+        """
+        self._keypairs = deque()
+        self._lock = threading.Lock()
+        self._spawn = None
+        self._sleep = None
+        self._refilling = False
+        self.size = size
+        self.low_water = low_water
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.refills = 0
+
+    def configure(self, size=None, low_water=None):
+        """
+        Updates the pool limits.
+
+        Args:
+            size (int, optional): The new refill target.
+            low_water (int, optional): The new low-water mark.
+        """
+        with self._lock:
+            if size is not None:
+                self.size = size
+            if low_water is not None:
+                self.low_water = min(low_water, self.size)
+            while len(self._keypairs) > self.size:
+                self._keypairs.popleft()
+
+    def start(self, spawn, sleep):
+        """
+        Enables background refills and fills the pool.
+
+        Args:
+            spawn: Starts a background task, e.g. socketio.start_background_task.
+            sleep: Cooperatively yields, e.g. socketio.sleep.
+        """
+        self._spawn = spawn
+        self._sleep = sleep
+        self._schedule_refill()
+
+    def acquire(self):
+        """
+        Takes a keypair from the pool, generating one if the pool is empty.
+
+        Returns:
+            tuple: (private_key, public_key_b64) of a keypair never handed out before.
+        """
+        try:
+            keypair = self._keypairs.popleft()
+            self.hits += 1
+        except IndexError:
+            keypair = self._generate()
+            self.misses += 1
+
+        if len(self._keypairs) < self.low_water:
+            self._schedule_refill()
+        return keypair
+
+    def fill(self):
+        """Generates keypairs until the pool is full, yielding between keys."""
+        try:
+            while len(self._keypairs) < self.size:
+                self._keypairs.append(self._generate())
+                if self._sleep is not None:
+                    self._sleep(0)
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def stats(self):
+        """
+        Returns pool counters for monitoring.
+
+        Returns:
+            dict: The pool level, limits and hit, miss and generation counters.
+        """
+        return {
+            'available': len(self._keypairs),
+            'size': self.size,
+            'low_water': self.low_water,
+            'hits': self.hits,
+            'misses': self.misses,
+            'generated': self.generated,
+            'refills': self.refills
+        }
+
+    def _schedule_refill(self):
+        if self._spawn is None:
+            return
+        with self._lock:
+            if self._refilling:
+                return
+            self._refilling = True
+            self.refills += 1
+        self._spawn(self.fill)
+
+    def _generate(self):
+        self.generated += 1
+        return CryptoService.generate_ephemeral_keypair()
+
+
+keypair_pool = KeypairPool()
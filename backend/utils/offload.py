@@ -0,0 +1,211 @@
+#! /usr/bin/env python3
+
+
+import threading
+import time
+from flask import current_app, has_app_context
+
+try:
+    from gevent.lock import BoundedSemaphore
+    from gevent.threadpool import ThreadPool
+except ImportError:  # Running without gevent, e.g. in scripts; work stays inline
+    BoundedSemaphore = None
+    ThreadPool = None
+
+
+class _OperationStats:
+    """Counters for one kind of offloaded operation."""
+
+    __slots__ = ('offloaded', 'inline', 'active', 'waiting', 'failed', 'queue_time', 'max_queue_time', 'run_time')
+
+    def __init__(self):
+        self.offloaded = 0
+        self.inline = 0
+        self.active = 0
+        self.waiting = 0
+        self.failed = 0
+        self.queue_time = 0.0
+        self.max_queue_time = 0.0
+        self.run_time = 0.0
+
+    def as_dict(self):
+        return {
+            'offloaded': self.offloaded,
+            'inline': self.inline,
+            'active': self.active,
+            'waiting': self.waiting,
+            'failed': self.failed,
+            'avg_queue_ms': round(self.queue_time * 1000 / self.offloaded, 3) if self.offloaded else 0.0,
+            'max_queue_ms': round(self.max_queue_time * 1000, 3),
+            'avg_run_ms': round(self.run_time * 1000 / self.offloaded, 3) if self.offloaded else 0.0
+        }
+
+
+class OffloadExecutor:
+    """
+    Runs CPU-bound calls on a bounded native thread pool.
+
+    The calling greenlet waits cooperatively, so the gevent hub keeps serving
+    other requests and Socket.IO traffic while argon2, bulk crypto or image
+    work runs in a real thread (these libraries release the GIL). Each
+    operation name has its own concurrency limit, so a login storm cannot
+    occupy every worker thread needed by downloads. The Flask app context of
+    the caller is pushed in the worker thread, but offloaded functions must
+    not use the database session.
+    """
+
+    def __init__(self, pool_size=4, limits=None, default_limit=2, min_size=64 * 1024):
+        """
+        Initializes the OffloadExecutor.
+
+        Args:
+            pool_size (int): The number of native worker threads.
+            limits (dict, optional): Maps operation names to their maximum concurrency.
+            default_limit (int): The concurrency of operations without an explicit limit.
+            min_size (int): Payloads smaller than this many bytes run inline in
+                offload_if_large(), where a thread hop would cost more than it saves.
+        """
+        self.pool_size = pool_size
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self.min_size = min_size
+        self.enabled = ThreadPool is not None
+        self._pool = None
+        self._semaphores = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def configure(self, pool_size=None, limits=None, min_size=None, enabled=None):
+        """
+        Updates the executor settings. Must be called before the first offloaded call.
+
+        Args:
+            pool_size (int, optional): The number of native worker threads.
+            limits (dict, optional): Per-operation concurrency limits.
+            min_size (int, optional): The inline threshold for offload_if_large().
+            enabled (bool, optional): Whether to offload at all.
+        """
+        with self._lock:
+            if pool_size is not None:
+                self.pool_size = pool_size
+            if limits is not None:
+                self.limits = dict(limits)
+                self._semaphores = {}
+            if min_size is not None:
+                self.min_size = min_size
+            if enabled is not None:
+                self.enabled = enabled and ThreadPool is not None
+
+    def run(self, operation, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) on the thread pool and waits for its result.
+
+        Args:
+            operation (str): The operation name used for limits and metrics.
+            func: The CPU-bound callable.
+
+        Returns:
+            The callable's result.
+
+        Raises:
+            Exception: Whatever the callable raised.
+        """
+        stats = self._get_stats(operation)
+        if not self.enabled:
+            stats.inline += 1
+            return func(*args, **kwargs)
+
+        app = current_app._get_current_object() if has_app_context() else None
+        submitted = time.monotonic()
+        started = []
+
+        def task():
+            started.append(time.monotonic())
+            if app is None:
+                return func(*args, **kwargs)
+            with app.app_context():
+                return func(*args, **kwargs)
+
+        stats.waiting += 1
+        with self._get_semaphore(operation):
+            stats.waiting -= 1
+            stats.active += 1
+            try:
+                return self._get_pool().apply(task)
+            except Exception:
+                stats.failed += 1
+                raise
+            finally:
+                finished = time.monotonic()
+                queue_time = (started[0] if started else finished) - submitted
+                stats.active -= 1
+                stats.offloaded += 1
+                stats.queue_time += queue_time
+                stats.max_queue_time = max(stats.max_queue_time, queue_time)
+                stats.run_time += finished - (started[0] if started else finished)
+
+    def run_if_large(self, operation, size, func, *args, **kwargs):
+        """
+        Like run(), but calls func inline when the payload is below min_size.
+
+        Args:
+            operation (str): The operation name used for limits and metrics.
+            size (int): The payload size in bytes.
+            func: The CPU-bound callable.
+
+        Returns:
+            The callable's result.
+        """
+        if size < self.min_size:
+            self._get_stats(operation).inline += 1
+            return func(*args, **kwargs)
+        return self.run(operation, func, *args, **kwargs)
+
+    def stats(self):
+        """
+        Returns per-operation counters and queue times.
+
+        Returns:
+            dict: The pool size and the counters of every operation seen so far.
+        """
+        return {
+            'enabled': self.enabled,
+            'pool_size': self.pool_size,
+            'operations': {name: stats.as_dict() for name, stats in list(self._stats.items())}
+        }
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPool(self.pool_size)
+        return self._pool
+
+    def _get_semaphore(self, operation):
+        semaphore = self._semaphores.get(operation)
+        if semaphore is None:
+            with self._lock:
+                semaphore = self._semaphores.setdefault(
+                    operation, BoundedSemaphore(self.limits.get(operation, self.default_limit))
+                )
+        return semaphore
+
+    def _get_stats(self, operation):
+        stats = self._stats.get(operation)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(operation, _OperationStats())
+        return stats
+
+
+executor = OffloadExecutor()
+
+
+def offload(operation, func, *args, **kwargs):
+    """Runs a CPU-bound call on the shared executor. See OffloadExecutor.run()."""
+    return executor.run(operation, func, *args, **kwargs)
+
+
+def offload_if_large(operation, size, func, *args, **kwargs):
+    """Runs a CPU-bound call on the shared executor if its payload is large. See OffloadExecutor.run_if_large()."""
+    return executor.run_if_large(operation, size, func, *args, **kwargs)
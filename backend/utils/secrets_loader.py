@@ -0,0 +1,198 @@
+#! /usr/bin/env python3
+
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# Sealed objects are limited to 128 bytes, so the bundle is an AES-GCM file
+# whose 256-bit key is the only thing sealed
+BUNDLE_FILE = 'app_secrets.bundle'
+BUNDLE_KEY_FILE = 'app_secrets.bundle.key'
+BUNDLE_MAGIC = b'ABSB1'
+BUNDLE_NONCE_SIZE = 12
+
+DOCKER_SECRETS_DIR = Path('/secrets')
+
+
+def _secret_dirs(app_secrets_dir):
+    # List each candidate directory once instead of probing every secret path separately
+    dirs = []
+    for directory in (DOCKER_SECRETS_DIR, Path(app_secrets_dir)):
+        try:
+            dirs.append((directory, set(os.listdir(directory))))
+        except OSError:
+            continue
+    return dirs
+
+
+def _locations(name, dirs, fallback_dir):
+    locations = []
+    env_path = os.environ.get(f"{name.upper()}_FILE")
+    if env_path and os.path.exists(env_path):
+        locations.append(Path(env_path))
+    for directory, entries in dirs:
+        if name in entries:
+            locations.append(directory / name)
+    if fallback_dir is not None and Path(fallback_dir) / name not in locations:
+        # Providers without files on disk (the simulator) resolve names themselves
+        locations.append(Path(fallback_dir) / name)
+    return locations
+
+
+def _unseal_first(key_provider, locations):
+    errors = []
+    for location in locations:
+        try:
+            return key_provider.unseal(location)
+        except Exception as e:
+            errors.append(f"{location}: {str(e)}")
+    raise RuntimeError("; ".join(errors) or "not found")
+
+
+def _fingerprint(name, dirs):
+    # Hash of the sealed file that would be unsealed for this name, None if it is not a file
+    for location in _locations(name, dirs, None):
+        try:
+            return hashlib.sha256(location.read_bytes()).hexdigest()
+        except OSError:
+            continue
+    return None
+
+
+def _read_bundle(key_provider, dirs):
+    for directory, entries in dirs:
+        if BUNDLE_FILE in entries and BUNDLE_KEY_FILE in entries:
+            key = key_provider.unseal(directory / BUNDLE_KEY_FILE)
+            blob = (directory / BUNDLE_FILE).read_bytes()
+            if not blob.startswith(BUNDLE_MAGIC):
+                raise ValueError(f"{directory / BUNDLE_FILE} is not a secrets bundle")
+
+            header_size = len(BUNDLE_MAGIC) + BUNDLE_NONCE_SIZE
+            plaintext = AESGCM(key).decrypt(
+                blob[len(BUNDLE_MAGIC):header_size], blob[header_size:], BUNDLE_FILE.encode('utf-8')
+            )
+            contents = json.loads(plaintext.decode('utf-8'))
+            if 'sources' not in contents:
+                raise ValueError("Bundle predates source tracking; re-run scripts/seal_secrets_bundle.py")
+
+            # A secret re-sealed after the bundle was written takes precedence over the bundled value
+            secrets = {}
+            for name, value in contents['secrets'].items():
+                if contents['sources'].get(name) == _fingerprint(name, dirs):
+                    secrets[name] = value
+                else:
+                    print(f"Sealed secret {name} changed since the bundle was written, unsealing it individually")
+            return secrets
+    return {}
+
+
+def load_startup_secrets(required, optional=(), app_secrets_dir='secrets'):
+    """
+    Unseals all application secrets needed at startup in a single pass.
+
+    The candidate directories are listed once and the shared key provider
+    (one TPM context) is reused for every secret. If a secrets bundle is
+    present, its values are used for every secret whose sealed file is
+    unchanged since the bundle was written; missing or re-sealed secrets are
+    unsealed individually. Each secret is looked up in the path given by the
+    {NAME}_FILE environment variable, then /secrets, then app_secrets_dir.
+
+    Args:
+        required (iterable): Names of secrets that must be available.
+        optional (iterable, optional): Names of secrets that may be missing.
+        app_secrets_dir (str | Path): The application's own secrets directory.
+
+    Returns:
+        tuple: (secrets, timings) where secrets maps each found name to its
+            UTF-8 decoded value and timings maps each startup step to its
+            duration in milliseconds.
+
+    Raises:
+        RuntimeError: If a required secret cannot be unsealed.
+    """
+    from backend.utils.key_provider import get_key_provider
+
+    timings = {}
+    started = step = time.perf_counter()
+
+    def lap(label):
+        nonlocal step
+        now = time.perf_counter()
+        timings[label] = round((now - step) * 1000, 1)
+        step = now
+
+    key_provider = get_key_provider()
+    lap('provider')
+
+    dirs = _secret_dirs(app_secrets_dir)
+    lap('resolve')
+
+    try:
+        bundle = _read_bundle(key_provider, dirs)
+    except Exception as e:
+        print(f"Error reading secrets bundle, unsealing secrets individually: {str(e)}")
+        bundle = {}
+    lap('bundle')
+
+    secrets = {}
+    for name, is_required in [(name, True) for name in required] + [(name, False) for name in optional]:
+        if name in bundle:
+            secrets[name] = bundle[name]
+            continue
+
+        locations = _locations(name, dirs, app_secrets_dir if is_required else None)
+        if not locations:
+            continue
+        try:
+            secrets[name] = _unseal_first(key_provider, locations).decode("utf-8", errors='replace')
+        except RuntimeError as e:
+            if is_required:
+                print(f"Error unsealing secret {name}: {str(e)}")
+                raise RuntimeError(f"Failed to unseal secret: {name}")
+            print(f"Error unsealing optional secret {name}: {str(e)}")
+        lap(f"unseal:{name}")
+
+    timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+    return secrets, timings
+
+
+def write_secrets_bundle(secrets, directory, key_provider):
+    """
+    Writes all given secrets into one bundle under a freshly sealed key,
+    together with a hash of each secret's sealed file so a later re-seal
+    invalidates the bundled value.
+
+    Args:
+        secrets (dict): Maps secret names to their string values.
+        directory (str | Path): Where the bundle and its sealed key are written.
+        key_provider (KeyProvider): The provider used to seal the bundle key.
+
+    Returns:
+        Path: The path of the bundle file.
+    """
+    directory = Path(directory)
+    dirs = _secret_dirs(directory)
+    contents = {
+        'secrets': secrets,
+        'sources': {name: _fingerprint(name, dirs) for name in secrets}
+    }
+    key = AESGCM.generate_key(bit_length=256)
+    nonce = os.urandom(BUNDLE_NONCE_SIZE)
+    ciphertext = AESGCM(key).encrypt(
+        nonce, json.dumps(contents).encode('utf-8'), BUNDLE_FILE.encode('utf-8')
+    )
+
+    # Sealed blobs are bound to their name and cannot be renamed into place. If
+    # the bundle write below is interrupted, it no longer decrypts and startup
+    # falls back to the individually sealed secrets.
+    key_provider.seal(key, directory / BUNDLE_KEY_FILE)
+    tmp_file = directory / f".{BUNDLE_FILE}.tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(BUNDLE_MAGIC + nonce + ciphertext)
+    os.chmod(tmp_file, 0o600)
+    os.replace(tmp_file, directory / BUNDLE_FILE)
+    return directory / BUNDLE_FILE
@@ -0,0 +1,391 @@
+#! /usr/bin/env python3
+
+
+import base64
+import hashlib
+import os
+import struct
+from io import BytesIO
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Container layout (all integers big-endian):
+#   magic (4) | version (1) | algorithm (1) | key id (4) | chunk size (4) | nonce prefix (7)
+#   followed by records of ciphertext + 16-byte tag, one per plaintext chunk.
+# Every chunk is chunk-size bytes except the last, which may be shorter (or empty
+# for an empty plaintext).
+# The nonce of chunk i is nonce prefix | i (4) | final flag (1), and the header is
+# authenticated as associated data of every chunk, so records cannot be reordered,
+# truncated or moved between containers.
+MAGIC = b"ABSC"
+VERSION = 1
+ALG_AES_256_GCM = 1
+ALG_CHACHA20_POLY1305 = 2
+ALGORITHMS = {
+    'aes-256-gcm': ALG_AES_256_GCM,
+    'chacha20-poly1305': ALG_CHACHA20_POLY1305
+}
+
+HEADER_FORMAT = ">4sBB4sI7s"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+TAG_SIZE = 16
+NONCE_PREFIX_SIZE = 7
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+MAX_CHUNKS = 2 ** 32
+
+
+class ContainerHeader:
+    """Parsed header of a chunked AEAD container."""
+
+    __slots__ = ('algorithm', 'key_id', 'chunk_size', 'nonce_prefix', 'raw')
+
+    def __init__(self, algorithm, key_id, chunk_size, nonce_prefix, raw):
+        self.algorithm = algorithm
+        self.key_id = key_id
+        self.chunk_size = chunk_size
+        self.nonce_prefix = nonce_prefix
+        self.raw = raw
+
+    @property
+    def record_size(self):
+        """int: The stored size of a full chunk, including its tag."""
+        return self.chunk_size + TAG_SIZE
+
+
+def is_container(data):
+    """
+    Checks whether data starts with a chunked AEAD container header.
+
+    Args:
+        data (bytes): The stored blob, or at least its first bytes.
+
+    Returns:
+        bool: True if the data is a container.
+    """
+    return data[:len(MAGIC)] == MAGIC
+
+
+def key_id(key):
+    """
+    Derives the 4-byte identifier stored in the header for a key.
+
+    Args:
+        key (bytes): The data key.
+
+    Returns:
+        bytes: The key identifier.
+    """
+    return hashlib.sha256(key).digest()[:4]
+
+
+def derive_cipher(key, algorithm, context=b"authberry-stream-v1:"):
+    """
+    Builds the AEAD cipher for a key, deriving a dedicated subkey per algorithm and context.
+
+    Args:
+        key (bytes): A Fernet key (base64) or raw key material.
+        algorithm (int): The AEAD algorithm id.
+        context (bytes, optional): Domain separation label for the derived key.
+
+    Returns:
+        AESGCM | ChaCha20Poly1305: The cipher.
+
+    Raises:
+        ValueError: If the algorithm is unknown.
+    """
+    # Data keys are Fernet keys; derive a dedicated AEAD key per algorithm
+    raw_key = base64.urlsafe_b64decode(key) if len(key) == 44 else key
+    aead_key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=context + bytes([algorithm])
+    ).derive(raw_key)
+
+    if algorithm == ALG_AES_256_GCM:
+        return AESGCM(aead_key)
+    if algorithm == ALG_CHACHA20_POLY1305:
+        return ChaCha20Poly1305(aead_key)
+    raise ValueError(f"Unsupported container algorithm: {algorithm}")
+
+
+def _nonce(header, index, final):
+    if index >= MAX_CHUNKS:
+        raise ValueError("Container has too many chunks")
+    return header.nonce_prefix + struct.pack(">IB", index, 1 if final else 0)
+
+
+def parse_header(data):
+    """
+    Parses and validates a container header.
+
+    Args:
+        data (bytes): At least the first HEADER_SIZE bytes of the container.
+
+    Returns:
+        ContainerHeader: The parsed header.
+
+    Raises:
+        ValueError: If the header is missing, truncated or unsupported.
+    """
+    if len(data) < HEADER_SIZE or not is_container(data):
+        raise ValueError("Not a chunked AEAD container")
+
+    _, version, algorithm, header_key_id, chunk_size, nonce_prefix = struct.unpack(
+        HEADER_FORMAT, data[:HEADER_SIZE]
+    )
+    if version != VERSION:
+        raise ValueError(f"Unsupported container version: {version}")
+    if algorithm not in ALGORITHMS.values():
+        raise ValueError(f"Unsupported container algorithm: {algorithm}")
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"Invalid container chunk size: {chunk_size}")
+
+    return ContainerHeader(algorithm, header_key_id, chunk_size, nonce_prefix, bytes(data[:HEADER_SIZE]))
+
+
+def encrypted_size(plaintext_size, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Computes the container size for a plaintext of the given size.
+
+    Args:
+        plaintext_size (int): The plaintext length in bytes.
+        chunk_size (int, optional): The container chunk size.
+
+    Returns:
+        int: The container length in bytes.
+    """
+    chunks = max(1, -(-plaintext_size // chunk_size))
+    return HEADER_SIZE + plaintext_size + chunks * TAG_SIZE
+
+
+def plaintext_size(container_size, chunk_size):
+    """
+    Computes the plaintext size of a container from its stored size.
+
+    Args:
+        container_size (int): The container length in bytes.
+        chunk_size (int): The container chunk size.
+
+    Returns:
+        int: The plaintext length in bytes.
+    """
+    body = container_size - HEADER_SIZE
+    chunks = (body + chunk_size + TAG_SIZE - 1) // (chunk_size + TAG_SIZE)
+    return body - max(chunks, 1) * TAG_SIZE
+
+
+class StreamEncryptor:
+    """
+    Incrementally encrypts a plaintext stream into a container.
+
+    Plaintext is buffered only up to one chunk, so memory use is independent of
+    the total size. Call update() with plaintext as it arrives and finalize()
+    once; each call returns the container bytes that are ready to be written.
+    """
+
+    def __init__(self, key, algorithm=ALG_AES_256_GCM, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Initializes the StreamEncryptor.
+
+        Args:
+            key (bytes): The data key.
+            algorithm (int | str, optional): The AEAD algorithm id or name.
+            chunk_size (int, optional): The plaintext size of each chunk.
+        """
+        if isinstance(algorithm, str):
+            algorithm = ALGORITHMS[algorithm]
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError(f"Invalid container chunk size: {chunk_size}")
+
+        raw = struct.pack(
+            HEADER_FORMAT, MAGIC, VERSION, algorithm, key_id(key), chunk_size, os.urandom(NONCE_PREFIX_SIZE)
+        )
+        self.header = parse_header(raw)
+        self._cipher = derive_cipher(key, algorithm)
+        self._buffer = bytearray()
+        self._index = 0
+        self._header_written = False
+        self._finalized = False
+
+    def update(self, data):
+        """
+        Adds plaintext to the stream.
+
+        Args:
+            data (bytes): The next plaintext bytes.
+
+        Returns:
+            bytes: Container bytes ready to be written (possibly empty).
+        """
+        if self._finalized:
+            raise ValueError("Stream has already been finalized")
+
+        self._buffer += data
+        output = bytearray(self._take_header())
+
+        # Hold back the last full chunk until more data arrives; it may be the final one
+        chunk_size = self.header.chunk_size
+        while len(self._buffer) > chunk_size:
+            output += self._seal(bytes(self._buffer[:chunk_size]), final=False)
+            del self._buffer[:chunk_size]
+        return bytes(output)
+
+    def finalize(self):
+        """
+        Ends the stream and seals the final chunk.
+
+        Returns:
+            bytes: The remaining container bytes.
+        """
+        if self._finalized:
+            raise ValueError("Stream has already been finalized")
+
+        output = self._take_header() + self._seal(bytes(self._buffer), final=True)
+        self._buffer = bytearray()
+        self._finalized = True
+        return output
+
+    def _take_header(self):
+        if self._header_written:
+            return b""
+        self._header_written = True
+        return self.header.raw
+
+    def _seal(self, chunk, final):
+        nonce = _nonce(self.header, self._index, final)
+        self._index += 1
+        return self._cipher.encrypt(nonce, chunk, self.header.raw)
+
+
+def encrypt_stream(reader, writer, key, algorithm=ALG_AES_256_GCM, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Encrypts everything readable from a file-like object into a container.
+
+    Args:
+        reader: A binary file-like object to read plaintext from.
+        writer: A binary file-like object to write the container to.
+        key (bytes): The data key.
+        algorithm (int | str, optional): The AEAD algorithm id or name.
+        chunk_size (int, optional): The plaintext size of each chunk.
+
+    Returns:
+        int: The number of plaintext bytes encrypted.
+    """
+    encryptor = StreamEncryptor(key, algorithm, chunk_size)
+    total = 0
+    while True:
+        data = reader.read(chunk_size)
+        if not data:
+            break
+        total += len(data)
+        writer.write(encryptor.update(data))
+    writer.write(encryptor.finalize())
+    return total
+
+
+def iter_decrypt(reader, key, start_chunk=0):
+    """
+    Decrypts a container read from a file-like object one chunk at a time.
+
+    Only one record is held in memory besides a one-record read-ahead used to
+    detect the final chunk.
+
+    Args:
+        reader: A binary file-like object positioned at the start of the container.
+        key (bytes): The data key.
+        start_chunk (int, optional): The first chunk to decrypt. The reader must
+            be seekable when this is not 0.
+
+    Yields:
+        bytes: Plaintext chunks, in order.
+
+    Raises:
+        ValueError: If the container is malformed, truncated or for another key.
+        cryptography.exceptions.InvalidTag: If any chunk fails authentication.
+    """
+    header = parse_header(reader.read(HEADER_SIZE))
+    if header.key_id != key_id(key):
+        raise ValueError("Container was encrypted with a different key")
+
+    cipher = derive_cipher(key, header.algorithm)
+    if start_chunk:
+        reader.seek(HEADER_SIZE + start_chunk * header.record_size)
+
+    index = start_chunk
+    record = reader.read(header.record_size)
+    while True:
+        next_record = reader.read(header.record_size) if len(record) == header.record_size else b""
+        final = not next_record
+
+        if len(record) < TAG_SIZE:
+            raise ValueError("Container is truncated")
+
+        yield cipher.decrypt(_nonce(header, index, final), record, header.raw)
+
+        if final:
+            return
+        record = next_record
+        index += 1
+
+
+def iter_decrypt_range(reader, key, start, stop):
+    """
+    Decrypts only the chunks covering a plaintext byte range.
+
+    Args:
+        reader: A seekable binary file-like object positioned at the start of the container.
+        key (bytes): The data key.
+        start (int): The first plaintext byte to return.
+        stop (int): One past the last plaintext byte to return.
+
+    Yields:
+        bytes: Plaintext for [start, stop), in order.
+    """
+    if stop <= start:
+        return
+
+    header = parse_header(reader.read(HEADER_SIZE))
+    reader.seek(0)
+
+    first_chunk = start // header.chunk_size
+    position = first_chunk * header.chunk_size
+    for chunk in iter_decrypt(reader, key, start_chunk=first_chunk):
+        chunk_end = position + len(chunk)
+        yield chunk[max(start - position, 0):stop - position]
+        if chunk_end >= stop:
+            return
+        position = chunk_end
+
+
+def encrypt_bytes(data, key, algorithm=ALG_AES_256_GCM, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Encrypts an in-memory plaintext into a container.
+
+    Args:
+        data (bytes): The plaintext.
+        key (bytes): The data key.
+        algorithm (int | str, optional): The AEAD algorithm id or name.
+        chunk_size (int, optional): The plaintext size of each chunk.
+
+    Returns:
+        bytes: The container.
+    """
+    encryptor = StreamEncryptor(key, algorithm, chunk_size)
+    return encryptor.update(data) + encryptor.finalize()
+
+
+def decrypt_bytes(data, key):
+    """
+    Decrypts an in-memory container.
+
+    Args:
+        data (bytes): The container.
+        key (bytes): The data key.
+
+    Returns:
+        bytes: The plaintext.
+    """
+    return b"".join(iter_decrypt(BytesIO(data), key))
@@ -1,7 +1,13 @@
 #! /usr/bin/env python3
 
 
+import atexit
+import heapq
+import itertools
 import secrets
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import Union, ByteString
 
@@ -30,124 +36,289 @@ from tpm2_pytss.types import (
 )
 
 
-class TPMManager:
+# Scheduling priorities for TPM commands; lower values run first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+
+class _PendingCall:
+    """Result slot shared by all callers coalesced onto one TPM command."""
+
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class TPMScheduler:
     """
-    Manages the creation, sealing, and unsealing of secrets using TPM.
+    Serializes TPM commands through a single priority queue.
+
+    The TPM is a strictly serial device, so only one command runs at a time.
+    When the device is busy, callers wait in priority order (interactive before
+    bulk, FIFO within a priority). Identical in-flight requests that share a
+    coalescing key run once and every waiter receives the same result.
     """
 
-    def __init__(self, secrets_dir: Union[str, Path], persistent_handle: int = 0x81010001):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = []
+        self._busy = False
+        self._sequence = itertools.count()
+        self._inflight = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def run(self, operation, priority: int = PRIORITY_INTERACTIVE, coalesce_key=None):
         """
-        Initializes the TPMManager.
+        Runs a TPM operation once the device is free.
 
         Args:
-            secrets_dir: The directory path where sealed secrets will be stored.
-            persistent_handle: The TPM persistent handle value to use for the primary key.
+            operation: A callable performing the TPM command.
+            priority: The scheduling priority; lower values are served first.
+            coalesce_key: Optional key identifying identical requests. Concurrent
+                calls with the same key share a single execution.
+
+        Returns:
+            The operation's result.
+
+        Raises:
+            Exception: Whatever the operation raised, re-raised in every waiter.
         """
-        self.ectx = ESAPI()
-        self.primary_handle = None
-        self.secret = None
-        self.persistent_handle = TPM2_HANDLE(persistent_handle)
-        self.secrets_dir = Path(secrets_dir)
+        if coalesce_key is None:
+            return self._execute(operation, priority)
+
+        with self._lock:
+            pending = self._inflight.get(coalesce_key)
+            is_owner = pending is None
+            if is_owner:
+                pending = _PendingCall()
+                self._inflight[coalesce_key] = pending
+            else:
+                pending.waiters += 1
+                self.coalesced += 1
+
+        if not is_owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.result
 
         try:
-            self.secrets_dir.mkdir(exist_ok=True, parents=True)
-            print(f"[TPMManager] Using secrets directory: {self.secrets_dir.absolute()}")
-        except PermissionError:
-            print(f"[TPMManager] Permission error creating directory {self.secrets_dir}")
-            raise
+            pending.result = self._execute(operation, priority)
+            return pending.result
         except Exception as e:
-            print(f"[TPMManager] Error creating directory {self.secrets_dir}: {str(e)}")
+            pending.error = e
             raise
+        except BaseException:
+            # A killed owner must not hand its waiters None as the result
+            pending.error = RuntimeError("TPM call aborted")
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(coalesce_key, None)
+            pending.done.set()
 
-    def generate_or_load_primary_key(self) -> None:
+    def stats(self) -> dict:
         """
-        Generates a new primary key on the TPM or loads an existing one if available.
-        This key is used as the parent for sealing other secrets.
+        Returns queue and wait-time counters for monitoring.
 
-        Raises:
-            TSS2_Exception: If there's an underlying error interacting with the TPM.
+        Returns:
+            dict: Current queue depth, command counts and wait times in milliseconds.
         """
+        with self._lock:
+            return {
+                'queue_depth': len(self._queue),
+                'max_queue_depth': self.max_queue_depth,
+                'busy': self._busy,
+                'inflight': len(self._inflight),
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'failed': self.failed,
+                'avg_wait_ms': round(self.total_wait * 1000 / self.executed, 3) if self.executed else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3)
+            }
+
+    def _execute(self, operation, priority: int):
+        enqueued_at = time.monotonic()
+        self._acquire(priority)
+        waited = time.monotonic() - enqueued_at
+
         try:
-            self.primary_handle = self.ectx.tr_from_tpmpublic(self.persistent_handle)
-            print("[TPMManager] Using existing persistent primary key.")
-        except TSS2_Exception:
-            print("[TPMManager] No persistent key found. Creating a new primary key...")
-
-            in_sensitive = TPM2B_SENSITIVE_CREATE()
-            in_public = TPM2B_PUBLIC(
-                publicArea=TPMT_PUBLIC(
-                    type=TPM2_ALG_ID.RSA,
-                    nameAlg=TPM2_ALG_ID.SHA256,
-                    objectAttributes=(
-                            TPMA_OBJECT.RESTRICTED
-                            | TPMA_OBJECT.DECRYPT
-                            | TPMA_OBJECT.FIXEDTPM
-                            | TPMA_OBJECT.FIXEDPARENT
-                            | TPMA_OBJECT.SENSITIVEDATAORIGIN
-                            | TPMA_OBJECT.USERWITHAUTH
-                    ),
-                    authPolicy=TPM2B_DIGEST(buffer=b""),
-                    parameters=TPMU_PUBLIC_PARMS(
-                        rsaDetail=TPMS_RSA_PARMS(
-                            symmetric=TPMT_SYM_DEF_OBJECT(
-                                algorithm=TPM2_ALG_ID.AES,
-                                keyBits=TPMU_SYM_KEY_BITS(aes=128),
-                                mode=TPMU_SYM_MODE(aes=TPM2_ALG_ID.CFB),
-                            ),
-                            scheme=TPMT_RSA_SCHEME(scheme=TPM2_ALG_ID.NULL),
-                            keyBits=2048,
-                            exponent=0,
-                        )
-                    ),
-                    unique=TPMU_PUBLIC_ID(rsa=TPM2B_PUBLIC_KEY_RSA(buffer=b"")),
-                )
-            )
+            return operation()
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.executed += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            self._release()
+
+    def _acquire(self, priority: int) -> None:
+        with self._lock:
+            if not self._busy and not self._queue:
+                self._busy = True
+                return
+            turn = threading.Event()
+            entry = (priority, next(self._sequence), turn)
+            heapq.heappush(self._queue, entry)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+
+        # Ownership is handed over directly by the releasing caller
+        try:
+            turn.wait()
+        except BaseException:
+            # A waiter killed by a timeout or disconnect must not keep or swallow ownership
+            with self._lock:
+                granted = turn.is_set()
+                if not granted:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+            if granted:
+                self._release()
+            raise
 
-            creation_result = self.ectx.create_primary(
-                in_sensitive=in_sensitive,
-                in_public=in_public,
-                primary_handle=ESYS_TR.OWNER,
-                outside_info=TPM2B_DATA(buffer=b""),
-                creation_pcr=TPML_PCR_SELECTION(),
-            )
+    def _release(self) -> None:
+        with self._lock:
+            if self._queue:
+                _, _, turn = heapq.heappop(self._queue)
+                turn.set()
+            else:
+                self._busy = False
 
-            self.primary_handle = creation_result[0]
 
-            self.ectx.evict_control(
-                ESYS_TR.OWNER, self.primary_handle, self.persistent_handle
-            )
-            print("[TPMManager] Created and persisted new primary key.")
+class TPMSession:
+    """
+    Process-wide TPM session holding a single ESAPI context, the persistent
+    primary key handle, and a small cache of loaded sealed-object handles.
+    """
 
-    def generate_secret(self, size: int = 32) -> bytes:
+    def __init__(self, persistent_handle: int = 0x81010001, max_loaded_objects: int = 3):
         """
-        Generates a cryptographically secure random secret of a specified size.
+        Initializes the TPMSession. The ESAPI context is opened lazily.
 
         Args:
-            size: The size of the secret in bytes.
+            persistent_handle: The TPM persistent handle value to use for the primary key.
+            max_loaded_objects: The maximum number of sealed objects kept loaded at once.
+                Most TPMs only provide three transient object slots.
+        """
+        self.ectx = None
+        self.primary_handle = None
+        self.persistent_handle = TPM2_HANDLE(persistent_handle)
+        self.max_loaded_objects = max(1, max_loaded_objects)
+        self._loaded = OrderedDict()
+        self._lock = threading.RLock()
+        self.scheduler = TPMScheduler()
+
+    def open(self) -> ESAPI:
+        """
+        Opens the ESAPI context if it is not already open.
 
         Returns:
-            bytes: The generated random secret.
+            ESAPI: The shared ESAPI context.
         """
-        self.secret = secrets.token_bytes(size)
-        return self.secret
+        with self._lock:
+            if self.ectx is None:
+                self.ectx = ESAPI()
+                print("[TPMSession] Opened ESAPI context")
+            return self.ectx
 
-    def seal_secret(self, secret: ByteString, filename: str) -> Path:
+    def load_primary_key(self) -> ESYS_TR:
         """
-        Seals a given secret using the TPM primary key. The sealed secret can only
-        be unsealed by the same TPM and conditions.
+        Loads the persistent primary key, creating and persisting it on first use.
+        The handle is cached for the lifetime of the session.
+
+        Returns:
+            ESYS_TR: The primary key handle.
+
+        Raises:
+            TSS2_Exception: If there's an underlying error interacting with the TPM.
+        """
+        with self._lock:
+            if self.primary_handle is not None:
+                return self.primary_handle
+
+            ectx = self.open()
+
+            try:
+                self.primary_handle = ectx.tr_from_tpmpublic(self.persistent_handle)
+                print("[TPMSession] Using existing persistent primary key.")
+            except TSS2_Exception:
+                print("[TPMSession] No persistent key found. Creating a new primary key...")
+
+                in_sensitive = TPM2B_SENSITIVE_CREATE()
+                in_public = TPM2B_PUBLIC(
+                    publicArea=TPMT_PUBLIC(
+                        type=TPM2_ALG_ID.RSA,
+                        nameAlg=TPM2_ALG_ID.SHA256,
+                        objectAttributes=(
+                                TPMA_OBJECT.RESTRICTED
+                                | TPMA_OBJECT.DECRYPT
+                                | TPMA_OBJECT.FIXEDTPM
+                                | TPMA_OBJECT.FIXEDPARENT
+                                | TPMA_OBJECT.SENSITIVEDATAORIGIN
+                                | TPMA_OBJECT.USERWITHAUTH
+                        ),
+                        authPolicy=TPM2B_DIGEST(buffer=b""),
+                        parameters=TPMU_PUBLIC_PARMS(
+                            rsaDetail=TPMS_RSA_PARMS(
+                                symmetric=TPMT_SYM_DEF_OBJECT(
+                                    algorithm=TPM2_ALG_ID.AES,
+                                    keyBits=TPMU_SYM_KEY_BITS(aes=128),
+                                    mode=TPMU_SYM_MODE(aes=TPM2_ALG_ID.CFB),
+                                ),
+                                scheme=TPMT_RSA_SCHEME(scheme=TPM2_ALG_ID.NULL),
+                                keyBits=2048,
+                                exponent=0,
+                            )
+                        ),
+                        unique=TPMU_PUBLIC_ID(rsa=TPM2B_PUBLIC_KEY_RSA(buffer=b"")),
+                    )
+                )
+
+                creation_result = ectx.create_primary(
+                    in_sensitive=in_sensitive,
+                    in_public=in_public,
+                    primary_handle=ESYS_TR.OWNER,
+                    outside_info=TPM2B_DATA(buffer=b""),
+                    creation_pcr=TPML_PCR_SELECTION(),
+                )
+
+                transient_handle = creation_result[0]
+
+                self.primary_handle = ectx.evict_control(
+                    ESYS_TR.OWNER, transient_handle, self.persistent_handle
+                )
+                # The persistent copy is all we need; free the transient slot
+                ectx.flush_context(transient_handle)
+                print("[TPMSession] Created and persisted new primary key.")
+
+            return self.primary_handle
+
+    def seal(self, secret: ByteString, blob_file: Union[str, Path],
+             priority: int = PRIORITY_INTERACTIVE) -> Path:
+        """
+        Seals a secret under the primary key and writes the blob to a file.
 
         Args:
             secret: The secret (bytes-like object) to be sealed.
-            filename: The name of the file to store the sealed secret blob.
+            blob_file: The path of the file to store the sealed secret blob in.
+            priority: The scheduling priority of the TPM command.
 
         Returns:
             Path: The file system path where the sealed secret was stored.
-
-        Raises:
-            ValueError: If the primary key has not been loaded or generated.
         """
-        if self.primary_handle is None:
-            raise ValueError("Primary key must be generated or loaded first.")
+        blob_file = Path(blob_file)
 
         in_sensitive = TPM2B_SENSITIVE_CREATE(
             sensitive=TPMS_SENSITIVE_CREATE(
@@ -176,47 +347,121 @@ class TPMManager:
             )
         )
 
-        creation_result = self.ectx.create(
-            parent_handle=self.primary_handle,
-            in_sensitive=in_sensitive,
-            in_public=in_public,
-            outside_info=TPM2B_DATA(buffer=b""),
-            creation_pcr=TPML_PCR_SELECTION(),
-        )
+        def create_sealed_object():
+            with self._lock:
+                primary_handle = self.load_primary_key()
+
+                creation_result = self.ectx.create(
+                    parent_handle=primary_handle,
+                    in_sensitive=in_sensitive,
+                    in_public=in_public,
+                    outside_info=TPM2B_DATA(buffer=b""),
+                    creation_pcr=TPML_PCR_SELECTION(),
+                )
 
-        out_private, out_public = creation_result[0], creation_result[1]
+                out_private, out_public = creation_result[0], creation_result[1]
 
-        blob_file = self.secrets_dir / filename
+                with open(blob_file, "wb") as f:
+                    f.write(out_private.marshal())
+                    f.write(out_public.marshal())
 
-        with open(blob_file, "wb") as f:
-            f.write(out_private.marshal())
-            f.write(out_public.marshal())
+                # A previously loaded object for this file is now stale
+                self.flush(blob_file)
 
-        print(f"[TPMManager] Sealed secret written to {blob_file}")
+        self.scheduler.run(create_sealed_object, priority)
+
+        print(f"[TPMSession] Sealed secret written to {blob_file}")
         return blob_file
 
-    def unseal_secret(self, filename: str) -> bytes:
+    def unseal(self, blob_file: Union[str, Path], priority: int = PRIORITY_INTERACTIVE) -> bytes:
         """
-        Unseals a previously sealed secret from a file.
+        Unseals a secret from a sealed blob file, reusing an already loaded
+        object handle when the blob has not changed since it was loaded.
+        Concurrent requests for the same blob share a single TPM unseal.
 
         Args:
-            filename: The name of the file containing the sealed secret blob.
+            blob_file: The path of the file containing the sealed secret blob.
+            priority: The scheduling priority of the TPM command.
 
         Returns:
             bytes: The unsealed secret.
 
         Raises:
-            ValueError: If the primary key has not been loaded or generated.
             FileNotFoundError: If the specified sealed secret file does not exist.
         """
-        if self.primary_handle is None:
-            raise ValueError("Primary key must be generated or loaded first.")
-
-        blob_file = self.secrets_dir / filename
+        blob_file = Path(blob_file)
 
         if not blob_file.exists():
             raise FileNotFoundError(f"Secret file {blob_file} not found")
 
+        def unseal_object():
+            with self._lock:
+                handle = self._get_loaded_handle(blob_file)
+                try:
+                    unsealed_data = self.ectx.unseal(handle, ESYS_TR.PASSWORD)
+                except TSS2_Exception:
+                    # The cached handle may have been invalidated; reload once
+                    self.flush(blob_file)
+                    handle = self._get_loaded_handle(blob_file)
+                    unsealed_data = self.ectx.unseal(handle, ESYS_TR.PASSWORD)
+            return bytes(unsealed_data.buffer)
+
+        unsealed_bytes = self.scheduler.run(
+            unseal_object,
+            priority,
+            coalesce_key=('unseal', str(blob_file.absolute()))
+        )
+
+        print(f"[TPMSession] Unsealed secret {blob_file.name} (size={len(unsealed_bytes)})")
+        return unsealed_bytes
+
+    def flush(self, blob_file: Union[str, Path, None] = None) -> None:
+        """
+        Flushes loaded sealed objects from the TPM.
+
+        Args:
+            blob_file: The blob whose loaded object should be flushed. Flushes
+                every loaded object if omitted.
+        """
+        with self._lock:
+            if blob_file is None:
+                cache_keys = list(self._loaded)
+            else:
+                cache_keys = [str(Path(blob_file).absolute())]
+
+            for cache_key in cache_keys:
+                entry = self._loaded.pop(cache_key, None)
+                if entry is None:
+                    continue
+                try:
+                    self.ectx.flush_context(entry[0])
+                except TSS2_Exception as e:
+                    print(f"[TPMSession] Failed to flush object for {cache_key}: {str(e)}")
+
+    def close(self) -> None:
+        """Flushes all loaded objects and closes the ESAPI context."""
+        with self._lock:
+            if self.ectx is None:
+                return
+            self.flush()
+            self.ectx.close()
+            self.ectx = None
+            self.primary_handle = None
+            print("[TPMSession] Closed ESAPI context")
+
+    def _get_loaded_handle(self, blob_file: Path) -> ESYS_TR:
+        cache_key = str(blob_file.absolute())
+        mtime_ns = blob_file.stat().st_mtime_ns
+
+        entry = self._loaded.get(cache_key)
+        if entry is not None:
+            if entry[1] == mtime_ns:
+                self._loaded.move_to_end(cache_key)
+                return entry[0]
+            self.flush(blob_file)
+
+        primary_handle = self.load_primary_key()
+
         with open(blob_file, "rb") as f:
             blob_data = f.read()
 
@@ -225,10 +470,130 @@ class TPMManager:
         offset += consumed
         out_public, consumed = TPM2B_PUBLIC.unmarshal(blob_data[offset:])
 
-        loaded_handle = self.ectx.load(self.primary_handle, out_private, out_public)
-        unsealed_data = self.ectx.unseal(loaded_handle, ESYS_TR.PASSWORD)
+        # Stay within the TPM's transient object slots
+        while len(self._loaded) >= self.max_loaded_objects:
+            oldest_key = next(iter(self._loaded))
+            self.flush(oldest_key)
 
-        unsealed_bytes = bytes(unsealed_data.buffer)
+        handle = self.ectx.load(primary_handle, out_private, out_public)
+        self._loaded[cache_key] = (handle, mtime_ns)
+        return handle
 
-        print(f"[TPMManager] Unsealed secret {filename} (size={len(unsealed_bytes)})")
-        return unsealed_bytes
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_tpm_session() -> TPMSession:
+    """
+    Returns the process-wide TPM session, creating it on first use.
+
+    Returns:
+        TPMSession: The shared TPM session.
+    """
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = TPMSession()
+                atexit.register(_session.close)
+    return _session
+
+
+class TPMManager:
+    """
+    Manages the creation, sealing, and unsealing of secrets using TPM.
+    All instances share the process-wide TPMSession.
+    """
+
+    def __init__(self, secrets_dir: Union[str, Path], persistent_handle: int = 0x81010001):
+        """
+        Initializes the TPMManager.
+
+        Args:
+            secrets_dir: The directory path where sealed secrets will be stored.
+            persistent_handle: The TPM persistent handle value to use for the primary key.
+        """
+        self.session = get_tpm_session()
+        self.primary_handle = None
+        self.secret = None
+        self.persistent_handle = TPM2_HANDLE(persistent_handle)
+        self.secrets_dir = Path(secrets_dir)
+
+        try:
+            self.secrets_dir.mkdir(exist_ok=True, parents=True)
+            print(f"[TPMManager] Using secrets directory: {self.secrets_dir.absolute()}")
+        except PermissionError:
+            print(f"[TPMManager] Permission error creating directory {self.secrets_dir}")
+            raise
+        except Exception as e:
+            print(f"[TPMManager] Error creating directory {self.secrets_dir}: {str(e)}")
+            raise
+
+    @property
+    def ectx(self) -> ESAPI:
+        """The shared ESAPI context."""
+        return self.session.open()
+
+    def generate_or_load_primary_key(self) -> None:
+        """
+        Generates a new primary key on the TPM or loads an existing one if available.
+        This key is used as the parent for sealing other secrets.
+
+        Raises:
+            TSS2_Exception: If there's an underlying error interacting with the TPM.
+        """
+        self.primary_handle = self.session.load_primary_key()
+
+    def generate_secret(self, size: int = 32) -> bytes:
+        """
+        Generates a cryptographically secure random secret of a specified size.
+
+        Args:
+            size: The size of the secret in bytes.
+
+        Returns:
+            bytes: The generated random secret.
+        """
+        self.secret = secrets.token_bytes(size)
+        return self.secret
+
+    def seal_secret(self, secret: ByteString, filename: str) -> Path:
+        """
+        Seals a given secret using the TPM primary key. The sealed secret can only
+        be unsealed by the same TPM and conditions.
+
+        Args:
+            secret: The secret (bytes-like object) to be sealed.
+            filename: The name of the file to store the sealed secret blob.
+
+        Returns:
+            Path: The file system path where the sealed secret was stored.
+
+        Raises:
+            ValueError: If the primary key has not been loaded or generated.
+        """
+        if self.primary_handle is None:
+            raise ValueError("Primary key must be generated or loaded first.")
+
+        return self.session.seal(secret, self.secrets_dir / filename)
+
+    def unseal_secret(self, filename: str) -> bytes:
+        """
+        Unseals a previously sealed secret from a file.
+
+        Args:
+            filename: The name of the file containing the sealed secret blob.
+
+        Returns:
+            bytes: The unsealed secret.
+
+        Raises:
+            ValueError: If the primary key has not been loaded or generated.
+            FileNotFoundError: If the specified sealed secret file does not exist.
+        """
+        if self.primary_handle is None:
+            raise ValueError("Primary key must be generated or loaded first.")
+
+        return self.session.unseal(self.secrets_dir / filename)
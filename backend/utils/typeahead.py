@@ -0,0 +1,337 @@
+#! /usr/bin/env python3
+
+
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+# Word starts are padded so short prefixes still produce trigrams
+PAD = "  "
+# Share of query trigrams a fuzzy match must contain
+MIN_SCORE = 0.5
+# Shorter queries only complete prefixes; fuzzy matching needs a full trigram
+MIN_FUZZY_LENGTH = 3
+# Prefix match tiers: whole name, a word of the name, a word of the folder path or a tag
+RANK_NAME, RANK_NAME_WORD, RANK_CONTEXT_WORD = range(3)
+
+
+def trigrams(text):
+    """
+    Splits text into the lowercase trigrams of its words.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        set: The trigrams.
+    """
+    grams = set()
+    for word in text.lower().split():
+        padded = PAD + word + " "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TypeaheadIndex:
+    """
+    Prefix and trigram index over the secrets one user can see.
+
+    Each entry holds the secret's name, the path of the folder the user sees it
+    in and its tag names. Completions come from sorted key lists, one per match
+    tier, so a lookup only bisects and reads as many keys as it returns no
+    matter how many secrets share a prefix. When prefixes do not fill the
+    result, entries sharing most of the query's trigrams are added, so typos
+    and reordered words still match.
+    """
+
+    def __init__(self):
+        """Initializes an empty TypeaheadIndex."""
+        self._entries = {}
+        self._keys = [[] for _ in range(RANK_CONTEXT_WORD + 1)]
+        self._postings = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, secret_id):
+        return secret_id in self._entries
+
+    def add(self, secret_id, name, folder_path="", tags=(), **fields):
+        """
+        Adds or replaces the entry of a secret.
+
+        Args:
+            secret_id (int): The ID of the secret.
+            name (str): The secret name.
+            folder_path (str, optional): The folder path the user sees the secret in.
+            tags (iterable, optional): The tag names.
+            **fields: Extra values returned with lookup results.
+        """
+        self.remove(secret_id)
+        tags = list(tags)
+        name_words = name.lower().split()
+        context_words = " ".join((folder_path.replace("/", " "), *tags)).lower().split()
+        keys = {(RANK_NAME, " ".join(name_words))}
+        keys.update((RANK_NAME_WORD, word) for word in name_words[1:])
+        keys.update((RANK_CONTEXT_WORD, word) for word in context_words)
+        grams = trigrams(" ".join(name_words + context_words))
+
+        self._entries[secret_id] = {
+            'entry': {'id': secret_id, 'name': name, 'folder_path': folder_path, 'tags': tags, **fields},
+            'keys': keys,
+            'grams': grams
+        }
+        for rank, key in keys:
+            bisect.insort(self._keys[rank], (key, secret_id))
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(secret_id)
+
+    def remove(self, secret_id):
+        """
+        Drops the entry of a secret if present.
+
+        Args:
+            secret_id (int): The ID of the secret.
+
+        Returns:
+            bool: True if an entry was removed.
+        """
+        indexed = self._entries.pop(secret_id, None)
+        if indexed is None:
+            return False
+        for rank, key in indexed['keys']:
+            keys = self._keys[rank]
+            position = bisect.bisect_left(keys, (key, secret_id))
+            if position < len(keys) and keys[position] == (key, secret_id):
+                del keys[position]
+        for gram in indexed['grams']:
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(secret_id)
+                if not postings:
+                    del self._postings[gram]
+        return True
+
+    def lookup(self, text, limit=10):
+        """
+        Finds the best matching entries.
+
+        Args:
+            text (str): What the user has typed so far.
+            limit (int, optional): The maximum number of results.
+
+        Returns:
+            list: Entry dicts with a match score, best match first.
+        """
+        query = " ".join(text.lower().split())
+        if not query or limit <= 0:
+            return []
+
+        found = {}
+        for rank, keys in enumerate(self._keys):
+            position = bisect.bisect_left(keys, (query,))
+            while position < len(keys) and len(found) < limit:
+                key, secret_id = keys[position]
+                if not key.startswith(query):
+                    break
+                found.setdefault(secret_id, 3.0 - rank)
+                position += 1
+
+        if len(found) < limit and len(query) >= MIN_FUZZY_LENGTH:
+            found.update(self._fuzzy(query, limit - len(found), exclude=found))
+
+        return [{**self._entries[secret_id]['entry'], 'score': score} for secret_id, score in found.items()]
+
+    def _fuzzy(self, query, limit, exclude):
+        grams = trigrams(query)
+        counts = {}
+        for gram in grams:
+            for secret_id in self._postings.get(gram, ()):
+                counts[secret_id] = counts.get(secret_id, 0) + 1
+
+        needed = len(grams) * MIN_SCORE
+        matches = sorted(
+            (-count, self._entries[secret_id]['entry']['name'], secret_id)
+            for secret_id, count in counts.items()
+            if count >= needed and secret_id not in exclude
+        )
+        return {secret_id: round(-count / len(grams), 3) for count, _, secret_id in matches[:limit]}
+
+
+class TypeaheadCache:
+    """
+    Bounded in-process cache of per-user typeahead indexes.
+
+    Indexes are built on first use, kept up to date by the write paths and
+    evicted in least-recently-used order once the cache is full or after a
+    user has been idle for the TTL, which bounds memory on small devices.
+    """
+
+    def __init__(self, max_users=16, idle_ttl=900):
+        """
+        Initializes the TypeaheadCache.
+
+        Args:
+            max_users (int): The maximum number of indexes kept in memory.
+            idle_ttl (int): Seconds without a lookup before an index is dropped.
+        """
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.builds = 0
+        # Bumped by every change notification so builds racing a write are not cached
+        self.generation = 0
+
+    def configure(self, max_users=None, idle_ttl=None):
+        """
+        Updates the cache limits, evicting indexes that no longer fit.
+
+        Args:
+            max_users (int, optional): The new maximum number of indexes.
+            idle_ttl (int, optional): The new idle TTL in seconds.
+        """
+        with self._lock:
+            if max_users is not None:
+                self.max_users = max_users
+            if idle_ttl is not None:
+                self.idle_ttl = idle_ttl
+            self._shrink()
+
+    def get(self, user_id):
+        """
+        Returns a user's index if cached and not idle for too long.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            TypeaheadIndex: The index, or None on a cache miss.
+        """
+        user_id = int(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._indexes.get(user_id)
+            if entry is None or entry[1] + self.idle_ttl <= now:
+                if entry is not None:
+                    self._evict(user_id)
+                self.misses += 1
+                return None
+
+            self._indexes[user_id] = (entry[0], now)
+            self._indexes.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user_id, index, generation=None):
+        """
+        Stores a freshly built index for a user.
+
+        Args:
+            user_id (int): The ID of the user.
+            index (TypeaheadIndex): The index.
+            generation (int, optional): The generation read before the index was
+                built; the index is not cached if a change happened since.
+        """
+        if self.max_users <= 0:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._indexes[int(user_id)] = (index, time.monotonic())
+            self._indexes.move_to_end(int(user_id))
+            self.builds += 1
+            self._shrink()
+
+    def cached_users(self):
+        """
+        Returns the IDs of the users with a cached index.
+
+        Returns:
+            list: The user IDs.
+        """
+        with self._lock:
+            return list(self._indexes)
+
+    def peek(self, user_id):
+        """
+        Returns a user's index without touching its recency, for updates.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            TypeaheadIndex: The index, or None if not cached.
+        """
+        with self._lock:
+            entry = self._indexes.get(int(user_id))
+            return entry[0] if entry else None
+
+    def mark_changed(self):
+        """Records that secrets changed, so indexes built before now are not cached."""
+        with self._lock:
+            self.generation += 1
+
+    def invalidate(self, user_id):
+        """
+        Drops a user's index so it is rebuilt on the next lookup.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            bool: True if an index was removed.
+        """
+        with self._lock:
+            if int(user_id) not in self._indexes:
+                return False
+            self._evict(int(user_id))
+            return True
+
+    def clear(self):
+        """Drops every cached index."""
+        with self._lock:
+            for user_id in list(self._indexes):
+                self._evict(user_id)
+
+    def stats(self):
+        """
+        Returns the cache counters for monitoring and tuning.
+
+        Returns:
+            dict: The number of cached indexes and entries, limits and counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'users': len(self._indexes),
+                'entries': sum(len(index) for index, _ in self._indexes.values()),
+                'max_users': self.max_users,
+                'idle_ttl': self.idle_ttl,
+                'builds': self.builds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _shrink(self):
+        # The oldest index comes first, so idle ones are dropped from the front
+        now = time.monotonic()
+        while self._indexes:
+            user_id, (_, last_used) = next(iter(self._indexes.items()))
+            if len(self._indexes) <= max(self.max_users, 0) and last_used + self.idle_ttl > now:
+                break
+            self._evict(user_id)
+
+    def _evict(self, user_id):
+        self._indexes.pop(user_id)
+        self.evictions += 1
+
+
+typeahead_cache = TypeaheadCache()
@@ -0,0 +1,123 @@
+#! /usr/bin/env python3
+
+
+import base64
+import fcntl
+import os
+import threading
+import time
+from pathlib import Path
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+MASTER_KEY_FILE = 'user_master_key.sealed'
+MASTER_KEY_SIZE = 32
+CONTEXT = b"authberry-user-key-v1:"
+
+
+class UserKeyDeriver:
+    """
+    Derives per-user file keys from a single TPM-sealed master key.
+
+    The master key is unsealed once per process; every user key is then an
+    HKDF expansion of it with the user ID and key version as info, so the TPM
+    cost no longer grows with the number of users. Rotating a user's key only
+    bumps its version, and every earlier version stays derivable. Derived keys
+    use the Fernet key encoding so they drop in wherever a sealed user key was
+    used before.
+    """
+
+    def __init__(self):
+        """Initializes an empty UserKeyDeriver; the master key is supplied with load()."""
+        self._master_key = None
+        self._lock = threading.Lock()
+        self.derivations = 0
+        self.unseal_ms = None
+
+    def load(self, master_key):
+        """
+        Sets the master key.
+
+        Args:
+            master_key (bytes): The raw master key.
+
+        Raises:
+            ValueError: If the key is too short.
+        """
+        if len(master_key) < MASTER_KEY_SIZE:
+            raise ValueError("User master key must be at least 32 bytes")
+        self._master_key = bytes(master_key)
+
+    def load_from_provider(self, key_provider, secrets_dir):
+        """
+        Unseals the master key, sealing a new one first if none exists yet.
+
+        Creation is serialized with a lock file so concurrent workers cannot
+        seal two different master keys.
+
+        Args:
+            key_provider (KeyProvider): The provider holding the master key.
+            secrets_dir (str | Path): The directory of the sealed user keys.
+        """
+        with self._lock:
+            if self._master_key is not None:
+                return
+
+            started = time.perf_counter()
+            key_path = Path(secrets_dir) / MASTER_KEY_FILE
+            os.makedirs(secrets_dir, exist_ok=True)
+            with open(Path(secrets_dir) / f".{MASTER_KEY_FILE}.lock", 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if not key_provider.exists(key_path):
+                    key_provider.seal(os.urandom(MASTER_KEY_SIZE), key_path)
+                master_key = key_provider.unseal(key_path)
+
+            self.load(master_key)
+            self.unseal_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    @property
+    def loaded(self):
+        """bool: Whether the master key has been loaded."""
+        return self._master_key is not None
+
+    def derive(self, user_id, version):
+        """
+        Derives a user's file key.
+
+        Args:
+            user_id (int): The ID of the user.
+            version (int): The user's key version.
+
+        Returns:
+            bytes: The key, encoded as a Fernet key.
+
+        Raises:
+            RuntimeError: If the master key has not been loaded.
+        """
+        if self._master_key is None:
+            raise RuntimeError("User master key is not loaded")
+
+        raw_key = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=CONTEXT + f"{int(user_id)}:{int(version)}".encode('ascii')
+        ).derive(self._master_key)
+        self.derivations += 1
+        return base64.urlsafe_b64encode(raw_key)
+
+    def stats(self):
+        """
+        Returns the deriver state for monitoring.
+
+        Returns:
+            dict: Whether the master key is loaded, how long unsealing took and the derivation count.
+        """
+        return {
+            'loaded': self.loaded,
+            'unseal_ms': self.unseal_ms,
+            'derivations': self.derivations
+        }
+
+
+user_key_deriver = UserKeyDeriver()
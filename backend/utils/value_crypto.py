@@ -0,0 +1,342 @@
+#! /usr/bin/env python3
+
+
+import base64
+import os
+import struct
+import time
+import zlib
+from backend.utils import stream_crypto
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; large values are compressed with zlib instead
+    zstandard = None
+
+# Value layout: version (1) | algorithm (1) | key id (4) | nonce (12) | ciphertext + 16-byte tag.
+# The header is authenticated as associated data. Legacy Fernet tokens decode to a
+# leading 0x80 byte and are told apart by the version byte.
+# Packed values (version 3) carry a compression flag as their first plaintext byte,
+# so the choice of compressor is authenticated and made per value.
+VERSION = 0x02
+VERSION_PACKED = 0x03
+HEADER_FORMAT = ">BB4s"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+NONCE_SIZE = 12
+TAG_SIZE = 16
+CONTEXT = b"authberry-value-v2:"
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+COMPRESSION_NAMES = {COMPRESSION_NONE: 'none', COMPRESSION_ZLIB: 'zlib', COMPRESSION_ZSTD: 'zstd'}
+# Upper bound for a decompressed value, well above any text secret
+MAX_UNPACKED_SIZE = 16 * 1024 * 1024
+
+_algorithm = stream_crypto.ALG_AES_256_GCM
+_benchmark = {}
+_compression = {name: {'values': 0, 'bytes_in': 0, 'bytes_out': 0} for name in COMPRESSION_NAMES.values()}
+
+
+def key_id(key):
+    """
+    Derives the 4-byte identifier stored in the header for a key.
+
+    Args:
+        key (bytes): The key.
+
+    Returns:
+        bytes: The key identifier.
+    """
+    return stream_crypto.key_id(key)
+
+
+def derive_cipher(key, algorithm):
+    """
+    Builds the value cipher for a key and algorithm.
+
+    Args:
+        key (bytes): The key.
+        algorithm (int): The AEAD algorithm id.
+
+    Returns:
+        AESGCM | ChaCha20Poly1305: The cipher.
+    """
+    return stream_crypto.derive_cipher(key, algorithm, context=CONTEXT)
+
+
+def is_encrypted_value(blob):
+    """
+    Checks whether binary data starts with a value header.
+
+    Args:
+        blob (bytes): The stored data.
+
+    Returns:
+        bool: True if the data uses this format.
+    """
+    return len(blob) >= HEADER_SIZE + NONCE_SIZE + TAG_SIZE and blob[0] in (VERSION, VERSION_PACKED)
+
+
+def parse_header(blob):
+    """
+    Reads the algorithm and key identifier of an encrypted value.
+
+    Args:
+        blob (bytes): The encrypted value.
+
+    Returns:
+        tuple: (algorithm, key_id).
+
+    Raises:
+        ValueError: If the data is not an encrypted value.
+    """
+    if not is_encrypted_value(blob):
+        raise ValueError("Not an encrypted value")
+    _, algorithm, header_key_id = struct.unpack(HEADER_FORMAT, blob[:HEADER_SIZE])
+    return algorithm, header_key_id
+
+
+def pack(data, threshold):
+    """
+    Prefixes data with a compression flag, compressing it first if it is at
+    least threshold bytes long and compression makes it smaller.
+
+    Args:
+        data (bytes): The plaintext.
+        threshold (int): The smallest size worth compressing.
+
+    Returns:
+        bytes: The flag byte followed by the (possibly compressed) data.
+    """
+    flag, body = COMPRESSION_NONE, data
+    if len(data) >= threshold:
+        if zstandard is not None:
+            compressed, method = zstandard.ZstdCompressor(level=9).compress(data), COMPRESSION_ZSTD
+        else:
+            compressed, method = zlib.compress(data, 6), COMPRESSION_ZLIB
+        if len(compressed) < len(data):
+            flag, body = method, compressed
+
+    counters = _compression[COMPRESSION_NAMES[flag]]
+    counters['values'] += 1
+    counters['bytes_in'] += len(data)
+    counters['bytes_out'] += len(body)
+    return bytes([flag]) + body
+
+
+def unpack(payload):
+    """
+    Reverses pack().
+
+    Args:
+        payload (bytes): The flag byte followed by the (possibly compressed) data.
+
+    Returns:
+        bytes: The original data.
+
+    Raises:
+        ValueError: If the flag is unknown, zstd is unavailable or the value is too large.
+    """
+    flag, body = payload[0], payload[1:]
+    if flag == COMPRESSION_NONE:
+        return body
+    if flag == COMPRESSION_ZLIB:
+        decompressor = zlib.decompressobj()
+        data = decompressor.decompress(body, MAX_UNPACKED_SIZE)
+        if decompressor.unconsumed_tail:
+            raise ValueError("Decompressed value is too large")
+        return data
+    if flag == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise ValueError("Value is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(body, max_output_size=MAX_UNPACKED_SIZE)
+    raise ValueError(f"Unknown compression flag: {flag}")
+
+
+def seal(data, cipher, header_key_id, algorithm=None, compress_threshold=None):
+    """
+    Encrypts data with a prepared cipher.
+
+    Args:
+        data (bytes): The plaintext.
+        cipher: The cipher returned by derive_cipher() for this algorithm.
+        header_key_id (bytes): The identifier of the cipher's key.
+        algorithm (int, optional): The cipher's algorithm id; defaults to the selected one.
+        compress_threshold (int, optional): Write a packed value, compressing data of at
+            least this many bytes. Plain values are written if omitted.
+
+    Returns:
+        bytes: The encrypted value.
+    """
+    version = VERSION
+    if compress_threshold is not None:
+        version, data = VERSION_PACKED, pack(data, compress_threshold)
+
+    header = struct.pack(HEADER_FORMAT, version, algorithm or _algorithm, header_key_id)
+    nonce = os.urandom(NONCE_SIZE)
+    return header + nonce + cipher.encrypt(nonce, data, header)
+
+
+def open_sealed(blob, cipher):
+    """
+    Decrypts an encrypted value with a prepared cipher, decompressing packed values.
+
+    Args:
+        blob (bytes): The encrypted value.
+        cipher: The cipher for the key and algorithm named in its header.
+
+    Returns:
+        bytes: The plaintext.
+
+    Raises:
+        cryptography.exceptions.InvalidTag: If the value fails authentication.
+    """
+    body = HEADER_SIZE + NONCE_SIZE
+    plaintext = cipher.decrypt(blob[HEADER_SIZE:body], blob[body:], blob[:HEADER_SIZE])
+    return unpack(plaintext) if blob[0] == VERSION_PACKED else plaintext
+
+
+def encrypt(data, key, compress_threshold=None):
+    """
+    Encrypts data under a key with the selected algorithm.
+
+    Args:
+        data (bytes): The plaintext.
+        key (bytes): The key.
+        compress_threshold (int, optional): See seal().
+
+    Returns:
+        bytes: The encrypted value.
+    """
+    return seal(data, derive_cipher(key, _algorithm), key_id(key), _algorithm, compress_threshold)
+
+
+def decrypt(blob, key):
+    """
+    Decrypts an encrypted value.
+
+    Args:
+        blob (bytes): The encrypted value.
+        key (bytes): The key it was encrypted with.
+
+    Returns:
+        bytes: The plaintext.
+
+    Raises:
+        ValueError: If the value was encrypted under a different key.
+        cryptography.exceptions.InvalidTag: If the value fails authentication.
+    """
+    algorithm, header_key_id = parse_header(blob)
+    if header_key_id != key_id(key):
+        raise ValueError("Value was encrypted with a different key")
+    return open_sealed(blob, derive_cipher(key, algorithm))
+
+
+def to_text(blob):
+    """
+    Encodes an encrypted value for a text column.
+
+    Args:
+        blob (bytes): The encrypted value.
+
+    Returns:
+        str: Unpadded base64url text.
+    """
+    return base64.urlsafe_b64encode(blob).rstrip(b"=").decode('ascii')
+
+
+def from_text(text):
+    """
+    Decodes a stored text value if it uses this format.
+
+    Args:
+        text (str | bytes): The stored value.
+
+    Returns:
+        bytes: The encrypted value, or None for legacy Fernet tokens.
+    """
+    if isinstance(text, bytes):
+        text = text.decode('ascii', errors='replace')
+    if not text or text.startswith("gAAAAA"):
+        return None
+    try:
+        blob = base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+    except ValueError:
+        return None
+    return blob if is_encrypted_value(blob) else None
+
+
+def benchmark_algorithms(size=4096, rounds=200):
+    """
+    Measures the throughput of every supported algorithm on this machine.
+
+    Args:
+        size (int, optional): The plaintext size of each round in bytes.
+        rounds (int, optional): How many encrypt and decrypt rounds to time.
+
+    Returns:
+        dict: Maps algorithm names to MiB/s for an encrypt plus decrypt round trip.
+    """
+    key = os.urandom(32)
+    data = os.urandom(size)
+    results = {}
+    for name, algorithm in stream_crypto.ALGORITHMS.items():
+        cipher = derive_cipher(key, algorithm)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            open_sealed(seal(data, cipher, b"\0" * 4, algorithm), cipher)
+        elapsed = time.perf_counter() - started
+        results[name] = round(size * rounds / elapsed / 2 ** 20, 1) if elapsed else 0.0
+    return results
+
+
+def configure(algorithm='auto'):
+    """
+    Selects the algorithm used for new values.
+
+    Args:
+        algorithm (str, optional): An algorithm name, or 'auto' to pick the
+            fastest one on this machine with a short benchmark.
+
+    Returns:
+        str: The name of the selected algorithm.
+
+    Raises:
+        ValueError: If the algorithm name is unknown.
+    """
+    global _algorithm, _benchmark
+
+    if algorithm == 'auto':
+        _benchmark = benchmark_algorithms()
+        algorithm = max(_benchmark, key=_benchmark.get)
+    if algorithm not in stream_crypto.ALGORITHMS:
+        raise ValueError(f"Unknown value encryption algorithm: {algorithm}")
+
+    _algorithm = stream_crypto.ALGORITHMS[algorithm]
+    return algorithm
+
+
+def get_algorithm():
+    """int: The algorithm id used for new values."""
+    return _algorithm
+
+
+def algorithm_name():
+    """str: The name of the algorithm used for new values."""
+    return next(name for name, value in stream_crypto.ALGORITHMS.items() if value == _algorithm)
+
+
+def stats():
+    """
+    Returns the selected algorithm, the startup benchmark results and compression counters.
+
+    Returns:
+        dict: The algorithm name, MiB/s per algorithm if benchmarked, and per
+            compression method the number of values and bytes before and after.
+    """
+    return {
+        'algorithm': algorithm_name(),
+        'benchmark_mib_s': dict(_benchmark),
+        'compression': {name: dict(counters) for name, counters in _compression.items()}
+    }
@@ -0,0 +1,164 @@
+#! /usr/bin/env python3
+
+
+import json
+import time
+
+try:
+    import msgpack
+except ImportError:  # The compact codec is optional; sessions fall back to JSON
+    msgpack = None
+
+
+class Codec:
+    """
+    Serializes WebSocket payloads before encryption.
+
+    The codec id is written as the first plaintext byte, inside the
+    authenticated data, so a payload cannot be reinterpreted with another codec.
+    Encode and decode counters are kept per codec to compare CPU cost and size.
+    """
+
+    __slots__ = ('codec_id', 'name', '_dumps', '_loads', 'encoded', 'decoded', 'bytes_out', 'bytes_in',
+                 'encode_time', 'decode_time')
+
+    def __init__(self, codec_id, name, dumps, loads):
+        """
+        Initializes the Codec.
+
+        Args:
+            codec_id (int): The one-byte identifier written before the payload.
+            name (str): The name used during negotiation.
+            dumps: Serializes a payload to bytes.
+            loads: Deserializes bytes to a payload.
+        """
+        self.codec_id = codec_id
+        self.name = name
+        self._dumps = dumps
+        self._loads = loads
+        self.encoded = 0
+        self.decoded = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.encode_time = 0.0
+        self.decode_time = 0.0
+
+    def encode(self, data):
+        """
+        Serializes a payload and prefixes the codec id.
+
+        Args:
+            data: The payload.
+
+        Returns:
+            bytes: The codec id followed by the serialized payload.
+        """
+        started = time.perf_counter()
+        encoded = bytes([self.codec_id]) + self._dumps(data)
+        self.encode_time += time.perf_counter() - started
+        self.encoded += 1
+        self.bytes_out += len(encoded)
+        return encoded
+
+    def decode(self, body):
+        """
+        Deserializes a payload without its codec id byte.
+
+        Args:
+            body (bytes): The serialized payload.
+
+        Returns:
+            The payload.
+        """
+        started = time.perf_counter()
+        data = self._loads(body)
+        self.decode_time += time.perf_counter() - started
+        self.decoded += 1
+        self.bytes_in += len(body) + 1
+        return data
+
+    def stats(self):
+        """
+        Returns the codec counters for monitoring.
+
+        Returns:
+            dict: Message counts, byte totals and average CPU time per message.
+        """
+        return {
+            'encoded': self.encoded,
+            'decoded': self.decoded,
+            'bytes_out': self.bytes_out,
+            'bytes_in': self.bytes_in,
+            'avg_encode_us': round(self.encode_time * 1e6 / self.encoded, 1) if self.encoded else 0.0,
+            'avg_decode_us': round(self.decode_time * 1e6 / self.decoded, 1) if self.decoded else 0.0
+        }
+
+
+CODEC_JSON = 1
+CODEC_MSGPACK = 2
+
+_codecs = {
+    CODEC_JSON: Codec(
+        CODEC_JSON,
+        'json',
+        lambda data: json.dumps(data, separators=(',', ':')).encode('utf-8'),
+        lambda body: json.loads(body.decode('utf-8'))
+    )
+}
+if msgpack is not None:
+    _codecs[CODEC_MSGPACK] = Codec(
+        CODEC_MSGPACK,
+        'msgpack',
+        lambda data: msgpack.packb(data, use_bin_type=True),
+        lambda body: msgpack.unpackb(body, raw=False)
+    )
+
+_codecs_by_name = {codec.name: codec for codec in _codecs.values()}
+
+
+def negotiate(offered, preferred):
+    """
+    Picks the codec for a session.
+
+    Args:
+        offered (iterable): Codec names the client supports.
+        preferred (iterable): Codec names the server allows, most preferred first.
+
+    Returns:
+        Codec: The first preferred codec the client offered and this server can
+            use, or None if there is none (the session uses untagged JSON).
+    """
+    offered = set(offered or ())
+    for name in preferred:
+        if name in offered and name in _codecs_by_name:
+            return _codecs_by_name[name]
+    return None
+
+
+def decode(plaintext):
+    """
+    Deserializes a plaintext produced by any registered codec.
+
+    Args:
+        plaintext (bytes): The codec id followed by the serialized payload.
+
+    Returns:
+        The payload.
+
+    Raises:
+        ValueError: If the codec id is unknown.
+    """
+    codec = _codecs.get(plaintext[0]) if plaintext else None
+    if codec is None:
+        raise ValueError("Unknown payload codec")
+    return codec.decode(plaintext[1:])
+
+
+def stats():
+    """
+    Returns the counters of every available codec.
+
+    Returns:
+        dict: Codec counters keyed by codec name.
+    """
+    return {codec.name: codec.stats() for codec in _codecs.values()}
@@ -66,8 +66,8 @@ def handle_login(data):
                 emit('login_error', {'error': error})
             return
 
-        client_sessions[sid]['user_id'] = result['user']['id']
-        client_sessions[sid]['username'] = result['user']['username']
+        client_sessions[sid].user_id = result['user']['id']
+        client_sessions[sid].username = result['user']['username']
 
         access_token = result['access_token']
         refresh_token = create_refresh_token(
@@ -168,8 +168,8 @@ def handle_register(data):
             expires_delta=timedelta(days=7)
         )
 
-        client_sessions[sid]['user_id'] = result['user']['id']
-        client_sessions[sid]['username'] = result['user']['username']
+        client_sessions[sid].user_id = result['user']['id']
+        client_sessions[sid].username = result['user']['username']
 
         user_data = {
             'user': result['user'],
@@ -202,7 +202,7 @@ def handle_refresh_token(data):
     """
     sid = request.sid
 
-    if sid not in client_sessions or 'shared_secret' not in client_sessions[sid]:
+    if not has_shared_secret(sid):
         emit('error', {'message': 'Secure connection not established'})
         return
 
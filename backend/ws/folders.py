@@ -16,11 +16,11 @@ def handle_get_folders(data):
     """
     sid = request.sid
 
-    if sid not in client_sessions or 'user_id' not in client_sessions[sid]:
+    if sid not in client_sessions or client_sessions[sid].user_id is None:
         emit('error', {'message': 'Authentication required'})
         return
 
-    user_id = client_sessions[sid]['user_id']
+    user_id = client_sessions[sid].user_id
 
     try:
         query = Folder.query.filter(
@@ -59,11 +59,11 @@ def handle_get_folder(data):
     """
     sid = request.sid
 
-    if sid not in client_sessions or 'user_id' not in client_sessions[sid]:
+    if sid not in client_sessions or client_sessions[sid].user_id is None:
         emit('error', {'message': 'Authentication required'})
         return
 
-    user_id = client_sessions[sid]['user_id']
+    user_id = client_sessions[sid].user_id
 
     try:
         decrypted_data = decrypt_from_client(sid, data['encrypted'])
@@ -133,11 +133,11 @@ def handle_create_folder(data):
     """
     sid = request.sid
 
-    if sid not in client_sessions or 'user_id' not in client_sessions[sid]:
+    if sid not in client_sessions or client_sessions[sid].user_id is None:
         emit('error', {'message': 'Authentication required'})
         return
 
-    user_id = client_sessions[sid]['user_id']
+    user_id = client_sessions[sid].user_id
 
     try:
         decrypted_data = decrypt_from_client(sid, data['encrypted'])
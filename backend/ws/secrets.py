@@ -20,11 +20,11 @@ def handle_get_secrets(data):
     """
     sid = request.sid
 
-    if sid not in client_sessions or 'user_id' not in client_sessions[sid]:
+    if sid not in client_sessions or client_sessions[sid].user_id is None:
         emit('error', {'message': 'Authentication required'})
         return
 
-    user_id = client_sessions[sid]['user_id']
+    user_id = client_sessions[sid].user_id
 
     try:
         decrypted_data = None
@@ -78,11 +78,11 @@ def handle_get_secret(data):
     """
     sid = request.sid
 
-    if sid not in client_sessions or 'user_id' not in client_sessions[sid]:
+    if sid not in client_sessions or client_sessions[sid].user_id is None:
         emit('error', {'message': 'Authentication required'})
         return
 
-    user_id = client_sessions[sid]['user_id']
+    user_id = client_sessions[sid].user_id
 
     try:
         decrypted_data = decrypt_from_client(sid, data['encrypted'])
@@ -141,11 +141,11 @@ def handle_create_secret(data):
     """
     sid = request.sid
 
-    if sid not in client_sessions or 'user_id' not in client_sessions[sid]:
+    if sid not in client_sessions or client_sessions[sid].user_id is None:
         emit('error', {'message': 'Authentication required'})
         return
 
-    user_id = client_sessions[sid]['user_id']
+    user_id = client_sessions[sid].user_id
 
     try:
         decrypted_data = decrypt_from_client(sid, data['encrypted'])
@@ -208,11 +208,11 @@ def handle_get_all_secrets():
     """
     sid = request.sid
 
-    if sid not in client_sessions or 'user_id' not in client_sessions[sid]:
+    if sid not in client_sessions or client_sessions[sid].user_id is None:
         emit('error', {'message': 'Not authenticated'})
         return
 
-    user_id = client_sessions[sid]['user_id']
+    user_id = client_sessions[sid].user_id
 
     try:
         secrets = SecretsService.get_secrets_for_user(user_id)
@@ -243,11 +243,11 @@ def handle_get_secret(data):
     """
     sid = request.sid
 
-    if sid not in client_sessions or 'user_id' not in client_sessions[sid]:
+    if sid not in client_sessions or client_sessions[sid].user_id is None:
         emit('error', {'message': 'Not authenticated'})
         return
 
-    user_id = client_sessions[sid]['user_id']
+    user_id = client_sessions[sid].user_id
 
     if not data or 'id' not in data:
         try:
@@ -299,11 +299,11 @@ def handle_share_secret(data):
     """
     sid = request.sid
 
-    if sid not in client_sessions or 'user_id' not in client_sessions[sid]:
+    if sid not in client_sessions or client_sessions[sid].user_id is None:
         emit('error', {'message': 'Authentication required'})
         return
 
-    user_id = client_sessions[sid]['user_id']
+    user_id = client_sessions[sid].user_id
 
     try:
         decrypted_data = decrypt_from_client(sid, data['encrypted'])
@@ -351,7 +351,7 @@ def handle_share_secret(data):
 
         for user in users_to_share:
             for session_sid, session_data in client_sessions.items():
-                if session_data.get('user_id') == user.id:
+                if session_data.user_id == user.id:
                     user_encrypted = encrypt_for_client(session_sid, {'secret': secret_data})
                     emit('secret_shared', {'encrypted': user_encrypted}, room=session_sid)
 
@@ -10,7 +10,7 @@ from pathlib import Path
 # Add the directory containing tpm_manager.py to the Python path
 sys.path.append("/usr/local/bin")
 try:
-    from tpm_manager import TPMManager
+    from tpm_manager import get_tpm_session
 except ImportError:
     sys.exit("[-] Critical error: TPMManager module not found")
 
@@ -24,19 +24,18 @@ def get_sealed_creds():
     """
     Reads and unseals MariaDB root and user passwords from the TPM.
 
-    This function initializes the TPM manager, loads or generates the primary key,
-    and then unseals the 'mariadb_root' and 'mariadb_user' secrets.
+    Both secrets are unsealed through the process-wide TPM session, so the
+    TPM context and primary key are only set up once.
 
     Returns:
         tuple: A tuple containing (root_password, user_password) as strings if successful,
                otherwise (None, None).
     """
     try:
-        tpm_mgr = TPMManager(secrets_dir=str(SECRETS_DIR))
-        tpm_mgr.generate_or_load_primary_key()
+        tpm_session = get_tpm_session()
 
-        root_bytes = tpm_mgr.unseal_secret("mariadb_root")
-        user_bytes = tpm_mgr.unseal_secret("mariadb_user")
+        root_bytes = tpm_session.unseal(SECRETS_DIR / "mariadb_root")
+        user_bytes = tpm_session.unseal(SECRETS_DIR / "mariadb_user")
 
         if not root_bytes or not user_bytes:
             print("[-] Failed to unseal one or more credentials")
@@ -1,7 +1,20 @@
+import { encode as msgpackEncode, decode as msgpackDecode } from '@msgpack/msgpack'
+
+// Payload codec ids, written as the first plaintext byte (matches backend/utils/ws_codec.py)
+const CODECS = {
+  json: 1,
+  msgpack: 2
+}
+
 /**
  * Provides cryptographic operations for end-to-end encryption using Web Crypto API
  */
 class CryptoService {
+  /**
+   * Codec names this client supports, most preferred first
+   */
+  static supportedCodecs = ['msgpack', 'json']
+
   /**
    * Generate a key pair for DHKE
    * Using P-256 curve for better browser compatibility
@@ -111,18 +124,31 @@ class CryptoService {
    * Encrypt data using AES-GCM with the shared secret
    * @param {CryptoKey} key - AES-GCM key
    * @param {Object|string} data - Data to encrypt
+   * @param {number} [counter] - Per-session message counter used to build the nonce
+   * @param {string} [codec] - Negotiated payload codec; untagged JSON if not set
    * @returns {Promise<string>} - Base64 encoded encrypted data
    */
-  static async encrypt(key, data) {
-    try {
-      // Convert data to string if it's an object
-      const dataStr = typeof data === 'object' ? JSON.stringify(data) : String(data)
+  static async encrypt(key, data, counter, codec) {
+    return this.arrayBufferToBase64(await this.encryptRaw(key, data, counter, codec))
+  }
 
-      // Convert string to ArrayBuffer
-      const dataBuffer = new TextEncoder().encode(dataStr)
+  /**
+   * Encrypt data using AES-GCM for a binary frame
+   * @param {CryptoKey} key - AES-GCM key
+   * @param {Object|string} data - Data to encrypt
+   * @param {number} [counter] - Per-session message counter used to build the nonce
+   * @param {string} [codec] - Negotiated payload codec; untagged JSON if not set
+   * @returns {Promise<Uint8Array>} - IV followed by the ciphertext
+   */
+  static async encryptRaw(key, data, counter, codec) {
+    try {
+      const dataBuffer = this.encodePayload(data, codec)
 
-      // Generate random IV (12 bytes for AES-GCM), same as backend
-      const iv = window.crypto.getRandomValues(new Uint8Array(12))
+      // 12-byte IV: client direction tag followed by the 64-bit message counter,
+      // so nonces never repeat under the session key (random if no counter given)
+      const iv = counter === undefined
+        ? window.crypto.getRandomValues(new Uint8Array(12))
+        : this.counterNonce(counter)
 
       // Encrypt the data
       const ciphertext = await window.crypto.subtle.encrypt(
@@ -139,8 +165,7 @@ class CryptoService {
       result.set(iv, 0)
       result.set(new Uint8Array(ciphertext), iv.length)
 
-      // Return as base64
-      return this.arrayBufferToBase64(result)
+      return result
     } catch (error) {
       throw new Error('Failed to encrypt data')
     }
@@ -150,13 +175,22 @@ class CryptoService {
    * Decrypt data using AES-GCM with the shared secret
    * @param {CryptoKey} key - AES-GCM key
    * @param {string} encryptedBase64 - Base64 encoded encrypted data
+   * @param {string} [codec] - Negotiated payload codec; untagged JSON if not set
    * @returns {Promise<Object|string>} - Decrypted data
    */
-  static async decrypt(key, encryptedBase64) {
-    try {
-      // Convert base64 to ArrayBuffer
-      const encryptedData = this.base64ToArrayBuffer(encryptedBase64)
+  static async decrypt(key, encryptedBase64, codec) {
+    return this.decryptRaw(key, this.base64ToArrayBuffer(encryptedBase64), codec)
+  }
 
+  /**
+   * Decrypt data received in a binary frame
+   * @param {CryptoKey} key - AES-GCM key
+   * @param {ArrayBuffer|Uint8Array} encryptedData - IV followed by the ciphertext
+   * @param {string} [codec] - Negotiated payload codec; untagged JSON if not set
+   * @returns {Promise<Object|string>} - Decrypted data
+   */
+  static async decryptRaw(key, encryptedData, codec) {
+    try {
       // Extract IV (first 12 bytes) and ciphertext
       const iv = encryptedData.slice(0, 12)
       const ciphertext = encryptedData.slice(12)
@@ -171,20 +205,75 @@ class CryptoService {
         ciphertext
       )
 
-      // Convert ArrayBuffer to string
-      const decryptedStr = new TextDecoder().decode(decryptedBuffer)
-
-      // Try to parse as JSON, if it fails return as string
-      try {
-        return JSON.parse(decryptedStr)
-      } catch {
-        return decryptedStr
-      }
+      return this.decodePayload(new Uint8Array(decryptedBuffer), codec)
     } catch (error) {
       throw new Error('Failed to decrypt data')
     }
   }
 
+  /**
+   * Serialize a payload before encryption
+   * @param {Object|string} data - Payload
+   * @param {string} [codec] - Negotiated payload codec; untagged JSON if not set
+   * @returns {Uint8Array} - Plaintext bytes
+   */
+  static encodePayload(data, codec) {
+    if (!codec) {
+      const dataStr = typeof data === 'object' ? JSON.stringify(data) : String(data)
+      return new TextEncoder().encode(dataStr)
+    }
+
+    const body = codec === 'msgpack'
+      ? msgpackEncode(data)
+      : new TextEncoder().encode(JSON.stringify(data))
+    const plaintext = new Uint8Array(body.length + 1)
+    plaintext[0] = CODECS[codec]
+    plaintext.set(body, 1)
+    return plaintext
+  }
+
+  /**
+   * Deserialize a decrypted payload
+   * @param {Uint8Array} plaintext - Plaintext bytes
+   * @param {string} [codec] - Negotiated payload codec; untagged JSON if not set
+   * @returns {Object|string} - Payload
+   */
+  static decodePayload(plaintext, codec) {
+    if (codec) {
+      // The codec id travels inside the authenticated plaintext
+      const body = plaintext.subarray(1)
+      if (plaintext[0] === CODECS.msgpack) {
+        return msgpackDecode(body)
+      }
+      if (plaintext[0] === CODECS.json) {
+        return JSON.parse(new TextDecoder().decode(body))
+      }
+      throw new Error('Unknown payload codec')
+    }
+
+    const decryptedStr = new TextDecoder().decode(plaintext)
+
+    // Try to parse as JSON, if it fails return as string
+    try {
+      return JSON.parse(decryptedStr)
+    } catch {
+      return decryptedStr
+    }
+  }
+
+  /**
+   * Build a client-to-server nonce from a message counter
+   * @param {number} counter - Message counter
+   * @returns {Uint8Array} - 12-byte nonce
+   */
+  static counterNonce(counter) {
+    const iv = new Uint8Array(12)
+    const view = new DataView(iv.buffer)
+    view.setUint32(0, 2) // Client direction tag, matching the backend SessionCipher
+    view.setBigUint64(4, BigInt(counter))
+    return iv
+  }
+
   /**
    * Convert ArrayBuffer to Base64 string
    * @param {ArrayBuffer} buffer - Array buffer to convert
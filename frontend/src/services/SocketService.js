@@ -12,6 +12,9 @@ class SocketService {
       publicKey: null,
       serverPublicKey: null,
       sharedKey: null,
+      sendCounter: 0,
+      binary: false,
+      codec: null,
       keyExchangeComplete: false
     }
     this.eventHandlers = {}
@@ -73,6 +76,9 @@ class SocketService {
     this.cryptoState.publicKey = null
     this.cryptoState.serverPublicKey = null
     this.cryptoState.sharedKey = null
+    this.cryptoState.sendCounter = 0
+    this.cryptoState.binary = false
+    this.cryptoState.codec = null
   }
 
   /**
@@ -376,10 +382,14 @@ class SocketService {
         this.cryptoState.privateKey,
         this.cryptoState.serverPublicKey
       )
+      this.cryptoState.sendCounter = 0
 
       // Send our public key to the server
+      // Offer binary frames; the server falls back to base64 if it does not support them
       this.socket.emit('client_public_key', {
-        public_key: this.cryptoState.publicKeyBase64
+        public_key: this.cryptoState.publicKeyBase64,
+        transports: ['binary', 'base64'],
+        codecs: CryptoService.supportedCodecs
       })
 
     } catch (error) {
@@ -389,8 +399,11 @@ class SocketService {
 
   /**
    * Handle key exchange completion
+   * @param {Object} data - Negotiated transport ('binary' or 'base64') and payload codec
    */
-  handleKeyExchangeComplete() {
+  handleKeyExchangeComplete(data) {
+    this.cryptoState.binary = !!data && data.transport === 'binary'
+    this.cryptoState.codec = (data && data.codec) || null
     this.cryptoState.keyExchangeComplete = true
     this.emitLocalEvent('key_exchange_complete', {})
 
@@ -450,7 +463,7 @@ class SocketService {
   /**
    * Encrypt data before sending
    * @param {Object|string} data - Data to encrypt
-   * @returns {Promise<string>} - Encrypted data as base64 string
+   * @returns {Promise<string|Uint8Array>} - Encrypted data, raw for binary frames or as base64 string
    */
   async encrypt(data) {
     if (!this.cryptoState.sharedKey || !this.cryptoState.keyExchangeComplete) {
@@ -458,7 +471,11 @@ class SocketService {
     }
 
     try {
-      const result = await CryptoService.encrypt(this.cryptoState.sharedKey, data);
+      // Reserve the nonce counter before awaiting so concurrent sends never share one
+      const counter = this.cryptoState.sendCounter++
+      const result = this.cryptoState.binary
+        ? await CryptoService.encryptRaw(this.cryptoState.sharedKey, data, counter, this.cryptoState.codec)
+        : await CryptoService.encrypt(this.cryptoState.sharedKey, data, counter, this.cryptoState.codec);
       return result;
     } catch (error) {
       throw error;
@@ -467,7 +484,7 @@ class SocketService {
 
   /**
    * Decrypt received data
-   * @param {string} encryptedBase64 - Base64 encoded encrypted data
+   * @param {string|ArrayBuffer|Uint8Array} encryptedBase64 - Base64 encoded or raw encrypted data
    * @returns {Promise<Object|string>} - Decrypted data
    */
   async decrypt(encryptedBase64) {
@@ -482,12 +499,17 @@ class SocketService {
         dataToDecrypt = encryptedBase64.encrypted;
       }
 
+      // Binary frames arrive as raw bytes
+      if (dataToDecrypt instanceof ArrayBuffer || ArrayBuffer.isView(dataToDecrypt)) {
+        return await CryptoService.decryptRaw(this.cryptoState.sharedKey, dataToDecrypt, this.cryptoState.codec)
+      }
+
       // Validate that we're decrypting a string
       if (typeof dataToDecrypt !== 'string') {
         throw new Error('Invalid encrypted data format');
       }
 
-      const result = await CryptoService.decrypt(this.cryptoState.sharedKey, dataToDecrypt)
+      const result = await CryptoService.decrypt(this.cryptoState.sharedKey, dataToDecrypt, this.cryptoState.codec)
       return result;
     } catch (error) {
       throw error;
@@ -711,6 +733,9 @@ class SocketService {
         publicKey: null,
         serverPublicKey: null,
         sharedKey: null,
+        sendCounter: 0,
+        binary: false,
+        codec: null,
         keyExchangeComplete: false
       }
 
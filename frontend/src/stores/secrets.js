@@ -4,6 +4,8 @@ import axios from 'axios'
 import { useAuthStore } from './auth'
 import { socketIO } from '@/main'
 
+const SECRET_PAGE_SIZE = 500
+
 export const useSecretsStore = defineStore('secrets', () => {
   // State
   const secrets = ref([])
@@ -43,9 +45,17 @@ export const useSecretsStore = defineStore('secrets', () => {
     error.value = null
 
     try {
-      const response = await axios.get('/api/secrets/')
-      secrets.value = response.data.secrets || []
-      return response.data.secrets
+      // Walk the listing in bounded pages instead of one large response
+      const allSecrets = []
+      let cursor = null
+      do {
+        const page = await fetchSecretsPage({ limit: SECRET_PAGE_SIZE, cursor })
+        allSecrets.push(...page.secrets)
+        cursor = page.nextCursor
+      } while (cursor)
+
+      secrets.value = allSecrets
+      return allSecrets
     } catch (err) {
       error.value = err.response?.data?.msg || 'Failed to fetch secrets'
       throw err
@@ -54,6 +64,32 @@ export const useSecretsStore = defineStore('secrets', () => {
     }
   }
 
+  // Fetches one page of secrets, filtered and sorted on the server.
+  // params: folder_id ('root' for unfiled), tag, type, owner_id, name_prefix,
+  // sort ('modified', 'created', 'name'), order ('desc', 'asc'), limit, cursor
+  async function fetchSecretsPage(params = {}, url = '/api/secrets/') {
+    const query = Object.fromEntries(
+      Object.entries(params).filter(([, value]) => value !== null && value !== undefined && value !== '')
+    )
+    const response = await axios.get(url, { params: query })
+    return {
+      secrets: response.data.secrets || [],
+      nextCursor: response.data.next_cursor || null
+    }
+  }
+
+  // Ranked full-text search over names, descriptions and tags; params as for fetchSecretsPage
+  async function searchSecrets(q, params = {}) {
+    return fetchSecretsPage({ ...params, q }, '/api/secrets/search')
+  }
+
+  // Quick-open completions answered from the server's in-memory index, cheap enough for every keystroke
+  async function quickOpen(q, limit = 10) {
+    if (!q || !q.trim()) return []
+    const response = await axios.get('/api/secrets/quick-open', { params: { q, limit } })
+    return response.data.results || []
+  }
+
   async function fetchSecret(id) {
     loading.value = true
     error.value = null
@@ -657,6 +693,9 @@ export const useSecretsStore = defineStore('secrets', () => {
 
     // Actions
     fetchSecrets,
+    fetchSecretsPage,
+    searchSecrets,
+    quickOpen,
     fetchSecret,
     fetchSecretFile,
     downloadFileSecret,
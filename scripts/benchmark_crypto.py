@@ -0,0 +1,92 @@
+#! /usr/bin/env python3
+
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from cryptography.fernet import Fernet
+
+# Allow running the script directly from a checkout
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from backend.utils.key_provider import create_key_provider
+
+STARTUP_SECRETS = ("jwt_secret", "encryption_key", "app_secret", "mariadb_user", "password_salt")
+
+
+def timed(operation, rounds):
+    """
+    Runs an operation repeatedly and records each duration.
+
+    Args:
+        operation: A callable taking the round number.
+        rounds (int): How many times to run it.
+
+    Returns:
+        list: The duration of each round in milliseconds.
+    """
+    durations = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        operation(i)
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def report(label, durations, payload_size=0):
+    """Prints latency percentiles and, for payload benchmarks, throughput."""
+    durations = sorted(durations)
+    p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+    line = (f"{label:<22} n={len(durations):<5} mean={statistics.mean(durations):9.3f}ms "
+            f"p50={statistics.median(durations):9.3f}ms p95={p95:9.3f}ms")
+    if payload_size:
+        line += f" {payload_size / (sum(durations) / len(durations) / 1000) / 2 ** 20:9.1f} MiB/s"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark key sealing and file encryption per key provider")
+    parser.add_argument("--provider", default=os.environ.get("KEY_PROVIDER", "simulator"),
+                        help="tpm, software or simulator (default: $KEY_PROVIDER or simulator)")
+    parser.add_argument("--rounds", type=int, default=50, help="Iterations per benchmark")
+    parser.add_argument("--users", type=int, default=10, help="Distinct per-user keys to seal")
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="File payload size in bytes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="authberry-bench-") as workdir:
+        workdir = Path(workdir)
+        if args.provider == "software":
+            os.environ.setdefault("KEY_PROVIDER_WRAPPING_KEY", str(workdir / "wrapping.key"))
+        provider = create_key_provider(args.provider)
+        print(f"[Benchmark] provider={provider.name} rounds={args.rounds} size={args.size}")
+
+        for name in STARTUP_SECRETS:
+            provider.seal(Fernet.generate_key(), workdir / name)
+        user_keys = [workdir / f"user_{i}_key.sealed" for i in range(args.users)]
+
+        report("seal user key", timed(
+            lambda i: provider.seal(Fernet.generate_key(), user_keys[i % args.users]), args.rounds))
+        report("unseal user key", timed(
+            lambda i: provider.unseal(user_keys[i % args.users]), args.rounds))
+        report("startup secrets", timed(
+            lambda i: [provider.unseal(workdir / name) for name in STARTUP_SECRETS], args.rounds))
+
+        payload = os.urandom(args.size)
+        fernet = Fernet(provider.unseal(user_keys[0]))
+        token = fernet.encrypt(payload)
+
+        report("encrypt (cached key)", timed(lambda i: fernet.encrypt(payload), args.rounds), args.size)
+        report("decrypt (cached key)", timed(lambda i: fernet.decrypt(token), args.rounds), args.size)
+        report("upload (unseal+enc)", timed(
+            lambda i: Fernet(provider.unseal(user_keys[i % args.users])).encrypt(payload), args.rounds), args.size)
+        report("download (unseal+dec)", timed(
+            lambda i: Fernet(provider.unseal(user_keys[0])).decrypt(token), args.rounds), args.size)
+
+        print(f"[Benchmark] provider stats: {provider.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#! /usr/bin/env python3
+
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# Allow running the script directly from a checkout
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from backend.utils.key_provider import get_key_provider
+from backend.utils.secrets_loader import load_startup_secrets, write_secrets_bundle
+
+STARTUP_SECRETS = ("jwt_secret", "encryption_key", "app_secret", "mariadb_user", "password_salt")
+OPTIONAL_SECRETS = ("encryption_key_previous",)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Combine the individually sealed startup secrets into one sealed bundle"
+    )
+    parser.add_argument("--secrets-dir", default=str(Path(__file__).resolve().parents[1] / "secrets"),
+                        help="Directory holding the sealed secrets (default: ./secrets)")
+    parser.add_argument("--provider", default=os.environ.get("KEY_PROVIDER", "tpm"),
+                        help="tpm, software or simulator (default: $KEY_PROVIDER or tpm)")
+    args = parser.parse_args()
+
+    # The loader uses the process-wide provider; make it match the requested one
+    os.environ["KEY_PROVIDER"] = args.provider
+
+    secrets, timings = load_startup_secrets(STARTUP_SECRETS, OPTIONAL_SECRETS, app_secrets_dir=args.secrets_dir)
+    print(f"[+] Unsealed {len(secrets)} secrets in {timings['total']}ms")
+
+    bundle = write_secrets_bundle(secrets, args.secrets_dir, get_key_provider())
+    print(f"[+] Wrote {bundle}. Re-run this script after changing any individual secret.")
+
+
+if __name__ == "__main__":
+    main()